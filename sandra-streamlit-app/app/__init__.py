@@ -2,32 +2,74 @@
 Initialization file for the SANDRA Streamlit app package.
 
 This package contains the main application code, database management functions, and utility scripts.
+
+Importing the package is cheap: the database core (``app.database``,
+``app.ingest``, ``app.writer``) only needs the standard library, and the
+names below are resolved from their modules on first access, so streamlit,
+pandas and altair are loaded only by code that actually uses them.
 """
 
-# Import key components from the package
-from .sandra_app import run_app
-from .database import (
-    connect_db,
-    initialize_db,
-    insert_data,
-    fetch_data,
-    update_data,
-    delete_data,
-)
-from .utils import format_data, generate_charts
-
-# Define the package-level metadata
+import importlib
+import os
+import sys
+
+# Package-level metadata
 __version__ = "1.0.0"
 __author__ = "Your Name"
 __email__ = "your.email@example.com"
 
-# Package-level functions (if any)
+# Public name -> submodule that defines it, imported on first access
+_LAZY = {
+    "connect_db": "database",
+    "initialize_db": "database",
+    "insert_data": "database",
+    "fetch_data": "database",
+    "update_data": "database",
+    "delete_data": "database",
+    "bulk_update": "database",
+    "bulk_delete": "database",
+    "latest": "database",
+    "latest_all": "database",
+    "format_data": "utils",
+    "generate_charts": "charts",
+}
+
+APP_SCRIPT = os.path.join(os.path.dirname(__file__), "sandra_app.py")
+
+
+def run_app(args=()):
+    """
+    Run the SANDRA Streamlit app, as ``streamlit run sandra_app.py`` would.
+
+    Parameters:
+        args (sequence of str): Extra arguments for ``streamlit run``.
+    """
+    from streamlit.web import cli
+
+    sys.argv = ["streamlit", "run", APP_SCRIPT, *args]
+    sys.exit(cli.main())
+
+
 def start_app():
     """
     Start the SANDRA Streamlit app.
     """
     run_app()
 
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
 # Expose important modules and functions at the package level
 __all__ = [
     "run_app",
@@ -37,6 +79,10 @@ __all__ = [
     "fetch_data",
     "update_data",
     "delete_data",
+    "bulk_update",
+    "bulk_delete",
+    "latest",
+    "latest_all",
     "format_data",
     "generate_charts",
     "start_app",
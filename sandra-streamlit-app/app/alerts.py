@@ -0,0 +1,402 @@
+"""
+Threshold and anomaly alerts on incoming SANDRA readings.
+
+Rules live in the ``alert_rules`` table, so the dashboard and the ingestion
+worker share them. An ``AlertEngine`` checks every ingested chunk against the
+rules of each parameter:
+
+- ``threshold``: the value leaves ``[low, high]``.
+- ``rate``: the change per second between consecutive readings exceeds
+  ``max_change`` in either direction.
+- ``zscore``: the value is more than ``max_score`` standard deviations away
+  from the parameter's rolling mean.
+
+The rolling mean and variance are exponentially weighted Welford statistics
+over roughly the last ``span`` readings. They are held in memory and updated
+once per chunk, so checking never reads history back from the database: a
+chunk is scored against the statistics of the readings before it and then
+folded in. The checks are vectorized per parameter; numpy is imported when
+the first chunk is checked.
+
+Alerts are episodes. The first breaching reading opens a row in ``alerts``,
+later breaches of the same rule update its reading count, worst value and
+last breach, and a chunk whose last reading of the parameter is back within
+bounds clears it. Several short episodes inside one chunk are therefore
+recorded as one alert.
+"""
+
+import math
+import sqlite3
+from collections import namedtuple
+
+KINDS = ("threshold", "rate", "zscore")
+SEVERITIES = ("info", "warning", "critical")
+SPAN = 1000
+WARMUP = 30
+MAX_SCORE = 4.0
+
+
+class AlertRule(
+    namedtuple(
+        "AlertRule",
+        ["id", "parameter", "kind", "low", "high", "max_change", "max_score", "span", "warmup", "severity"],
+    )
+):
+    """
+    An alert rule, as stored in ``alert_rules``.
+
+    Parameters:
+        id (int): The rule id.
+        parameter (str): The monitored parameter, e.g. "core_temperature".
+        kind (str): One of ``KINDS``.
+        low (float): Lower bound of a threshold rule, or None.
+        high (float): Upper bound of a threshold rule, or None.
+        max_change (float): Largest allowed change per second of a rate rule.
+        max_score (float): Largest allowed absolute z-score of a zscore rule.
+        span (int): Readings the rolling statistics of a zscore rule cover.
+        warmup (int): Readings a zscore rule needs before it can fire.
+        severity (str): One of ``SEVERITIES``.
+    """
+
+    __slots__ = ()
+
+    def describe(self, value, score):
+        """
+        Explain a breach.
+
+        Parameters:
+            value (float): The breaching reading.
+            score (float): Its score: the distance beyond the bound, the
+                change per second or the z-score.
+
+        Returns:
+            str: A one-line message.
+        """
+        if self.kind == "threshold":
+            if self.high is not None and value > self.high:
+                return f"{self.parameter} {value:g} above {self.high:g}"
+            return f"{self.parameter} {value:g} below {self.low:g}"
+        if self.kind == "rate":
+            return f"{self.parameter} changing {score:g}/s, limit {self.max_change:g}/s"
+        return f"{self.parameter} {value:g} is {score:.1f} standard deviations from its rolling mean"
+
+
+def initialize_alerts(conn):
+    """
+    Create the ``alert_rules`` and ``alerts`` tables.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parameter TEXT NOT NULL,
+            kind TEXT NOT NULL CHECK (kind IN {KINDS}),
+            low REAL,
+            high REAL,
+            max_change REAL,
+            max_score REAL,
+            span INTEGER NOT NULL DEFAULT {SPAN},
+            warmup INTEGER NOT NULL DEFAULT {WARMUP},
+            severity TEXT NOT NULL DEFAULT 'warning' CHECK (severity IN {SEVERITIES}),
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rule_id INTEGER NOT NULL,
+            parameter TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            message TEXT NOT NULL,
+            value REAL,
+            score REAL,
+            readings INTEGER NOT NULL DEFAULT 1,
+            started TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            cleared TEXT,
+            acknowledged INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    # Open alerts are the ones the dashboard and the engine look up
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_open ON alerts (rule_id) WHERE cleared IS NULL")
+    conn.commit()
+
+
+def add_rule(conn, parameter, kind, low=None, high=None, max_change=None, max_score=None,
+             span=SPAN, warmup=WARMUP, severity="warning"):
+    """
+    Store a new alert rule.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        parameter (str): The monitored parameter.
+        kind (str): One of ``KINDS``.
+        low, high (float): Bounds of a threshold rule; either may be None.
+        max_change (float): Limit of a rate rule, in units per second.
+        max_score (float): Limit of a zscore rule; defaults to ``MAX_SCORE``.
+        span (int): Readings covered by the rolling statistics.
+        warmup (int): Readings needed before a zscore rule fires.
+        severity (str): One of ``SEVERITIES``.
+
+    Returns:
+        int: The new rule id.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    if kind == "threshold" and low is None and high is None:
+        raise ValueError("A threshold rule needs a low or a high bound")
+    if kind == "rate" and not max_change:
+        raise ValueError("A rate rule needs max_change")
+    if kind == "zscore":
+        max_score = max_score or MAX_SCORE
+    with conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO alert_rules (parameter, kind, low, high, max_change, max_score, span, warmup, severity)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (parameter, kind, low, high, max_change, max_score, span, warmup, severity),
+        )
+    return cursor.lastrowid
+
+
+def load_rules(conn):
+    """
+    Read the enabled alert rules.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        list of AlertRule: The rules, in id order.
+    """
+    rows = conn.execute(
+        f"SELECT {', '.join(AlertRule._fields)} FROM alert_rules WHERE enabled ORDER BY id"
+    ).fetchall()
+    return [AlertRule(*row) for row in rows]
+
+
+def load_alerts(conn, active=False, limit=100):
+    """
+    Read the newest alerts.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        active (bool): Only alerts that have not cleared.
+        limit (int): Maximum number of alerts.
+
+    Returns:
+        tuple: The list of rows and the list of column names.
+    """
+    where = "WHERE cleared IS NULL" if active else ""
+    cursor = conn.execute(f"SELECT * FROM alerts {where} ORDER BY id DESC LIMIT ?", (limit,))
+    return cursor.fetchall(), [description[0] for description in cursor.description]
+
+
+class _RollingStats:
+    # Exponentially weighted mean and variance, merged a chunk at a time with
+    # the weighted form of Welford's update.
+
+    __slots__ = ("decay", "weight", "mean", "m2", "count")
+
+    def __init__(self, span):
+        self.decay = 1.0 - 1.0 / max(span, 1)
+        self.weight = self.mean = self.m2 = 0.0
+        self.count = 0
+
+    def std(self):
+        return math.sqrt(self.m2 / self.weight) if self.weight else 0.0
+
+    def update(self, values):
+        import numpy as np
+
+        n = len(values)
+        if not n:
+            return
+        weights = self.decay ** np.arange(n - 1, -1, -1, dtype=float)
+        batch_weight = weights.sum()
+        batch_mean = float(weights @ values) / batch_weight
+        batch_m2 = float(weights @ (values - batch_mean) ** 2)
+        faded = self.weight * self.decay ** n
+        total = faded + batch_weight
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_weight / total
+        self.m2 = self.m2 * self.decay ** n + batch_m2 + delta * delta * faded * batch_weight / total
+        self.weight = total
+        self.count += n
+
+
+class AlertEngine:
+    """
+    Check ingested readings against the alert rules and record alerts.
+
+    Parameters:
+        rules (iterable of AlertRule): Initial rules; ``load`` replaces them
+            with the ones stored in the database.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = {}
+        self._stats = {}
+        self._last = {}
+        self._open = {}
+        self._data_version = None
+        self.checked = 0
+        self.raised = 0
+        self._set_rules(rules)
+
+    def _set_rules(self, rules):
+        by_parameter = {}
+        stats = {}
+        for rule in rules:
+            by_parameter.setdefault(rule.parameter, []).append(rule)
+            if rule.kind == "zscore":
+                # Statistics of unchanged rules survive a reload
+                current = self._stats.get(rule.id)
+                stats[rule.id] = current if current is not None and current[0] == rule else (rule, _RollingStats(rule.span))
+        self.rules, self._stats = by_parameter, stats
+
+    def load(self, conn):
+        """
+        Load the enabled rules and the open alerts from the database.
+
+        Parameters:
+            conn (sqlite3.Connection): A connection object to the SQLite database.
+        """
+        self._set_rules(load_rules(conn))
+        self._open = dict(conn.execute("SELECT rule_id, id FROM alerts WHERE cleared IS NULL").fetchall())
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self, conn):
+        """
+        Reload the rules if another connection committed since the last load.
+
+        Parameters:
+            conn (sqlite3.Connection): The connection the engine writes through.
+        """
+        try:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self.load(conn)
+        except sqlite3.OperationalError:
+            # No alert tables in this database
+            self._data_version = version
+
+    def check(self, conn, readings):
+        """
+        Check a chunk of readings and record the alerts it raises or clears.
+
+        Runs in the caller's transaction, so alerts commit with the readings.
+
+        Parameters:
+            conn (sqlite3.Connection): A connection object to the SQLite database.
+            readings (list of tuples): ``(parameter, value, unit, timestamp)``
+                rows as ``ingest_readings`` writes them, in arrival order.
+
+        Returns:
+            int: The number of alerts raised.
+        """
+        if not readings or not self.rules:
+            return 0
+        import numpy as np
+
+        parameters, values, _, timestamps = zip(*readings)
+        parameters = np.array(parameters, dtype=object)
+        values = np.array(values, dtype=float)
+        epochs = np.array(timestamps, dtype="datetime64[s]")
+        usable = ~np.isnan(values) & ~np.isnat(epochs)
+        epochs = epochs.astype(np.int64)
+        raised = 0
+        for parameter, rules in self.rules.items():
+            index = np.flatnonzero((parameters == parameter) & usable)
+            if not len(index):
+                continue
+            value, epoch = values[index], epochs[index]
+            for rule in rules:
+                breach, score = getattr(self, f"_{rule.kind}")(rule, value, epoch)
+                raised += self._record(conn, rule, breach, score, value, [timestamps[i] for i in index])
+            self._last[parameter] = (epoch[-1], value[-1])
+            for rule in rules:
+                if rule.kind == "zscore":
+                    self._stats[rule.id][1].update(value)
+        self.checked += len(readings)
+        self.raised += raised
+        return raised
+
+    def _threshold(self, rule, value, epoch):
+        import numpy as np
+
+        low = -np.inf if rule.low is None else rule.low
+        high = np.inf if rule.high is None else rule.high
+        score = np.maximum(low - value, value - high)
+        return score > 0, score
+
+    def _rate(self, rule, value, epoch):
+        import numpy as np
+
+        last_epoch, last_value = self._last.get(rule.parameter, (epoch[0], value[0]))
+        previous_value = np.concatenate(([last_value], value[:-1]))
+        elapsed = np.diff(epoch, prepend=last_epoch).astype(float)
+        rate = np.zeros(len(value))
+        moved = elapsed > 0
+        rate[moved] = np.abs(value[moved] - previous_value[moved]) / elapsed[moved]
+        return rate > rule.max_change, rate
+
+    def _zscore(self, rule, value, epoch):
+        import numpy as np
+
+        stats = self._stats[rule.id][1]
+        std = stats.std()
+        if stats.count < rule.warmup or std == 0:
+            return np.zeros(len(value), dtype=bool), np.zeros(len(value))
+        score = np.abs(value - stats.mean) / std
+        return score > rule.max_score, score
+
+    def _record(self, conn, rule, breach, score, value, timestamps):
+        import numpy as np
+
+        raised = 0
+        open_id = self._open.get(rule.id)
+        hits = np.flatnonzero(breach)
+        if len(hits):
+            worst = hits[np.argmax(score[hits])]
+            worst_value, worst_score = float(value[worst]), float(score[worst])
+            message = rule.describe(worst_value, worst_score)
+            if open_id is None:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO alerts (rule_id, parameter, kind, severity, message, value, score, readings, started, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (rule.id, rule.parameter, rule.kind, rule.severity, message, worst_value, worst_score,
+                     len(hits), timestamps[hits[0]], timestamps[hits[-1]]),
+                )
+                open_id = self._open[rule.id] = cursor.lastrowid
+                raised = 1
+            else:
+                conn.execute(
+                    """
+                    UPDATE alerts SET
+                        readings = readings + ?,
+                        last_seen = ?,
+                        message = CASE WHEN ? > score THEN ? ELSE message END,
+                        value = CASE WHEN ? > score THEN ? ELSE value END,
+                        score = max(score, ?)
+                    WHERE id = ?
+                    """,
+                    (len(hits), timestamps[hits[-1]], worst_score, message, worst_score, worst_value,
+                     worst_score, open_id),
+                )
+        if open_id is not None and not breach[-1]:
+            # Cleared by the first reading back within bounds
+            back = hits[-1] + 1 if len(hits) else 0
+            conn.execute("UPDATE alerts SET cleared = ? WHERE id = ?", (timestamps[back], open_id))
+            del self._open[rule.id]
+        return raised
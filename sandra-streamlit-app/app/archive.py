@@ -0,0 +1,203 @@
+"""
+Parquet archive tier for ``real_time_monitoring`` telemetry.
+
+Readings older than a configurable age are moved out of SQLite into
+compressed Parquet files partitioned by day (``day=YYYY-MM-DD/``), keeping
+the hot database small. ``read_telemetry`` combines archived partitions,
+read memory-mapped with partition pruning and predicate pushdown on
+parameter and time, with the hot rows still in SQLite, and returns a
+columnar ``pyarrow.Table``.
+
+Requires the optional ``pyarrow`` dependency.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    from .telemetry import to_epoch, to_text
+except ImportError:
+    from telemetry import to_epoch, to_text
+
+BATCH_SIZE = 100000
+COMPRESSION = "zstd"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The archive tier requires pyarrow: pip install pyarrow")
+
+
+def _schema():
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("parameter", pa.dictionary(pa.int32(), pa.string())),
+            ("value", pa.float64()),
+            ("unit", pa.dictionary(pa.int32(), pa.string())),
+            ("timestamp", pa.int64()),
+        ]
+    )
+
+
+def _rows_to_table(rows):
+    ids, parameters, values, units, stamps = [], [], [], [], []
+    for row_id, parameter, value, unit, timestamp in rows:
+        ids.append(row_id)
+        parameters.append(parameter)
+        values.append(value)
+        units.append(unit)
+        stamps.append(None if timestamp is None else to_epoch(timestamp))
+    return pa.table(
+        [
+            pa.array(ids, pa.int64()),
+            pa.array(parameters, pa.string()).dictionary_encode(),
+            pa.array(values, pa.float64()),
+            pa.array(units, pa.string()).dictionary_encode(),
+            pa.array(stamps, pa.int64()),
+        ],
+        schema=_schema(),
+    )
+
+
+def archive_telemetry(conn, archive_dir, older_than, batch_size=BATCH_SIZE, compression=COMPRESSION, now=None):
+    """
+    Move readings older than ``older_than`` seconds into Parquet files.
+
+    Each batch is written to its day partitions first and only then deleted
+    from SQLite in its own transaction. Rollups are left untouched, so
+    aggregate charts keep covering archived history.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        archive_dir (str or Path): Root directory of the archive.
+        older_than (int): Age in seconds beyond which readings are archived.
+        batch_size (int): Rows moved per batch.
+        compression (str): Parquet codec, e.g. "zstd" or "snappy".
+        now (int): Reference epoch seconds; defaults to the current time.
+
+    Returns:
+        int: The number of rows archived.
+    """
+    _require_pyarrow()
+    cutoff = to_text((int(time.time()) if now is None else to_epoch(now)) - older_than)
+    file_format = ds.ParquetFileFormat()
+    write_options = file_format.make_write_options(compression=compression)
+    moved = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT id, parameter, value, unit, timestamp FROM real_time_monitoring
+            WHERE id > ? AND timestamp < ?
+            ORDER BY id LIMIT ?
+            """,
+            (last_id, cutoff, batch_size),
+        ).fetchall()
+        if not rows:
+            return moved
+        first_id, last_id = rows[0][0], rows[-1][0]
+        table = _rows_to_table(rows)
+        days = pc.strftime(
+            pc.cast(table["timestamp"], pa.timestamp("s")), format=DAY_FORMAT
+        )
+        ds.write_dataset(
+            table.append_column("day", days),
+            archive_dir,
+            format=file_format,
+            file_options=write_options,
+            partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"),
+            basename_template=f"ids-{first_id}-{last_id}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        with conn:
+            conn.execute(
+                "DELETE FROM real_time_monitoring WHERE id BETWEEN ? AND ? AND timestamp < ?",
+                (first_id, last_id, cutoff),
+            )
+        moved += len(rows)
+
+
+def read_telemetry(conn, archive_dir, parameter=None, start=None, end=None):
+    """
+    Read readings from the archive and the hot table as one Arrow table.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        archive_dir (str or Path): Root directory of the archive.
+        parameter (str): Only this parameter, or ``None`` for all.
+        start: Inclusive lower time bound, or ``None``.
+        end: Exclusive upper time bound, or ``None``.
+
+    Returns:
+        pyarrow.Table: ``id``, ``parameter``, ``value``, ``unit`` and epoch-second
+        ``timestamp`` columns, archived rows first.
+    """
+    _require_pyarrow()
+    start = None if start is None else to_epoch(start)
+    end = None if end is None else to_epoch(end)
+    tables = []
+
+    if os.path.isdir(archive_dir):
+        # The day filters prune partition directories; the rest is pushed
+        # down to Parquet row-group statistics.
+        filters = []
+        if parameter is not None:
+            filters.append(ds.field("parameter") == parameter)
+        if start is not None:
+            filters.append(ds.field("timestamp") >= start)
+            filters.append(ds.field("day") >= time.strftime(DAY_FORMAT, time.gmtime(start)))
+        if end is not None:
+            filters.append(ds.field("timestamp") < end)
+            filters.append(ds.field("day") <= time.strftime(DAY_FORMAT, time.gmtime(end)))
+        expression = None
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+        archived = pq.read_table(
+            archive_dir,
+            columns=_schema().names,
+            filters=expression,
+            memory_map=True,
+            partitioning="hive",
+        )
+        tables.append(archived.cast(_schema()))
+
+    query = "SELECT id, parameter, value, unit, timestamp FROM real_time_monitoring WHERE 1 = 1"
+    params = []
+    if parameter is not None:
+        query += " AND parameter = ?"
+        params.append(parameter)
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(to_text(start))
+    if end is not None:
+        query += " AND timestamp < ?"
+        params.append(to_text(end))
+    tables.append(_rows_to_table(conn.execute(query + " ORDER BY id", params).fetchall()))
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old SANDRA telemetry to Parquet.")
+    parser.add_argument("database", help="Path to the SQLite database file")
+    parser.add_argument("archive_dir", help="Directory for the Parquet archive")
+    parser.add_argument("--older-than-days", type=float, default=30, help="Age to archive")
+    parser.add_argument("--compression", default=COMPRESSION, help="Parquet compression codec")
+    args = parser.parse_args()
+    connection = sqlite3.connect(args.database)
+    count = archive_telemetry(
+        connection, args.archive_dir, int(args.older_than_days * 86400), compression=args.compression
+    )
+    print(f"Archived {count} rows to {args.archive_dir}.")
+    connection.close()
@@ -0,0 +1,370 @@
+"""
+Benchmark harness for the SANDRA database layer.
+
+A deterministic generator fills ``energy_storage``, ``real_time_monitoring``
+and ``applications`` at a chosen scale (10k, 1M or 50M rows per table, in
+streamed chunks), then times insert, fetch, search, update, delete and
+chart-data preparation against a scratch database. Results are written as
+JSON, and a previous run can be passed with ``--compare`` to flag
+regressions:
+
+    python benchmark.py --scale 1m --output after.json --compare before.json
+
+``--cold-start`` also times importing the package modules in fresh
+interpreters, e.g. to check that a headless worker using only the database
+core starts without loading streamlit, pandas or altair.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .charts import MAX_POINTS, downsample
+    from .database import get_pool, initialize_db
+    from .ingest import CHUNK_SIZE, ingest_readings
+    from .rollups import choose_resolution, load_rollup, load_storage_counts, telemetry_span
+    from .search import create_search_index, rebuild_search_index, search_table, text_columns
+    from .telemetry import to_text
+except ImportError:
+    from charts import MAX_POINTS, downsample
+    from database import get_pool, initialize_db
+    from ingest import CHUNK_SIZE, ingest_readings
+    from rollups import choose_resolution, load_rollup, load_storage_counts, telemetry_span
+    from search import create_search_index, rebuild_search_index, search_table, text_columns
+    from telemetry import to_text
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "50m": 50_000_000}
+TABLES = ("energy_storage", "real_time_monitoring", "applications")
+MUTATIONS = 1000
+REGRESSION_TOLERANCE = 0.2
+NOISE_FLOOR = 0.005
+START_EPOCH = 1_700_000_000
+COLD_START_MODULES = ("app", "app.database", "app.ingest", "app.writer", "app.charts")
+COLD_START_REPEAT = 5
+HEAVY_MODULES = ("streamlit", "pandas", "altair", "numpy", "pyarrow")
+
+TECHNOLOGIES = ["sand", "molten_salt", "lithium_ion", "pumped_hydro", "flywheel"]
+STATUSES = ["active", "inactive", "pending", "archived"]
+PARAMETERS = {
+    "core_temperature": ("C", 400.0, 120.0),
+    "ambient_temperature": ("C", 15.0, 10.0),
+    "charge_power": ("kW", 80.0, 40.0),
+    "discharge_power": ("kW", 60.0, 30.0),
+    "flow_rate": ("m3/h", 12.0, 3.0),
+}
+SECTORS = ["district heating", "industrial steam", "greenhouse", "data center", "residential"]
+WORDS = ["thermal", "storage", "heat", "sand", "grid", "peak", "shaving", "renewable",
+         "wind", "solar", "surplus", "winter", "buffer", "process", "low", "carbon"]
+IMPACTS = ["low", "medium", "high"]
+
+
+def generate_rows(table, rows, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Yield deterministic synthetic rows for a table in chunks.
+
+    Parameters:
+        table (str): One of ``TABLES``.
+        rows (int): Total number of rows.
+        seed (int): Random seed; the same seed always yields the same rows.
+        chunk_size (int): Rows per yielded list.
+
+    Yields:
+        list of tuples: Rows in the table's insert column order.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(PARAMETERS)
+    for offset in range(0, rows, chunk_size):
+        n = min(chunk_size, rows - offset)
+        if table == "energy_storage":
+            yield list(zip(
+                np.array(TECHNOLOGIES)[rng.integers(0, len(TECHNOLOGIES), n)].tolist(),
+                rng.uniform(1, 500, n).round(1).tolist(),
+                rng.uniform(0.6, 0.95, n).round(3).tolist(),
+                np.array(STATUSES)[rng.integers(0, len(STATUSES), n)].tolist(),
+            ))
+        elif table == "real_time_monitoring":
+            which = rng.integers(0, len(names), n)
+            units, means, spreads = (np.array(column) for column in zip(*PARAMETERS.values()))
+            values = rng.normal(means[which], spreads[which]).round(2)
+            seconds = START_EPOCH + offset + np.arange(n)
+            yield list(zip(
+                np.array(names)[which].tolist(),
+                values.tolist(),
+                units[which].tolist(),
+                [to_text(second) for second in seconds.tolist()],
+            ))
+        elif table == "applications":
+            words = np.array(WORDS)[rng.integers(0, len(WORDS), (n, 6))]
+            yield list(zip(
+                np.array(SECTORS)[rng.integers(0, len(SECTORS), n)].tolist(),
+                [" ".join(sentence) for sentence in words.tolist()],
+                np.array(IMPACTS)[rng.integers(0, len(IMPACTS), n)].tolist(),
+            ))
+        else:
+            raise ValueError(f"Unknown table: {table}")
+
+
+INSERTS = {
+    "energy_storage": "INSERT INTO energy_storage (technology, capacity, efficiency, status) VALUES (?, ?, ?, ?)",
+    "applications": "INSERT INTO applications (sector, description, impact) VALUES (?, ?, ?)",
+}
+UPDATES = {
+    "energy_storage": "UPDATE energy_storage SET status = 'archived' WHERE id = ?",
+    "real_time_monitoring": "UPDATE real_time_monitoring SET value = value + 1 WHERE id = ?",
+    "applications": "UPDATE applications SET impact = 'high' WHERE id = ?",
+}
+SEARCHES = {"energy_storage": "molten", "applications": "thermal storage"}
+
+
+class Timer:
+    """Collects timings as ``{name: {"seconds", "rows", "rows_per_second"}}``."""
+
+    def __init__(self):
+        self.results = {}
+
+    def measure(self, name, func, rows=None):
+        started = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - started
+        if rows is None:
+            rows = value if isinstance(value, int) else len(value) if hasattr(value, "__len__") else 0
+        self.results[name] = {
+            "seconds": seconds,
+            "rows": rows,
+            "rows_per_second": rows / seconds if seconds else 0.0,
+        }
+        print(f"{name:>45}: {seconds:9.4f}s  {rows:>12,} rows", file=sys.stderr)
+        return value
+
+
+def _insert(conn, table, rows, seed):
+    if table == "real_time_monitoring":
+        readings = (row for chunk in generate_rows(table, rows, seed) for row in chunk)
+        return ingest_readings(readings, conn).rows
+    count = 0
+    for chunk in generate_rows(table, rows, seed):
+        with conn:
+            conn.executemany(INSERTS[table], chunk)
+        count += len(chunk)
+    return count
+
+
+def _fetch(conn, table, after_id, page_size=100):
+    return pd.read_sql(
+        f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", conn, params=(after_id, page_size)
+    )
+
+
+def _chart_data(conn, table):
+    if table == "real_time_monitoring":
+        first, last = telemetry_span(conn)
+        resolution = choose_resolution(first, last)
+        rows, columns = load_rollup(conn, resolution, first, last)
+        frame = pd.DataFrame(rows, columns=columns)
+        raw = pd.read_sql(
+            "SELECT id, value FROM real_time_monitoring WHERE parameter = ? ORDER BY id LIMIT 200000",
+            conn,
+            params=("core_temperature",),
+        )
+        return len(frame) + len(downsample(raw, x="id", y="value", target=MAX_POINTS))
+    if table == "energy_storage":
+        return len(load_storage_counts(conn, "status")[0]) + len(load_storage_counts(conn, "technology")[0])
+    frame = _fetch(conn, table, 0, 10000)
+    return len(downsample(frame, x="id", target=MAX_POINTS))
+
+
+def cold_start(modules=COLD_START_MODULES, repeat=COLD_START_REPEAT):
+    """
+    Time importing modules of the package in fresh interpreters.
+
+    Parameters:
+        modules (sequence of str): Dotted module names under the package.
+        repeat (int): Interpreters started per module; the median is kept.
+
+    Returns:
+        dict: Per module, ``import_s`` and ``process_s`` (interpreter start to
+        exit) medians and the ``heavy`` dependencies the import loaded.
+    """
+    probe = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "import importlib; importlib.import_module(sys.argv[1])\n"
+        "elapsed = time.perf_counter() - started\n"
+        "heavy = sorted(name for name in sys.argv[2:] if name in sys.modules)\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for module in modules:
+        imports, processes = [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", probe, module, *HEAVY_MODULES],
+                cwd=root,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            processes.append(time.perf_counter() - started)
+            imports.append(float(output[0]))
+        results[module] = {
+            "import_s": statistics.median(imports),
+            "process_s": statistics.median(processes),
+            "heavy": output[1].split(",") if len(output) > 1 else [],
+        }
+    return results
+
+
+def run_benchmark(scale="10k", tables=TABLES, seed=0, db_path=None):
+    """
+    Populate a scratch database and time every operation.
+
+    Parameters:
+        scale (str or int): A key of ``SCALES`` or a row count per table.
+        tables (sequence of str): Tables to benchmark.
+        seed (int): Random seed for the generator and the sampled ids.
+        db_path (str): Database file to use; defaults to a temporary file.
+
+    Returns:
+        dict: ``meta`` describing the run and ``results`` keyed by
+        ``"<table>.<operation>"``.
+    """
+    rows = SCALES[scale] if scale in SCALES else int(scale)
+    scratch = None
+    if db_path is None:
+        scratch = tempfile.TemporaryDirectory(prefix="sandra-bench-")
+        db_path = os.path.join(scratch.name, "bench.db")
+    pool = get_pool(db_path, initializer=initialize_db)
+    conn = pool.connection()
+    rng = np.random.default_rng(seed)
+    timer = Timer()
+    try:
+        for table in tables:
+            timer.measure(f"{table}.insert", lambda: _insert(conn, table, rows, seed))
+            timer.measure(f"{table}.count", lambda: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0], rows=1)
+            timer.measure(f"{table}.fetch_first_page", lambda: _fetch(conn, table, 0))
+            timer.measure(f"{table}.fetch_middle_page", lambda: _fetch(conn, table, rows // 2))
+            if table == "real_time_monitoring":
+                window = (to_text(START_EPOCH + rows // 2), to_text(START_EPOCH + rows // 2 + 3600))
+                timer.measure(
+                    f"{table}.fetch_parameter_range",
+                    lambda: conn.execute(
+                        "SELECT timestamp, value FROM real_time_monitoring "
+                        "WHERE parameter = ? AND timestamp >= ? AND timestamp < ?",
+                        ("core_temperature", *window),
+                    ).fetchall(),
+                )
+            if table in SEARCHES:
+                timer.measure(
+                    f"{table}.search_index_build",
+                    # Generated rows have no names, so every text column is indexed
+                    lambda: create_search_index(conn, table, text_columns(conn, table))
+                    and rebuild_search_index(conn, table),
+                    rows=rows,
+                )
+                timer.measure(f"{table}.search", lambda: search_table(conn, table, SEARCHES[table], 50)[0])
+            ids = [(int(i),) for i in rng.choice(np.arange(1, rows + 1), min(MUTATIONS, rows), replace=False)]
+            timer.measure(f"{table}.chart_data", lambda: _chart_data(conn, table), rows=rows)
+
+            def mutate(sql):
+                with conn:
+                    conn.executemany(sql, ids)
+                return len(ids)
+
+            timer.measure(f"{table}.update", lambda: mutate(UPDATES[table]))
+            timer.measure(f"{table}.delete", lambda: mutate(f"DELETE FROM {table} WHERE id = ?"))
+    finally:
+        pool.close()
+        if scratch is not None:
+            scratch.cleanup()
+    return {
+        "meta": {
+            "scale": scale,
+            "rows_per_table": rows,
+            "tables": list(tables),
+            "seed": seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": timer.results,
+    }
+
+
+def compare_results(current, baseline, tolerance=REGRESSION_TOLERANCE, noise_floor=NOISE_FLOOR):
+    """
+    Find operations that got slower than a baseline run.
+
+    Parameters:
+        current (dict): Output of ``run_benchmark``.
+        baseline (dict): An earlier output of ``run_benchmark``.
+        tolerance (float): Allowed slowdown, e.g. 0.2 for 20%.
+        noise_floor (float): Operations faster than this many seconds in both
+            runs are ignored, since their timings are mostly jitter.
+
+    Returns:
+        list of tuples: ``(name, baseline_seconds, current_seconds, ratio)`` for
+        each regression, worst first.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before or max(before["seconds"], result["seconds"]) < noise_floor:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, before["seconds"], result["seconds"], ratio))
+    return sorted(regressions, key=lambda regression: regression[3], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SANDRA database layer.")
+    parser.add_argument("--scale", default="10k", help="10k, 1m, 50m, or a row count per table")
+    parser.add_argument("--tables", nargs="*", default=list(TABLES), choices=TABLES)
+    parser.add_argument("--cold-start", action="store_true", help="Also time package imports")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="Database file to benchmark against (default: temporary)")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.scale, args.tables, args.seed, args.db)
+    if args.cold_start:
+        for module, timing in cold_start().items():
+            report["results"][f"cold_start.{module}"] = {
+                "seconds": timing["import_s"],
+                "process_seconds": timing["process_s"],
+                "heavy_modules": timing["heavy"],
+                "rows": 0,
+                "rows_per_second": 0.0,
+            }
+            print(
+                f"{'cold_start.' + module:>45}: {timing['import_s'] * 1000:8.1f}ms import, "
+                f"{timing['process_s'] * 1000:8.1f}ms process, loads {', '.join(timing['heavy']) or 'nothing heavy'}",
+                file=sys.stderr,
+            )
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as handle:
+            found = compare_results(report, json.load(handle), args.tolerance)
+        for name, before, after, ratio in found:
+            print(f"REGRESSION {name}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x)", file=sys.stderr)
+        sys.exit(1 if found else 0)
@@ -0,0 +1,232 @@
+"""
+Query result cache for the SANDRA Streamlit app.
+
+Results are memoized on the query and its parameters with LRU eviction, a
+time-to-live and a memory cap. Every entry records the tables it read, and
+is dropped when one of them changes: writers call ``invalidate`` directly,
+and commits from other connections or processes are picked up through
+``PRAGMA data_version`` plus a ``table_versions`` counter bumped by update
+and delete triggers. Inserts into AUTOINCREMENT tables already advance
+``sqlite_sequence``, which is read alongside, so they pay for no trigger.
+Cached values are shared, so callers must treat them as read-only.
+"""
+
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 256
+TTL = 300.0
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def install_version_triggers(conn, tables):
+    """
+    Create ``table_versions`` and triggers that bump a table's counter on writes.
+
+    AUTOINCREMENT tables get no insert trigger: their ``sqlite_sequence``
+    entry changes with every insert and ``QueryCache`` reads it too, so
+    high-volume inserts do not also update one hot counter row each.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        tables (iterable of str): Tables to track.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    for table in tables:
+        conn.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+        sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        sequenced = sql is not None and "AUTOINCREMENT" in sql[0].upper()
+        events = (("au", "UPDATE"), ("ad", "DELETE"))
+        if sequenced:
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_version_ai")
+        else:
+            events = (("ai", "INSERT"),) + events
+        for suffix, event in events:
+            conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix}
+                AFTER {event} ON {table} BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+                """
+            )
+    conn.commit()
+
+
+def sizeof(value):
+    memory_usage = getattr(value, "memory_usage", None)
+    if memory_usage is not None:
+        try:
+            return int(memory_usage(deep=True).sum())
+        except TypeError:
+            pass
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """
+    An LRU + TTL cache of query results with per-table invalidation.
+
+    Parameters:
+        max_entries (int): Maximum number of cached results.
+        ttl (float): Seconds an entry stays valid.
+        max_bytes (int): Approximate memory cap for all cached results.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._bytes = 0
+        self._data_versions = {}
+        self._table_versions = {}
+        self._generations = {}
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _drop(self, key):
+        value, size, expires, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, table=None):
+        """
+        Drop cached results that read a table, or everything.
+
+        Parameters:
+            table (str): The table that changed; ``None`` clears the cache.
+        """
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = list(self._entries) if table is None else list(self._by_table.pop(table, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+            self.invalidations += len(keys)
+
+    def _generation(self, tables):
+        return tuple(self._generations.get(table, 0) for table in (None, *sorted(tables)))
+
+    def _sync(self, conn):
+        # data_version changes when another connection commits; only then is
+        # it worth reading the per-table counters.
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_versions.get(id(conn)) == version:
+            return
+        self._data_versions[id(conn)] = version
+        try:
+            rows = conn.execute("SELECT name, version FROM table_versions").fetchall()
+        except Exception:
+            self.invalidate()
+            return
+        try:
+            sequences = dict(conn.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
+        except Exception:
+            # No AUTOINCREMENT table in this database
+            sequences = {}
+        for name, counter in rows:
+            table_version = (counter, sequences.get(name))
+            if self._table_versions.get(name, table_version) != table_version:
+                self.invalidate(name)
+            self._table_versions[name] = table_version
+
+    def get_or_load(self, conn, key, tables, loader):
+        """
+        Return a cached result, or run ``loader()`` and cache what it returns.
+
+        Parameters:
+            conn (sqlite3.Connection): The connection the query runs on; used
+                to detect changes committed elsewhere.
+            key (hashable): The query identity, e.g. ``(sql, params)``.
+            tables (iterable of str): Tables the query reads.
+            loader (callable): Produces the result on a miss.
+
+        Returns:
+            The cached or freshly loaded result.
+        """
+        with self._lock:
+            self._sync(conn)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            tables = frozenset(tables)
+            generation = self._generation(tables)
+        value = loader()
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            # Skip caching if a table was invalidated while the query ran.
+            if size <= self.max_bytes and self._generation(tables) == generation:
+                self._entries[key] = (value, size, time.monotonic() + self.ttl, tables)
+                self._bytes += size
+                for table in tables:
+                    self._by_table.setdefault(table, set()).add(key)
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+        return value
+
+    def memoize(self, func):
+        """
+        Cache ``func(conn, table_name, *args, **kwargs)`` keyed on everything
+        but the connection, invalidated with ``table_name``.
+
+        Parameters:
+            func (callable): A query helper taking a connection and a table name.
+
+        Returns:
+            callable: The caching wrapper.
+        """
+
+        @functools.wraps(func)
+        def wrapper(conn, table_name, *args, **kwargs):
+            key = (func.__qualname__, table_name, args, tuple(sorted(kwargs.items())))
+            return self.get_or_load(
+                conn, key, (table_name,), lambda: func(conn, table_name, *args, **kwargs)
+            )
+
+        return wrapper
+
+    def stats(self):
+        """
+        Return counters for tuning the cache.
+
+        Returns:
+            dict: Hits, misses, hit ratio, evictions, invalidations, entry count and bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,272 @@
+"""
+Chart building for the SANDRA Streamlit app.
+
+A chart suite is rendered as one Vega-Lite spec whose data is attached once
+at the top level; Altair registers it under a single entry in ``datasets``
+and every sub-chart reads from it, instead of each chart embedding its own
+copy. Before serializing, the data is downsampled to a target point count
+with LTTB (for series) or min-max bucketing, so the payload stays flat as
+tables grow.
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 2000
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "stride")
+
+
+def generate_bar_chart(df):
+    """Generates a bar chart for energy storage data.
+
+    Takes raw ``energy_storage`` rows or the per technology and status
+    totals of ``load_storage_counts(conn, ("technology", "status"))``.
+    """
+    chart = alt.Chart(df).mark_bar().encode(
+        x='technology:N',
+        y='capacity:Q',
+        color='status:N'
+    ).properties(title='Energy Storage Technologies')
+    return chart
+
+
+def _as_float(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype("int64").to_numpy(dtype=float)
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    Parameters:
+        x (numpy.ndarray): Sorted x values.
+        y (numpy.ndarray): The matching y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        numpy.ndarray: Indices of the kept points, in order.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.nanargmax(area)) if not np.isnan(area).all() else start
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """
+    Keep the minimum and maximum of each of ``threshold / 2`` equal buckets.
+
+    Parameters:
+        y (numpy.ndarray): The values to downsample.
+        threshold (int): Approximate number of points to keep.
+
+    Returns:
+        numpy.ndarray: Sorted, unique indices of the kept points.
+    """
+    n = len(y)
+    buckets = max(threshold // 2, 1)
+    if threshold >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    filled = np.where(np.isnan(y), np.nanmean(y) if not np.isnan(y).all() else 0.0, y)
+    picks = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            segment = filled[start:end]
+            picks.append(start + segment.argmin())
+            picks.append(start + segment.argmax())
+    return np.unique(picks)
+
+
+def downsample(data, x=None, y=None, target=MAX_POINTS, method="lttb"):
+    """
+    Reduce a DataFrame to about ``target`` rows while keeping its shape.
+
+    Parameters:
+        data (pandas.DataFrame): The rows to plot.
+        x (str): Column the data is ordered by; defaults to the row order.
+        y (str): Numeric column whose extremes should survive. Without one, or
+            when it is not numeric, rows are sampled at a fixed stride.
+        target (int): Number of rows to keep.
+        method (str): "lttb", "minmax" or "stride".
+
+    Returns:
+        pandas.DataFrame: The kept rows, in their original order.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"method must be one of {DOWNSAMPLE_METHODS}")
+    n = len(data)
+    if n <= target:
+        return data
+    if x is not None:
+        data = data.sort_values(x, kind="stable")
+    numeric = y is not None and pd.api.types.is_numeric_dtype(data[y])
+    if method == "stride" or not numeric:
+        index = np.unique(np.linspace(0, n - 1, target).astype(np.int64))
+    elif method == "minmax":
+        index = minmax_indices(_as_float(data[y]), target)
+    else:
+        xs = _as_float(data[x]) if x is not None else np.arange(n, dtype=float)
+        index = lttb_indices(xs, _as_float(data[y]), target)
+    return data.iloc[index]
+
+
+def chart_suite(charts, data, columns=1):
+    """
+    Combine charts into one spec that shares a single copy of the data.
+
+    Parameters:
+        charts (list of alt.Chart): Charts built from ``alt.Chart()`` with no
+            data of their own.
+        data (pandas.DataFrame): The dataset every chart reads.
+        columns (int): Charts per row.
+
+    Returns:
+        alt.ConcatChart: The combined chart with ``data`` attached once.
+    """
+    return alt.concat(*charts, data=data, columns=columns)
+
+
+def generate_charts(data):
+    """
+    Build the standard record charts for a ``name``/``description`` table.
+
+    Parameters:
+        data (pandas.DataFrame): Rows with ``id``, ``name`` and ``description``
+            columns, already downsampled.
+
+    Returns:
+        alt.ConcatChart: Every chart in one spec sharing ``data``.
+    """
+    # Bar Chart
+    chart = alt.Chart().mark_bar().encode(
+        x="id:O",
+        y=alt.Y("name:N", sort=None),
+        tooltip=["name", "description"]
+    ).interactive()
+
+    # Pie Chart
+    pie_chart = alt.Chart().mark_arc().encode(
+        theta=alt.Theta(field="id", type="quantitative"),
+        color=alt.Color(field="name", type="nominal"),
+        tooltip=["name", "description"]
+    ).properties(title="Distribution of Records by Name")
+
+    # Scatter Plot
+    scatter_plot = alt.Chart().mark_circle(size=100).encode(
+        x=alt.X("id:O", axis=alt.Axis(title="ID")),
+        y=alt.Y("name:N", axis=alt.Axis(title="Name")),
+        color="name:N",
+        tooltip=["name", "description"]
+    ).interactive().properties(title="Scatter Plot of Records")
+
+    # Line Chart
+    line_chart = alt.Chart().mark_line(point=True).encode(
+        x=alt.X("id:O", axis=alt.Axis(title="ID")),
+        y=alt.Y("id:Q", axis=alt.Axis(title="ID (Quantitative for Line)")),
+        color="name:N",
+        tooltip=["name", "description"]
+    ).interactive().properties(title="Trend of IDs Across Records")
+
+    # Stacked Bar Chart
+    stacked_bar_chart = alt.Chart().mark_bar().encode(
+        x=alt.X("name:N", axis=alt.Axis(title="Name")),
+        y=alt.Y("id:Q", axis=alt.Axis(title="ID")),
+        color="name:N",
+        tooltip=["name", "description"]
+    ).properties(title="Stacked Bar Chart of Names")
+
+    # Heatmap
+    heatmap = alt.Chart().mark_rect().encode(
+        x=alt.X("name:N", axis=alt.Axis(title="Name")),
+        y=alt.Y("id:O", axis=alt.Axis(title="ID")),
+        color=alt.Color("id:Q", scale=alt.Scale(scheme="blues"), title="ID Value"),
+        tooltip=["name", "description"]
+    ).properties(title="Heatmap of IDs by Name")
+
+    # Area Chart
+    area_chart = alt.Chart().mark_area(opacity=0.5).encode(
+        x=alt.X("id:O", axis=alt.Axis(title="ID")),
+        y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
+        color=alt.Color("name:N", legend=alt.Legend(title="Name")),
+        tooltip=["name", "description"]
+    ).properties(title="Area Chart of IDs by Name")
+
+    # Histogram
+    histogram = alt.Chart().mark_bar().encode(
+        x=alt.X("id:Q", bin=True, axis=alt.Axis(title="ID Bins")),
+        y=alt.Y("count():Q", axis=alt.Axis(title="Count")),
+        color=alt.Color("name:N", legend=alt.Legend(title="Name")),
+        tooltip=["name", "description"]
+    ).properties(title="Histogram of IDs")
+
+    # Scatter Plot with Brush
+    brush = alt.selection_interval()
+    scatter_with_brush = alt.Chart().mark_circle(size=100).encode(
+        x=alt.X("id:O", axis=alt.Axis(title="ID")),
+        y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
+        color=alt.condition(brush, "name:N", alt.value("lightgray")),
+        tooltip=["name", "description"]
+    ).add_params(
+        brush
+    ).properties(title="Scatter Plot with Interactive Brush Filter")
+
+    # Bubble Chart
+    bubble_chart = alt.Chart().mark_circle().encode(
+        x=alt.X("id:Q", axis=alt.Axis(title="ID")),
+        y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
+        size=alt.Size("id:Q", title="Size by ID"),
+        color="name:N",
+        tooltip=["name", "description"]
+    ).properties(title="Bubble Chart of IDs by Name")
+
+    # Sorted Bar Chart
+    sorted_bar_chart = alt.Chart().mark_bar().encode(
+        x=alt.X("id:Q", axis=alt.Axis(title="ID Value")),
+        y=alt.Y("name:N", sort="-x", axis=alt.Axis(title="Name")),
+        color="name:N",
+        tooltip=["name", "description"]
+    ).properties(title="Bar Chart Sorted by ID")
+
+    # Text Chart
+    text_chart = alt.Chart().mark_text(size=14).encode(
+        x=alt.X("id:O", axis=alt.Axis(title="ID")),
+        y=alt.Y("name:N", axis=alt.Axis(title="Name")),
+        text="description:N",
+        color=alt.Color("name:N", legend=alt.Legend(title="Name")),
+        tooltip=["name", "description"]
+    ).properties(title="Text Chart Displaying Descriptions")
+    return chart_suite([
+        chart,
+        pie_chart,
+        scatter_plot,
+        line_chart,
+        stacked_bar_chart,
+        heatmap,
+        area_chart,
+        histogram,
+        scatter_with_brush,
+        bubble_chart,
+        sorted_bar_chart,
+        text_chart,
+    ], data)
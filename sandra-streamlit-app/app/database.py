@@ -1,107 +1,269 @@
+"""
+Database management module for the SANDRA Streamlit app.
+
+This module handles all interactions with the SQLite database, including
+connection, initialization, data insertion, retrieval, updating, and deletion.
+
+Connections are handed out by a bounded, process-wide pool that keeps one
+WAL-mode connection per thread; every statement they run is timed into
+``metrics``. Streamlit reruns the app script on every
+widget interaction, so the pool (and the schema setup it runs once per
+database file) lives at module level and survives those reruns.
+"""
+
+import json
+import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
 
-def connect_db():
-    """Connects to the SQLite database."""
-    DB_FILENAME = Path(__file__).parent.parent / "data" / "sandra.db"
-    db_already_exists = DB_FILENAME.exists()
+try:
+    from .alerts import initialize_alerts
+    from .live import LatestValues
+    from .migrations import migrate
+    from .metrics import InstrumentedConnection, metrics
+    from .rollups import initialize_rollups, refresh_rollups
+    from .telemetry import to_text
+except ImportError:
+    from alerts import initialize_alerts
+    from live import LatestValues
+    from migrations import migrate
+    from metrics import InstrumentedConnection, metrics
+    from rollups import initialize_rollups, refresh_rollups
+    from telemetry import to_text
+
+DB_PATH = Path(
+    os.environ.get("SANDRA_DB_PATH", Path(__file__).parent.parent / "data" / "sandra.db")
+)
+MAX_CONNECTIONS = 8
+BUSY_TIMEOUT = 5.0
+ACQUIRE_TIMEOUT = 30.0
+# Nothing signals a thread's exit, so waiters look for dead owners this often
+RECLAIM_INTERVAL = 0.1
+# Column the start/end predicate of bulk operations filters on
+TIME_COLUMNS = ("timestamp", "created_at")
+
+_pools = {}
+_pools_lock = threading.Lock()
+_latest_values = {}
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections with one connection per thread.
 
-    conn = sqlite3.connect(DB_FILENAME)
-    db_was_just_created = not db_already_exists
-    return conn, db_was_just_created
+    A thread keeps the connection it was given until it calls ``release`` or
+    exits; connections of dead threads are reclaimed and handed to new threads,
+    which is what happens between Streamlit reruns.
 
-def initialize_db(conn):
-    """Initializes the database with tables and default data."""
-    cursor = conn.cursor()
+    Parameters:
+        db_path (str or Path): The database file to connect to.
+        max_connections (int): The maximum number of open connections.
+        initializer (callable): Optional function run once with the first
+            connection, e.g. to create the schema.
+        read_only (bool): Refuse writes on every connection, e.g. on a replica.
+    """
 
-    # Create necessary tables
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS energy_storage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            technology TEXT,
-            capacity REAL,
-            efficiency REAL,
-            status TEXT
+    def __init__(self, db_path, max_connections=MAX_CONNECTIONS, initializer=None, read_only=False):
+        self.db_path = str(db_path)
+        self.max_connections = max_connections
+        self.read_only = read_only
+        self._idle = []
+        self._owned = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        if initializer is not None:
+            conn = self.connection()
+            try:
+                initializer(conn)
+            finally:
+                self.release()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
         )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS real_time_monitoring (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            parameter TEXT,
-            value REAL,
-            unit TEXT,
-            timestamp TEXT
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS applications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sector TEXT,
-            description TEXT,
-            impact TEXT
-        )
-    """)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        if self.read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _reclaim(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._owned if ident not in alive]:
+            conn = self._owned.pop(ident)
+            # The thread may have died mid-transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.append(conn)
+
+    def connection(self, timeout=ACQUIRE_TIMEOUT):
+        """
+        Return the calling thread's connection, checking one out if needed.
 
-    conn.commit()
+        Parameters:
+            timeout (float): Seconds to wait for a free connection.
 
-def load_table(conn, table_name):
-    """Loads data from a specific table in the database."""
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table_name}")
-    data = cursor.fetchall()
-    columns = [description[0] for description in cursor.description]
-    return data, columns
+        Returns:
+            sqlite3.Connection: The connection owned by the current thread.
+        """
+        ident = threading.get_ident()
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            conn = self._owned.get(ident)
+            if conn is not None:
+                return conn
+            deadline = time.monotonic() + timeout
+            while not self._idle and self._size >= self.max_connections:
+                self._reclaim()
+                if self._idle:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        f"No free connection to {self.db_path} "
+                        f"after {timeout}s ({self.max_connections} in use)"
+                    )
+                self._cond.wait(min(remaining, RECLAIM_INTERVAL))
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = self._open()
+                self._size += 1
+            self._owned[ident] = conn
+            return conn
+
+    def release(self):
+        """Return the calling thread's connection to the pool."""
+        with self._cond:
+            conn = self._owned.pop(threading.get_ident(), None)
+            if conn is not None:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def close(self):
+        """Close every connection held by the pool."""
+        with self._cond:
+            self._closed = True
+            for conn in self._idle + list(self._owned.values()):
+                conn.close()
+            self._idle.clear()
+            self._owned.clear()
+            self._size = 0
+            self._cond.notify_all()
+
+
+def get_pool(db_path=DB_PATH, initializer=None, max_connections=MAX_CONNECTIONS, read_only=False):
+    """
+    Return the process-wide connection pool for a database file.
 
-"""
-Database management module for the SANDRA Streamlit app.
+    The pool is created on first use and its initializer runs only then, so
+    schema setup happens once per database per process.
 
-This module handles all interactions with the SQLite database, including
-connection, initialization, data insertion, retrieval, updating, and deletion.
-"""
+    Parameters:
+        db_path (str or Path): The database file.
+        initializer (callable): Optional schema setup run on pool creation.
+        max_connections (int): The maximum number of open connections.
+        read_only (bool): Open the connections read-only on pool creation.
 
-import sqlite3
-from pathlib import Path
+    Returns:
+        ConnectionPool: The shared pool for ``db_path``.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(key, max_connections, initializer, read_only)
+            _pools[key] = pool
+        return pool
 
 
-def connect_db(db_name="sandra.db"):
+def close_pools():
+    """Close every pool opened by this process."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def connect_db(db_path=DB_PATH):
     """
-    Establish a connection to the SQLite database.
+    Get a pooled connection to the SQLite database.
 
     Parameters:
-        db_name (str): The name of the database file.
+        db_path (str or Path): The database file; defaults to ``DB_PATH``.
 
     Returns:
-        sqlite3.Connection: A connection object to the SQLite database.
+        sqlite3.Connection: The current thread's connection to the database.
     """
-    db_path = Path(__file__).parent / db_name
-    conn = sqlite3.connect(db_path)
-    return conn
+    return get_pool(db_path, initializer=initialize_db).connection()
 
 
 def initialize_db(conn):
     """
     Initialize the database with required tables.
 
+    New databases get the current schema and existing ones are migrated to
+    it (see ``migrations``).
+
     Parameters:
         conn (sqlite3.Connection): A connection object to the SQLite database.
     """
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS sandra (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            feature TEXT NOT NULL,
-            description TEXT NOT NULL,
-            status TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    migrate(conn)
+    initialize_rollups(conn)
+    initialize_alerts(conn)
+
+
+def table_columns(conn, table_name):
+    """
+    List the column names of a table.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to inspect.
+
+    Returns:
+        list of str: The column names, or an empty list if the table is missing.
+    """
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+
+@metrics.instrument("query")
+def load_table(conn, table_name, cache=None):
+    """
+    Load all rows from a specific table in the database.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to read.
+        cache (QueryCache): Optional result cache; the result is reused until
+            the table changes.
+
+    Returns:
+        tuple: The list of rows and the list of column names.
+    """
+    if cache is not None:
+        return cache.get_or_load(
+            conn, ("load_table", table_name), (table_name,), lambda: load_table(conn, table_name)
         )
-        """
-    )
-    conn.commit()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {table_name}")
+    data = cursor.fetchall()
+    columns = [description[0] for description in cursor.description]
+    return data, columns
 
 
+@metrics.instrument("query")
 def insert_data(conn, feature, description, status):
     """
     Insert a new record into the database.
@@ -123,6 +285,7 @@ def insert_data(conn, feature, description, status):
     conn.commit()
 
 
+@metrics.instrument("query")
 def fetch_data(conn):
     """
     Retrieve all records from the database.
@@ -139,6 +302,7 @@ def fetch_data(conn):
     return records
 
 
+@metrics.instrument("query")
 def update_data(conn, record_id, feature=None, description=None, status=None):
     """
     Update an existing record in the database.
@@ -164,6 +328,9 @@ def update_data(conn, record_id, feature=None, description=None, status=None):
         updates.append("status = ?")
         parameters.append(status)
 
+    if not updates:
+        return
+
     parameters.append(record_id)
 
     query = f"UPDATE sandra SET {', '.join(updates)} WHERE id = ?"
@@ -171,6 +338,7 @@ def update_data(conn, record_id, feature=None, description=None, status=None):
     conn.commit()
 
 
+@metrics.instrument("query")
 def delete_data(conn, record_id):
     """
     Delete a record from the database.
@@ -184,116 +352,177 @@ def delete_data(conn, record_id):
     conn.commit()
 
 
-if __name__ == "__main__":
-    # For testing purposes
-    connection = connect_db()
-    initialize_db(connection)
-    print("Database initialized.")
-    connection.close()
+def record_selection(columns, ids=None, id_range=None, parameter=None, start=None, end=None):
+    """
+    Build the WHERE clause of a bulk update or delete.
 
+    Criteria are combined with AND. An id list is passed as a single JSON
+    parameter, so its length is not limited by SQLite's variable count.
 
-import sqlite3
+    Parameters:
+        columns (iterable of str): Columns of the target table.
+        ids (iterable of int): Select these ids.
+        id_range (tuple): Select ids from ``first`` to ``last``, inclusive.
+        parameter (str): Select readings of this parameter.
+        start: Select rows at or after this time (anything ``to_text`` accepts).
+        end: Select rows before this time.
 
-# Connect to the SQLite database
-def connect_db():
-    conn = sqlite3.connect('data/sandra.db')
-    return conn
+    Returns:
+        tuple: The clause (without ``WHERE``) and its parameters.
 
-# Function to update data in the database
-def update_data(id, new_value):
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    # Example: Update a record with the given ID
-    cursor.execute("UPDATE table_name SET column_name = ? WHERE id = ?", (new_value, id))
-    
-    # Commit and close the connection
-    conn.commit()
-    conn.close()
+    Raises:
+        ValueError: If no criterion is given, or the table lacks a column one
+        of them needs.
+    """
+    columns = set(columns)
+    clauses = []
+    params = []
+    if ids is not None:
+        clauses.append("id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps([int(record_id) for record_id in ids]))
+    if id_range is not None:
+        clauses.append("id BETWEEN ? AND ?")
+        params.extend(int(bound) for bound in id_range)
+    if parameter is not None:
+        if "parameter" not in columns:
+            raise ValueError("The table has no parameter column")
+        clauses.append("parameter = ?")
+        params.append(parameter)
+    if start is not None or end is not None:
+        time_column = next((column for column in TIME_COLUMNS if column in columns), None)
+        if time_column is None:
+            raise ValueError("The table has no timestamp column")
+        if start is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(to_text(start))
+        if end is not None:
+            clauses.append(f"{time_column} < ?")
+            params.append(to_text(end))
+    if not clauses:
+        raise ValueError("Select rows by ids, id range, parameter or time")
+    return " AND ".join(clauses), params
+
+
+def _touched_days(conn, table_name, columns, clause, params):
+    # Parameter-days whose rollups a bulk change of real_time_monitoring invalidates
+    if table_name != "real_time_monitoring" or not {"parameter", "timestamp"} <= columns:
+        return set()
+    return set(
+        conn.execute(
+            f"SELECT DISTINCT parameter, substr(timestamp, 1, 10) FROM {table_name} "
+            f"WHERE {clause} AND parameter IS NOT NULL AND timestamp IS NOT NULL",
+            params,
+        ).fetchall()
+    )
 
-# Function to retrieve data from the database
-def get_data():
-    conn = connect_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM table_name")
-    data = cursor.fetchall()
-    
-    conn.close()
-    return data
-import sqlite3
 
-# Connect to the SQLite database
-def connect_db():
-    conn = sqlite3.connect('data/sandra.db')
-    return conn
+@metrics.instrument("query")
+def bulk_update(conn, table_name, values, **selection):
+    """
+    Update every selected row in one transaction.
 
-# Function to create a table
-def create_table():
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS table_name (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            column1 TEXT,
-            column2 INTEGER,
-            column3 REAL
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to update.
+        values (dict): ``column -> new value``.
+        **selection: Criteria accepted by ``record_selection``.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    columns = set(table_columns(conn, table_name))
+    unknown = set(values) - columns
+    if not values or unknown:
+        raise ValueError(f"Nothing to update or unknown columns: {sorted(unknown)}")
+    clause, params = record_selection(columns, **selection)
+    if "timestamp" in values:
+        values = dict(values, timestamp=to_text(values["timestamp"]))
+    assignments = ", ".join(f"{column} = ?" for column in values)
+    with conn:
+        days = _touched_days(conn, table_name, columns, clause, params)
+        cursor = conn.execute(
+            f"UPDATE {table_name} SET {assignments} WHERE {clause}", [*values.values(), *params]
         )
-    ''')
-    conn.commit()
-    conn.close()
+        if days and {"parameter", "value", "timestamp"} & set(values):
+            moved = {(values.get("parameter", p), values.get("timestamp", t)) for p, t in days}
+            refresh_rollups(conn, days | moved)
+    return cursor.rowcount
 
-# Function to insert data into the table
-def insert_data(column1, column2, column3):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO table_name (column1, column2, column3) 
-        VALUES (?, ?, ?)
-    ''', (column1, column2, column3))
-    conn.commit()
-    conn.close()
 
-# Function to retrieve data from the table
-def get_data():
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM table_name")
-    data = cursor.fetchall()
-    conn.close()
-    return data
+@metrics.instrument("query")
+def bulk_delete(conn, table_name, **selection):
+    """
+    Delete every selected row in one transaction.
 
-# Function to update data in the table
-def update_data(id, column1, column2, column3):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE table_name
-        SET column1 = ?, column2 = ?, column3 = ?
-        WHERE id = ?
-    ''', (column1, column2, column3, id))
-    conn.commit()
-    conn.close()
+    Rollups of the affected ``real_time_monitoring`` days are recomputed in
+    the same transaction.
 
-# Function to delete data from the table
-def delete_data(id):
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM table_name WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to delete from.
+        **selection: Criteria accepted by ``record_selection``.
 
-# Function to commit changes (for transactional purposes)
-def commit_changes():
-    conn = connect_db()
-    conn.commit()
-    conn.close()
+    Returns:
+        int: The number of rows deleted.
+    """
+    columns = set(table_columns(conn, table_name))
+    clause, params = record_selection(columns, **selection)
+    with conn:
+        days = _touched_days(conn, table_name, columns, clause, params)
+        cursor = conn.execute(f"DELETE FROM {table_name} WHERE {clause}", params)
+        refresh_rollups(conn, days)
+    return cursor.rowcount
 
-# Function to drop a table
-def drop_table():
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS table_name")
-    conn.commit()
-    conn.close()
 
+def latest_values(db_path=DB_PATH):
+    """
+    Return the process-wide latest-value cache of a database.
+
+    Parameters:
+        db_path (str or Path): The database file; defaults to ``DB_PATH``.
+
+    Returns:
+        LatestValues: The shared cache for ``db_path``.
+    """
+    pool = get_pool(db_path, initializer=initialize_db)
+    with _pools_lock:
+        values = _latest_values.get(pool.db_path)
+        if values is None or values.pool is not pool:
+            values = _latest_values[pool.db_path] = LatestValues(pool)
+        return values
+
+
+def latest(parameter, db_path=DB_PATH):
+    """
+    Get the current reading of a monitored parameter without scanning
+    ``real_time_monitoring``.
+
+    Parameters:
+        parameter (str): The monitored parameter.
+        db_path (str or Path): The database file; defaults to ``DB_PATH``.
+
+    Returns:
+        Reading or None: ``(parameter, value, unit, timestamp)``, or None if
+        the parameter has no readings.
+    """
+    return latest_values(db_path).latest(parameter)
+
+
+def latest_all(db_path=DB_PATH):
+    """
+    Get the current reading of every monitored parameter.
+
+    Parameters:
+        db_path (str or Path): The database file; defaults to ``DB_PATH``.
+
+    Returns:
+        dict: ``parameter -> Reading``.
+    """
+    return latest_values(db_path).latest_all()
+
+
+if __name__ == "__main__":
+    # For testing purposes
+    connection = connect_db()
+    print("Database initialized.")
+    close_pools()
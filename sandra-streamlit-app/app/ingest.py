@@ -0,0 +1,174 @@
+"""
+Bulk ingestion of sensor readings for the SANDRA Streamlit app.
+
+Readings are streamed in fixed-size chunks through ``executemany`` with one
+transaction per chunk, so a burst of thousands of readings costs a handful of
+commits instead of one fsync per row.
+"""
+
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+try:
+    from .database import connect_db
+    from .rollups import update_rollups
+    from .telemetry import to_text
+except ImportError:
+    from database import connect_db
+    from rollups import update_rollups
+    from telemetry import to_text
+
+CHUNK_SIZE = 5000
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+READING_FIELDS = ("parameter", "value", "unit", "timestamp")
+# Timestamps already in the stored form skip parsing
+TEXT_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+
+
+class IngestReport(namedtuple("IngestReport", ["rows", "chunks", "seconds", "rejected"])):
+    """Summary of an ingestion run."""
+
+    __slots__ = ()
+
+    @property
+    def rows_per_second(self):
+        """float: Achieved ingestion throughput."""
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows in {self.chunks} chunks, {self.seconds:.3f}s "
+            f"({self.rows_per_second:,.0f} rows/s), {self.rejected} rejected"
+        )
+
+
+def normalize_reading(reading):
+    """
+    Convert a reading to a ``(parameter, value, unit, timestamp)`` tuple.
+
+    Parameters:
+        reading (tuple or dict): A reading as a sequence in column order or a
+            mapping keyed by column name.
+
+    Returns:
+        tuple: The reading in ``real_time_monitoring`` column order, with
+        datetimes, epoch numbers and ISO 8601 strings (offsets included)
+        formatted as "YYYY-MM-DD HH:MM:SS" UTC so the TEXT column compares
+        chronologically.
+
+    Raises:
+        ValueError: If the timestamp cannot be parsed.
+    """
+    if isinstance(reading, dict):
+        reading = tuple(reading.get(field) for field in READING_FIELDS)
+    parameter, value, unit, timestamp = reading
+    if isinstance(timestamp, str) and TEXT_TIMESTAMP.fullmatch(timestamp):
+        return parameter, value, unit, timestamp
+    if isinstance(timestamp, (datetime, int, float, str)):
+        try:
+            timestamp = to_text(timestamp)
+        except (TypeError, ValueError, OverflowError) as exc:
+            raise ValueError(f"Unparseable timestamp {timestamp!r}") from exc
+    return parameter, value, unit, timestamp
+
+
+def _normalized(readings, rejected):
+    # Normalize lazily, counting readings whose timestamp cannot be parsed
+    for reading in readings:
+        try:
+            yield normalize_reading(reading)
+        except ValueError:
+            rejected[0] += 1
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` items from an iterable.
+
+    Parameters:
+        iterable (iterable): The items to split.
+        size (int): The chunk size.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_readings(
+    readings, conn=None, chunk_size=CHUNK_SIZE, synchronous="NORMAL", store=None, rollups=True,
+    latest=None, alerts=None,
+):
+    """
+    Insert sensor readings in chunks, one transaction per chunk.
+
+    Parameters:
+        readings (iterable): Readings accepted by ``normalize_reading``; may be
+            a generator, it is consumed lazily.
+        conn (sqlite3.Connection): The connection to use; defaults to the
+            pooled connection from ``connect_db``. Ignored when ``store`` is
+            given, which always writes through its own pool.
+        chunk_size (int): Number of rows per ``executemany`` and commit.
+        synchronous (str): SQLite ``synchronous`` level for the run: "OFF"
+            trades crash durability for speed, "FULL" or "EXTRA" fsync more.
+        store (TelemetryStore): Write to this partitioned store instead of
+            ``real_time_monitoring``.
+        rollups (bool): Fold each chunk into ``telemetry_rollups`` in the same
+            transaction.
+        latest (LatestValues): Fold each committed chunk into this
+            latest-value cache, e.g. ``latest_values()`` when ingesting through
+            the same pool that serves ``latest``. Ignored with ``store``,
+            whose partitions have no ``telemetry_latest`` side table.
+        alerts (AlertEngine): Check each chunk against the alert rules and
+            record alerts in the same transaction. Ignored with ``store``.
+
+    Returns:
+        IngestReport: Rows written, chunk count, elapsed time and rows/s, and
+        the number of readings skipped for an unparseable timestamp.
+    """
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    if store is not None:
+        conn = store.pool.connection()
+    elif conn is None:
+        conn = connect_db()
+
+    if alerts is not None and store is None:
+        alerts.refresh(conn)
+    else:
+        alerts = None
+    previous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    rows = chunks = 0
+    rejected = [0]
+    started = time.perf_counter()
+    try:
+        for chunk in chunked(_normalized(readings, rejected), chunk_size):
+            with conn:
+                if store is not None:
+                    store.insert_many(chunk, commit=False)
+                else:
+                    conn.executemany(
+                        "INSERT INTO real_time_monitoring (parameter, value, unit, timestamp) "
+                        "VALUES (?, ?, ?, ?)",
+                        chunk,
+                    )
+                if rollups:
+                    update_rollups(conn, chunk)
+                if alerts is not None:
+                    alerts.check(conn, chunk)
+            if latest is not None and store is None:
+                latest.record(chunk)
+            rows += len(chunk)
+            chunks += 1
+    finally:
+        conn.execute(f"PRAGMA synchronous={previous}")
+    return IngestReport(rows, chunks, time.perf_counter() - started, rejected[0])
@@ -0,0 +1,393 @@
+"""
+Live monitoring caches for the SANDRA Streamlit app.
+
+``LatestValues`` answers "what is the current reading of X" for every
+process and session. Triggers keep the ``telemetry_latest`` side table
+current on every insert (see ``rollups``); the values are held in memory and
+reloaded from that table, a row per parameter, only after another connection
+commits, so a lookup is a dictionary read and never touches
+``real_time_monitoring``.
+
+``TelemetryFrame`` keeps one compact, read-only pandas copy of the readings
+per process for every dashboard session to share: parameter and unit are
+categoricals, timestamps int64 epoch seconds and values float32. Each
+refresh is a primary-key range seek for rows after the last id seen, plus
+the ids that ``telemetry_changes`` lists as updated or deleted since, so its
+cost depends on what changed, not on the table size. The new frame is built
+copy-on-write, so a session keeps drawing from the frame it got while the
+next one is built. pandas is imported only when the frame loads.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from .rollups import load_latest_readings
+except ImportError:
+    from rollups import load_latest_readings
+
+WINDOW = 500
+FRAME_ROWS = 1_000_000
+FRAME_INTERVAL = 1.0
+FETCH_SIZE = 50_000
+# Changed ids kept in telemetry_changes; a frame further behind reloads
+CHANGE_LOG_ROWS = 100_000
+CATEGORY_COLUMNS = ("parameter", "unit")
+# Epoch seconds for both storage forms of real_time_monitoring.timestamp
+EPOCH_SQL = (
+    "CASE WHEN typeof(timestamp) IN ('integer', 'real') THEN CAST(timestamp AS INTEGER) "
+    "ELSE CAST(strftime('%s', timestamp) AS INTEGER) END"
+)
+
+
+def install_change_log(conn):
+    """
+    Log the ids of updated and deleted ``real_time_monitoring`` rows.
+
+    ``TelemetryFrame`` re-reads just those ids instead of reloading. Inserts
+    are not logged: new rows are found by id.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_changes (
+            seq INTEGER PRIMARY KEY,
+            row_id INTEGER NOT NULL
+        );
+
+        CREATE TRIGGER IF NOT EXISTS telemetry_changes_au
+        AFTER UPDATE ON real_time_monitoring BEGIN
+            INSERT INTO telemetry_changes (row_id) SELECT old.id UNION SELECT new.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS telemetry_changes_ad
+        AFTER DELETE ON real_time_monitoring BEGIN
+            INSERT INTO telemetry_changes (row_id) VALUES (old.id);
+        END;
+        """
+    )
+
+
+Reading = namedtuple("Reading", ["parameter", "value", "unit", "timestamp"])
+
+
+class LatestValues:
+    """
+    In-memory last-value cache per parameter, backed by ``telemetry_latest``.
+
+    Parameters:
+        pool (ConnectionPool): Pool of the database to follow; each thread
+            reads through its own pooled connection.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._values = {}
+        self._data_versions = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _sync(self):
+        # data_version changes when another connection commits; only then is
+        # the side table read again.
+        conn = self.pool.connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_versions.get(id(conn)) == version:
+            return
+        rows, _ = load_latest_readings(conn)
+        with self._lock:
+            self._data_versions[id(conn)] = version
+            self._values = {
+                parameter: Reading(parameter, value, unit, timestamp)
+                for parameter, _, value, unit, timestamp in rows
+            }
+            self.reloads += 1
+
+    def record(self, readings):
+        """
+        Fold readings committed through this process's own connection.
+
+        Such commits do not change that connection's ``data_version``, so
+        writers that share the pool call this after committing.
+
+        Parameters:
+            readings (iterable): ``(parameter, value, unit, timestamp)`` tuples.
+        """
+        with self._lock:
+            values = dict(self._values)
+            for parameter, value, unit, timestamp in readings:
+                if parameter is None or timestamp is None:
+                    continue
+                current = values.get(parameter)
+                if current is None or current.timestamp is None or timestamp >= current.timestamp:
+                    values[parameter] = Reading(parameter, value, unit, timestamp)
+            self._values = values
+
+    def latest(self, parameter):
+        """
+        Return the current reading of a parameter.
+
+        Parameters:
+            parameter (str): The monitored parameter, e.g. "core_temperature".
+
+        Returns:
+            Reading or None: The reading with the newest timestamp, or None if
+            the parameter has none.
+        """
+        self._sync()
+        return self._values.get(parameter)
+
+    def latest_all(self):
+        """
+        Return the current reading of every parameter.
+
+        Returns:
+            dict: ``parameter -> Reading``. The dictionary is a snapshot that
+            later writes do not change.
+        """
+        self._sync()
+        return self._values
+
+
+def _compact(rows):
+    import numpy as np
+    import pandas as pd
+
+    ids, parameters, values, units, timestamps = zip(*rows)
+    # Readings without a timestamp cannot be placed on a time axis
+    keep = np.array([timestamp is not None for timestamp in timestamps])
+    frame = pd.DataFrame({
+        "id": np.array(ids, dtype=np.int64),
+        "parameter": pd.Categorical(parameters),
+        "value": np.array(values, dtype=np.float32),
+        "unit": pd.Categorical(units),
+        "timestamp": np.array([timestamp or 0 for timestamp in timestamps], dtype=np.int64),
+    })
+    return frame if keep.all() else frame[keep]
+
+
+def _concat(parts):
+    import pandas as pd
+
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    # Shared categories keep the concatenated columns categorical; the
+    # existing frame's categories stay first so its codes do not change.
+    for column in CATEGORY_COLUMNS:
+        categories = parts[0][column].cat.categories
+        for part in parts[1:]:
+            categories = categories.append(part[column].cat.categories.difference(categories, sort=False))
+        parts = [part.assign(**{column: part[column].cat.set_categories(categories)}) for part in parts]
+    return pd.concat(parts, ignore_index=True)
+
+
+class TelemetryFrame:
+    """
+    One compact, read-only DataFrame of the latest readings shared by all sessions.
+
+    At most once per ``interval`` the rows added after the last id held are
+    appended, and the rows ``telemetry_changes`` lists as updated or deleted
+    since the last check are re-read or dropped (see ``install_change_log``).
+    The frame reloads only when that log is missing, was pruned past the
+    frame's position, or lists more than ``CHANGE_LOG_ROWS`` ids.
+
+    Parameters:
+        pool (ConnectionPool): Pool of the database to follow.
+        max_rows (int): The newest readings kept; older ones are dropped.
+        interval (float): Minimum seconds between checks for new readings.
+    """
+
+    def __init__(self, pool, max_rows=FRAME_ROWS, interval=FRAME_INTERVAL):
+        self.pool = pool
+        self.max_rows = max_rows
+        self.interval = interval
+        # The frame and the selections computed from it, swapped together
+        self._current = (None, {})
+        self._last_id = 0
+        self._seq = None
+        self._version = None
+        self._loaded = False
+        self._checked = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.appends = 0
+        self.patches = 0
+
+    def _log_range(self, conn):
+        try:
+            return conn.execute("SELECT min(seq), max(seq) FROM telemetry_changes").fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    def _fetch(self, conn, after_id):
+        cursor = conn.execute(
+            f"""
+            SELECT id, parameter, value, unit, {EPOCH_SQL}
+            FROM real_time_monitoring
+            WHERE id > ?
+            ORDER BY id
+            """,
+            (after_id,),
+        )
+        parts, fetched, last_id = [], 0, after_id
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                return parts, fetched, last_id
+            fetched += len(rows)
+            last_id = rows[-1][0]
+            parts.append(_compact(rows))
+
+    def _first_id(self, conn):
+        # Seek straight to the newest max_rows rows instead of reading them all
+        row = conn.execute(
+            "SELECT id FROM real_time_monitoring ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (self.max_rows - 1,),
+        ).fetchone()
+        return row[0] - 1 if row else 0
+
+    def _patch(self, conn, frame, ids):
+        # Drop the changed rows and read back those that still exist
+        kept = frame[~frame["id"].isin(ids)]
+        rows = conn.execute(
+            f"""
+            SELECT id, parameter, value, unit, {EPOCH_SQL}
+            FROM real_time_monitoring
+            WHERE id IN (SELECT value FROM json_each(?)) AND id BETWEEN ? AND ?
+            """,
+            (json.dumps(ids), int(frame["id"].iloc[0]), self._last_id),
+        ).fetchall()
+        if not rows:
+            return kept.reset_index(drop=True)
+        return _concat([kept, _compact(rows)]).sort_values("id", kind="stable", ignore_index=True)
+
+    def _refresh(self, conn):
+        # One read transaction, so the change log matches the rows fetched
+        began = not conn.in_transaction
+        if began:
+            conn.execute("BEGIN")
+        try:
+            log = self._log_range(conn)
+            frame = self._current[0]
+            seq = version = None
+            changed = []
+            if log is None:
+                # Without the change log any commit by another connection
+                # means a reload
+                version = self._data_version(conn)
+                if self._loaded and version == self._version:
+                    return
+                reload = True
+            else:
+                first_seq, seq = log[0], log[1] or 0
+                reload = not self._loaded or (first_seq is not None and first_seq > self._seq + 1)
+                if not reload:
+                    changed = [
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT DISTINCT row_id FROM telemetry_changes WHERE seq > ?", (self._seq,)
+                        )
+                    ]
+                    reload = len(changed) > CHANGE_LOG_ROWS
+            if reload:
+                parts, _, last_id = self._fetch(conn, self._first_id(conn))
+                frame = _concat(parts)
+                self.reloads += 1
+            else:
+                if changed and frame is not None and len(frame):
+                    frame = self._patch(conn, frame, changed)
+                    self.patches += 1
+                parts, _, last_id = self._fetch(conn, self._last_id)
+                if parts:
+                    frame = _concat([frame] + parts) if frame is not None else _concat(parts)
+                    self.appends += 1
+        finally:
+            if began:
+                conn.commit()
+        if frame is not None and len(frame) > self.max_rows:
+            frame = frame.iloc[-self.max_rows:].reset_index(drop=True)
+        self._current = (frame, {})
+        self._last_id, self._seq, self._version, self._loaded = last_id, seq, version, True
+        if log is not None and log[0] is not None and seq - log[0] >= 2 * CHANGE_LOG_ROWS:
+            self._prune(conn, seq - CHANGE_LOG_ROWS)
+
+    def _prune(self, conn, through):
+        # Frames further behind than this reload; a read-only replica skips it
+        try:
+            with conn:
+                conn.execute("DELETE FROM telemetry_changes WHERE seq <= ?", (through,))
+        except sqlite3.OperationalError:
+            pass
+
+    def _data_version(self, conn):
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync(self):
+        if self._checked is not None and time.monotonic() - self._checked < self.interval:
+            return
+        with self._lock:
+            # Another session may have refreshed while this one waited
+            if self._checked is not None and time.monotonic() - self._checked < self.interval:
+                return
+            self._refresh(self.pool.connection())
+            self._checked = time.monotonic()
+
+    def frame(self):
+        """
+        Return the shared readings.
+
+        Returns:
+            pandas.DataFrame: ``id``, ``parameter``, ``value``, ``unit`` and
+            ``timestamp`` (epoch seconds) in id order, or an empty frame. It is
+            a shallow copy: adding or changing columns copies only what is
+            changed and never affects other sessions.
+        """
+        import pandas as pd
+
+        self._sync()
+        frame = self._current[0]
+        if frame is None:
+            return pd.DataFrame(columns=["id", "parameter", "value", "unit", "timestamp"])
+        return frame.copy(deep=False)
+
+    def recent(self, window=WINDOW):
+        """
+        Return the newest readings of every parameter.
+
+        The selection is computed once per refresh and shared by the
+        sessions asking for the same window.
+
+        Parameters:
+            window (int): Readings kept per parameter.
+
+        Returns:
+            pandas.DataFrame: A shallow copy of the selected rows.
+        """
+        self._sync()
+        frame, recent = self._current
+        if frame is None:
+            return self.frame()
+        if window not in recent:
+            recent[window] = frame.groupby("parameter", observed=True, sort=False).tail(window)
+        return recent[window].copy(deep=False)
+
+    def memory_usage(self):
+        """
+        Describe the memory held by the shared frame.
+
+        Returns:
+            dict: ``rows``, total ``bytes`` and ``columns``, the bytes of
+            each column. Sessions share these bytes rather than copying them.
+        """
+        frame = self._current[0]
+        if frame is None:
+            return {"rows": 0, "bytes": 0, "columns": {}}
+        usage = frame.memory_usage(index=False, deep=True)
+        return {"rows": len(frame), "bytes": int(usage.sum()), "columns": usage.astype(int).to_dict()}
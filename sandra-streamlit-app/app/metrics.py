@@ -0,0 +1,417 @@
+"""
+Hot-path instrumentation for the SANDRA app.
+
+Every statement run on a pooled connection, every query helper and every
+chart build is timed into latency histograms labelled by stage ("sql",
+"fetch", "query", "chart", "render") and name, together with the rows it
+returned or changed. Statements slower than ``SLOW_QUERY`` keep their
+``EXPLAIN QUERY PLAN`` output. The process-wide ``metrics`` registry can be
+read by the admin page and exported in the Prometheus text or OpenMetrics
+format, to a file for a textfile collector or from a small HTTP endpoint.
+"""
+
+import contextlib
+import functools
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY = 0.1
+SLOW_QUERY_LOG = 50
+MAX_SERIES = 500
+NAME_LENGTH = 120
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_EXPLAINABLE = {"SELECT", "WITH", "INSERT", "REPLACE", "UPDATE", "DELETE"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_name(sql):
+    """Collapse a statement to one line, short enough to use as a label."""
+    name = _WHITESPACE.sub(" ", sql).strip()
+    return name if len(name) <= NAME_LENGTH else name[: NAME_LENGTH - 3] + "..."
+
+
+def _count_rows(result):
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return len(result[0])
+    if hasattr(result, "__len__") and not isinstance(result, (str, bytes, dict)):
+        return len(result)
+    return None
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with a row counter."""
+
+    __slots__ = ("counts", "count", "sum", "rows")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.rows = 0
+
+    def observe(self, seconds, rows=None):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        if rows is not None and rows > 0:
+            self.rows += rows
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for upper, count in zip(BUCKETS + (float("inf"),), self.counts):
+            if count and seen + count >= rank:
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+
+class Metrics:
+    """
+    A thread-safe registry of latency histograms and slow-query plans.
+
+    Parameters:
+        slow_query (float): Seconds after which a statement's plan is kept.
+        enabled (bool): When false, ``observe`` and friends do nothing.
+    """
+
+    def __init__(self, slow_query=SLOW_QUERY, enabled=True):
+        self.slow_query = slow_query
+        self.enabled = enabled
+        self._series = {}
+        self._slow = deque(maxlen=SLOW_QUERY_LOG)
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stage, name, seconds, rows=None):
+        """
+        Record one timed operation.
+
+        Parameters:
+            stage (str): Where the time went, e.g. "sql" or "chart".
+            name (str): What ran, e.g. a statement or function name.
+            seconds (float): Elapsed wall time.
+            rows (int): Rows returned or changed, if known.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (stage, name)
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= MAX_SERIES:
+                    key = (stage, "other")
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = Histogram()
+            series.observe(seconds, rows)
+
+    def record_slow(self, conn, sql, params, seconds, rows=None):
+        """
+        Keep the query plan of a statement that exceeded ``slow_query``.
+
+        Parameters:
+            conn (sqlite3.Connection): The connection the statement ran on.
+            sql (str): The statement.
+            params: Its parameters.
+            seconds (float): Elapsed wall time.
+            rows (int): Rows returned or changed, if known.
+        """
+        if not self.enabled or seconds < self.slow_query:
+            return
+        words = sql.lstrip().split(None, 1)
+        plan = []
+        if words and words[0].upper() in _EXPLAINABLE:
+            try:
+                plan = [
+                    row[-1]
+                    for row in sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ())
+                ]
+            except sqlite3.Error as exc:
+                plan = [f"(no plan: {exc})"]
+        with self._lock:
+            self._slow.append(
+                {
+                    "at": time.time(),
+                    "seconds": seconds,
+                    "rows": rows,
+                    "sql": statement_name(sql),
+                    "plan": plan,
+                }
+            )
+
+    @contextlib.contextmanager
+    def timed(self, stage, name):
+        """
+        Time a block; set ``span["rows"]`` inside it to record a row count.
+
+        Parameters:
+            stage (str): Where the time goes.
+            name (str): What runs.
+        """
+        span = {"rows": None}
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.observe(stage, name, time.perf_counter() - started, span["rows"])
+
+    def instrument(self, stage, name=None):
+        """
+        Decorator timing every call of a function.
+
+        Row counts are taken from results with a length, and from
+        ``(rows, columns)`` tuples.
+
+        Parameters:
+            stage (str): Where the time goes.
+            name (str): Label to use; defaults to the function's name.
+
+        Returns:
+            callable: The decorator.
+        """
+
+        def decorator(func):
+            label = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                self.observe(stage, label, time.perf_counter() - started, _count_rows(result))
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self):
+        """
+        Summarize every series for display.
+
+        Returns:
+            list of dict: ``stage``, ``name``, ``calls``, ``total_s``, ``mean_ms``,
+            ``p50_ms``, ``p95_ms``, ``p99_ms`` and ``rows``, slowest total first.
+        """
+        with self._lock:
+            summary = [
+                {
+                    "stage": stage,
+                    "name": name,
+                    "calls": series.count,
+                    "total_s": series.sum,
+                    "mean_ms": 1000 * series.sum / series.count,
+                    "p50_ms": 1000 * series.quantile(0.5),
+                    "p95_ms": 1000 * series.quantile(0.95),
+                    "p99_ms": 1000 * series.quantile(0.99),
+                    "rows": series.rows,
+                }
+                for (stage, name), series in self._series.items()
+                if series.count
+            ]
+        return sorted(summary, key=lambda entry: entry["total_s"], reverse=True)
+
+    def slow_queries(self):
+        """
+        Return the most recent slow statements, newest first.
+
+        Returns:
+            list of dict: ``at``, ``seconds``, ``rows``, ``sql`` and ``plan`` entries.
+        """
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        """Forget every recorded series and slow query."""
+        with self._lock:
+            self._series.clear()
+            self._slow.clear()
+            self.started = time.time()
+
+    def export(self, openmetrics=False):
+        """
+        Render all series in the Prometheus text or OpenMetrics format.
+
+        Parameters:
+            openmetrics (bool): Emit OpenMetrics instead of Prometheus 0.0.4 text.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            items = [
+                (stage, name, list(series.counts), series.count, series.sum, series.rows)
+                for (stage, name), series in sorted(self._series.items())
+            ]
+        lines = [
+            "# HELP sandra_latency_seconds Latency of database calls and chart builds.",
+            "# TYPE sandra_latency_seconds histogram",
+        ]
+        for stage, name, counts, count, total, _ in items:
+            labels = f'stage="{_escape(stage)}",name="{_escape(name)}"'
+            cumulative = 0
+            for upper, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'sandra_latency_seconds_bucket{{{labels},le="{upper}"}} {cumulative}')
+            lines.append(f'sandra_latency_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"sandra_latency_seconds_sum{{{labels}}} {total}")
+            lines.append(f"sandra_latency_seconds_count{{{labels}}} {count}")
+        # OpenMetrics names the counter family without the _total suffix
+        family = "sandra_rows" if openmetrics else "sandra_rows_total"
+        lines.append(f"# HELP {family} Rows returned or changed.")
+        lines.append(f"# TYPE {family} counter")
+        for stage, name, _, _, _, rows in items:
+            labels = f'stage="{_escape(stage)}",name="{_escape(name)}"'
+            lines.append(f"sandra_rows_total{{{labels}}} {rows}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, openmetrics=False):
+        """
+        Write the exposition text to a file atomically, e.g. for the
+        node_exporter textfile collector.
+
+        Parameters:
+            path (str or Path): Destination file.
+            openmetrics (bool): Emit OpenMetrics instead of Prometheus text.
+        """
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as handle:
+            handle.write(self.export(openmetrics))
+        os.replace(temporary, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serve ``/metrics`` from a background HTTP server.
+
+        OpenMetrics is returned to scrapers that ask for it in ``Accept``.
+
+        Parameters:
+            port (int): Port to listen on.
+            host (str): Interface to bind.
+
+        Returns:
+            ThreadingHTTPServer: The running server; call ``shutdown()`` to stop it.
+        """
+        # Imported here so headless processes that never serve pay nothing for it
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                body = registry.export(openmetrics).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="sandra-metrics", daemon=True).start()
+        return server
+
+
+metrics = Metrics(enabled=os.environ.get("SANDRA_METRICS", "1") != "0")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that times statements ("sql") and result reads ("fetch")."""
+
+    _sql = None
+    _params = None
+    _elapsed = 0.0
+    _explained = False
+
+    def _start(self, sql, params, started, explain=True):
+        elapsed = time.perf_counter() - started
+        self._sql, self._params, self._elapsed, self._explained = sql, params, elapsed, not explain
+        rows = self.rowcount if self.rowcount >= 0 else None
+        metrics.observe("sql", statement_name(sql), elapsed, rows)
+        self._check_slow(rows)
+
+    def _check_slow(self, rows):
+        if not self._explained and self._elapsed >= metrics.slow_query:
+            self._explained = True
+            metrics.record_slow(self.connection, self._sql, self._params, self._elapsed, rows)
+
+    def _fetched(self, result, started):
+        if self._sql is not None:
+            elapsed = time.perf_counter() - started
+            self._elapsed += elapsed
+            metrics.observe("fetch", statement_name(self._sql), elapsed, len(result))
+            self._check_slow(len(result))
+        return result
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._start(sql, parameters, started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # Keep the first parameter row, so a slow batch can still be explained
+        rows = iter(seq_of_parameters)
+        first = next(rows, None)
+        started = time.perf_counter()
+        super().executemany(sql, () if first is None else itertools.chain((first,), rows))
+        # An empty batch ran nothing and has no row to explain
+        self._start(sql, first, started, explain=first is not None)
+        self._explained = True
+        return self
+
+    def fetchall(self):
+        started = time.perf_counter()
+        return self._fetched(super().fetchall(), started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        result = super().fetchmany(self.arraysize if size is None else size)
+        return self._fetched(result, started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    A connection whose statements are recorded in ``metrics``.
+
+    Pass it as ``factory`` to ``sqlite3.connect``.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
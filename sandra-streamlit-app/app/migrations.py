@@ -0,0 +1,513 @@
+"""
+Versioned schema migrations for the SANDRA database.
+
+The library (``database.initialize_db``) and the Streamlit app used to create
+``energy_storage``, ``real_time_monitoring`` and ``applications`` with
+different columns, so whichever ran first decided the schema. Both now call
+``migrate``, which brings any database to one unified schema: every table has
+the union of both column sets, and columns only one code path fills are
+nullable.
+
+Applied migrations are recorded in ``schema_version``. Each migration is
+idempotent and can be resumed:
+
+- Adding a column is a metadata-only ``ALTER TABLE``.
+- A table whose constraints conflict with the unified schema (the app's
+  ``name TEXT NOT NULL``) is rebuilt online. Triggers mirror writes into the
+  new table while existing rows are copied in id-range batches, each in its
+  own short transaction. One final transaction swaps the tables and
+  recreates their indexes and triggers.
+- Data backfills also run in id-range batches, one transaction each. Their
+  progress is kept in ``schema_backfills``, so an interrupted run continues
+  where it stopped.
+
+Run ``python -m app.migrations`` to migrate a large database before the app
+starts, or ``--status`` to show the applied versions.
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+try:
+    from .telemetry import TEXT_FORMAT
+except ImportError:
+    from telemetry import TEXT_FORMAT
+
+BATCH_SIZE = 5000
+PLACEHOLDER_TABLE = "table_name"
+MIGRATING_SUFFIX = "__migrating"
+# Matches TEXT_FORMAT, the form real_time_monitoring.timestamp is stored in
+TEXT_PATTERN = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]"
+
+# The unified schema: the app's name/description columns next to the
+# library's typed columns
+TABLES = {
+    "energy_storage": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("name", "TEXT"),
+        ("description", "TEXT"),
+        ("technology", "TEXT"),
+        ("capacity", "REAL"),
+        ("efficiency", "REAL"),
+        ("status", "TEXT"),
+    ],
+    "real_time_monitoring": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("name", "TEXT"),
+        ("description", "TEXT"),
+        ("parameter", "TEXT"),
+        ("value", "REAL"),
+        ("unit", "TEXT"),
+        ("timestamp", "TEXT"),
+    ],
+    "applications": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("name", "TEXT"),
+        ("description", "TEXT"),
+        ("sector", "TEXT"),
+        ("impact", "TEXT"),
+    ],
+    "sandra": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("feature", "TEXT NOT NULL"),
+        ("description", "TEXT NOT NULL"),
+        ("status", "TEXT NOT NULL"),
+        ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
+    ],
+}
+
+
+class Migration(namedtuple("Migration", ["version", "name", "upgrade"])):
+    """
+    A schema migration.
+
+    Parameters:
+        version (int): Position in the migration sequence, starting at 1.
+        name (str): Short description, recorded in ``schema_version``.
+        upgrade (callable): ``upgrade(conn, context)``; must be safe to run
+            again after an interruption.
+    """
+
+    __slots__ = ()
+
+
+class MigrationContext(namedtuple("MigrationContext", ["version", "batch_size", "pause", "log"])):
+    """
+    Settings passed to a running migration.
+
+    Parameters:
+        version (int): The migration's version, which keys its backfill progress.
+        batch_size (int): Rows per backfill or copy transaction.
+        pause (float): Seconds to sleep between batches, leaving room for
+            other writers.
+        log (callable): Receives progress messages.
+    """
+
+    __slots__ = ()
+
+
+def _initialize(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_backfills (
+            version INTEGER NOT NULL,
+            task TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            PRIMARY KEY (version, task)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.commit()
+
+
+def _immediate(conn):
+    # Schema changes take the write lock up front and re-check under it, so
+    # two processes migrating at once do not repeat a step.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def _definition(table, columns):
+    return f"CREATE TABLE {table} ({', '.join(f'{name} {decl}' for name, decl in columns)})"
+
+
+def _table_info(conn, table):
+    return list(conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _batch_end(conn, table, last_id, batch_size, max_id):
+    # The id closing the next batch_size rows, so sparse ids never make
+    # empty batches
+    row = conn.execute(
+        f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?", (last_id, batch_size - 1)
+    ).fetchone()
+    return row[0] if row else max_id
+
+
+def current_version(conn):
+    """
+    Return the newest applied migration.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        int: The version, 0 for a database that was never migrated.
+    """
+    _initialize(conn)
+    return conn.execute("SELECT coalesce(max(version), 0) FROM schema_version").fetchone()[0]
+
+
+def add_column(conn, table, column, declaration):
+    """
+    Add a column unless the table already has it.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table (str): The table to change.
+        column (str): The column name.
+        declaration (str): Type and constraints, e.g. "REAL".
+
+    Returns:
+        bool: True if the column was added.
+    """
+    _immediate(conn)
+    try:
+        if column in {row[1] for row in _table_info(conn, table)}:
+            return False
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    finally:
+        conn.commit()
+
+
+def backfill(conn, context, table, assignments, where, task=None):
+    """
+    Update matching rows in id-range batches, one transaction per batch.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        context (MigrationContext): Batch size, pause and progress key.
+        table (str): The table to update; it must have an ``id`` primary key.
+        assignments (str): The ``SET`` clause, e.g. "name = technology".
+        where (str): Rows to update; ``WHERE`` is limited to each batch's ids.
+        task (str): Progress key; defaults to the table name.
+
+    Returns:
+        int: The number of rows updated by this run.
+    """
+    task = task or table
+    row = conn.execute(
+        "SELECT last_id FROM schema_backfills WHERE version = ? AND task = ?", (context.version, task)
+    ).fetchone()
+    last_id = row[0] if row else 0
+    max_id = conn.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+    updated = 0
+    while last_id < max_id:
+        upper = _batch_end(conn, table, last_id, context.batch_size, max_id)
+        with conn:
+            updated += conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE id > ? AND id <= ? AND ({where})", (last_id, upper)
+            ).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_backfills (version, task, last_id) VALUES (?, ?, ?)",
+                (context.version, task, upper),
+            )
+        last_id = upper
+        if context.pause:
+            time.sleep(context.pause)
+    if updated:
+        context.log(f"{task}: {updated} rows updated")
+    return updated
+
+
+def _needs_rebuild(conn, table, columns):
+    # A NOT NULL the unified schema does not have would reject the other
+    # code path's inserts
+    wanted = dict(columns)
+    for _, name, _, notnull, _, pk in _table_info(conn, table):
+        if notnull and not pk and "NOT NULL" not in wanted.get(name, "NOT NULL").upper():
+            return True
+    return False
+
+
+def _mirror_triggers(conn, table, target, columns):
+    names = ", ".join(columns)
+    values = ", ".join(f"new.{column}" for column in columns)
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {target}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT OR REPLACE INTO {target} ({names}) VALUES ({values}); END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {target}_au AFTER UPDATE ON {table} BEGIN "
+        f"DELETE FROM {target} WHERE id = old.id; "
+        f"INSERT OR REPLACE INTO {target} ({names}) VALUES ({values}); END"
+    )
+    conn.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {target}_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {target} WHERE id = old.id; END"
+    )
+
+
+def rebuild_table(conn, context, table, columns):
+    """
+    Recreate a table with a new definition without locking it for long.
+
+    Triggers copy every write to the old table into the new one while the
+    existing rows are copied in id-range batches. The old table is then
+    dropped and the new one renamed in a single short transaction, which
+    also recreates the old table's indexes and triggers and keeps its
+    AUTOINCREMENT counter. Columns the new definition lacks are kept,
+    untyped.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        context (MigrationContext): Batch size, pause and progress key.
+        table (str): The table to rebuild; it must have an ``id`` primary key.
+        columns (list of tuples): ``(name, declaration)`` of the new table.
+    """
+    target = table + MIGRATING_SUFFIX
+    existing = [row[1] for row in _table_info(conn, table)]
+    columns = list(columns) + [(name, "") for name in existing if name not in dict(columns)]
+
+    _immediate(conn)
+    try:
+        if not _exists(conn, target):
+            conn.execute(_definition(target, columns))
+            conn.execute(
+                "DELETE FROM schema_backfills WHERE version = ? AND task = ?", (context.version, f"copy:{table}")
+            )
+        _mirror_triggers(conn, table, target, existing)
+    finally:
+        conn.commit()
+
+    copied = _copy_rows(conn, context, table, target, existing)
+    context.log(f"{table}: {copied} rows copied")
+
+    _immediate(conn)
+    try:
+        objects = conn.execute(
+            "SELECT type, sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL AND name NOT LIKE ?",
+            (table, f"{target}_%"),
+        ).fetchall()
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {target} RENAME TO {table}")
+        # Indexes first, so triggers are created against the final table
+        for _, sql in sorted(objects, key=lambda item: item[0] != "index"):
+            conn.execute(sql)
+        if sequence is not None:
+            conn.execute(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (sequence[0], table)
+            )
+        conn.execute(
+            "DELETE FROM schema_backfills WHERE version = ? AND task = ?", (context.version, f"copy:{table}")
+        )
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    context.log(f"{table}: rebuilt")
+
+
+def _copy_rows(conn, context, table, target, columns):
+    # Rows the triggers already wrote are newer than the copy, hence IGNORE
+    task = f"copy:{table}"
+    names = ", ".join(columns)
+    row = conn.execute(
+        "SELECT last_id FROM schema_backfills WHERE version = ? AND task = ?", (context.version, task)
+    ).fetchone()
+    last_id = row[0] if row else 0
+    max_id = conn.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+    copied = 0
+    while last_id < max_id:
+        upper = _batch_end(conn, table, last_id, context.batch_size, max_id)
+        with conn:
+            copied += conn.execute(
+                f"INSERT OR IGNORE INTO {target} ({names}) SELECT {names} FROM {table} WHERE id > ? AND id <= ?",
+                (last_id, upper),
+            ).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_backfills (version, task, last_id) VALUES (?, ?, ?)",
+                (context.version, task, upper),
+            )
+        last_id = upper
+        if context.pause:
+            time.sleep(context.pause)
+    return copied
+
+
+def _create_tables(conn, context):
+    for table, columns in TABLES.items():
+        conn.execute(_definition(table, columns).replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+    conn.commit()
+
+
+def _unify_columns(conn, context):
+    for table, columns in TABLES.items():
+        if _exists(conn, table + MIGRATING_SUFFIX) or _needs_rebuild(conn, table, columns):
+            rebuild_table(conn, context, table, columns)
+            continue
+        for column, declaration in columns:
+            if add_column(conn, table, column, declaration):
+                context.log(f"{table}: added {column}")
+
+
+def _telemetry_indexes(conn, context):
+    # The per-parameter time-range index behind the rollups, latest values
+    # and bulk selections; building it holds the write lock once.
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_real_time_monitoring_parameter_timestamp
+        ON real_time_monitoring (parameter, timestamp)
+        """
+    )
+    conn.commit()
+
+
+def _normalize_timestamps(conn, context):
+    # Epoch seconds (stored as digits by the TEXT column) and ISO 8601 "T"
+    # forms do not sort with "YYYY-MM-DD HH:MM:SS" values, so they fall
+    # outside range scans of the (parameter, timestamp) index. Values that
+    # do not parse are left alone.
+    backfill(
+        conn,
+        context,
+        "real_time_monitoring",
+        f"""timestamp = coalesce(
+            CASE WHEN timestamp GLOB '*[^0-9.]*' THEN strftime('{TEXT_FORMAT}', timestamp)
+            ELSE strftime('{TEXT_FORMAT}', CAST(timestamp AS REAL), 'unixepoch') END,
+            timestamp
+        )""",
+        f"timestamp IS NOT NULL AND timestamp NOT GLOB '{TEXT_PATTERN}'",
+    )
+
+
+def _fill_names(conn, context):
+    # Rows written through the library get the name the app lists them by
+    backfill(conn, context, "energy_storage", "name = technology", "name IS NULL AND technology IS NOT NULL")
+    backfill(conn, context, "applications", "name = sector", "name IS NULL AND sector IS NOT NULL")
+
+
+def _drop_placeholder(conn, context):
+    # The template table of early versions; kept if anyone stored rows in it
+    if _exists(conn, PLACEHOLDER_TABLE):
+        if conn.execute(f"SELECT 1 FROM {PLACEHOLDER_TABLE} LIMIT 1").fetchone() is None:
+            conn.execute(f"DROP TABLE {PLACEHOLDER_TABLE}")
+            conn.commit()
+            context.log(f"dropped the empty {PLACEHOLDER_TABLE} table")
+        else:
+            context.log(f"kept {PLACEHOLDER_TABLE}: it has rows")
+
+
+MIGRATIONS = [
+    Migration(1, "create core tables", _create_tables),
+    Migration(2, "unify app and library columns", _unify_columns),
+    Migration(3, "index readings by parameter and time", _telemetry_indexes),
+    Migration(4, "normalize reading timestamps", _normalize_timestamps),
+    Migration(5, "name library rows", _fill_names),
+    Migration(6, "drop the placeholder table", _drop_placeholder),
+]
+
+
+def migrate(conn, target=None, batch_size=BATCH_SIZE, pause=0.0, log=None):
+    """
+    Apply the pending migrations in order.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        target (int): Stop after this version; defaults to the newest.
+        batch_size (int): Rows per backfill or copy transaction.
+        pause (float): Seconds to sleep between batches.
+        log (callable): Receives progress messages; silent by default.
+
+    Returns:
+        list of int: The versions applied by this call.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    log = log or (lambda message: None)
+    applied = []
+    version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version or (target is not None and migration.version > target):
+            continue
+        log(f"Applying {migration.version}: {migration.name}")
+        migration.upgrade(conn, MigrationContext(migration.version, batch_size, pause, log))
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)",
+                (migration.version, migration.name),
+            )
+            conn.execute("DELETE FROM schema_backfills WHERE version = ?", (migration.version,))
+        applied.append(migration.version)
+    return applied
+
+
+def migration_status(conn):
+    """
+    List every migration with the time it was applied.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        list of tuples: ``(version, name, applied_at)``, ``applied_at`` None
+        for pending migrations.
+    """
+    _initialize(conn)
+    applied = dict(conn.execute("SELECT version, applied_at FROM schema_version").fetchall())
+    return [(m.version, m.name, applied.get(m.version)) for m in MIGRATIONS]
+
+
+def main(argv=None):
+    """Command-line entry point, ``sandra-migrate``."""
+    parser = argparse.ArgumentParser(prog="sandra-migrate", description="Migrate a SANDRA database schema.")
+    parser.add_argument("--db", help="Database file (default: the library's DB_PATH)")
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per backfill transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds between backfill batches")
+    parser.add_argument("--status", action="store_true", help="Show the applied versions and exit")
+    args = parser.parse_args(argv)
+
+    if args.db is None:
+        try:
+            from .database import DB_PATH
+        except ImportError:
+            from database import DB_PATH
+        args.db = str(DB_PATH)
+    conn = sqlite3.connect(args.db, timeout=30.0)
+    if args.status:
+        for version, name, applied_at in migration_status(conn):
+            print(f"{version:>3}  {applied_at or 'pending':<19}  {name}")
+        return 0
+    applied = migrate(
+        conn, args.target, args.batch_size, args.pause, log=lambda message: print(message, file=sys.stderr)
+    )
+    print(f"Applied {len(applied)} migrations; schema version {current_version(conn)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
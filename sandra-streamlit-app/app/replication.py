@@ -0,0 +1,355 @@
+"""
+Primary/replica snapshot shipping for the SANDRA database.
+
+One node is the primary and takes every write. A ``SnapshotPublisher`` on it
+watches the database and, whenever another connection has committed, copies
+it with the ``sqlite3`` online-backup API into a single-file snapshot. The
+snapshot is served over HTTP next to a small JSON description.
+
+Replicas run a ``SnapshotReplica`` that polls the primary, downloads each new
+snapshot and copies it into its local database, again with the backup API,
+so readers of the replica switch from one consistent state to the next in a
+single transaction. Replica connections are opened read-only.
+
+Replication lag is reported as an upper bound on how old the replica's data
+may be: the time since the primary last confirmed it had nothing newer than
+what the replica holds.
+
+Run a headless node with ``python -m app.replication primary|replica``.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+try:
+    from .database import BUSY_TIMEOUT, DB_PATH
+except ImportError:
+    from database import BUSY_TIMEOUT, DB_PATH
+
+INTERVAL = 5.0
+PORT = 8765
+TIMEOUT = 30.0
+ROLES = ("standalone", "primary", "replica")
+
+
+def _copy(source, target_path):
+    # Copy a database into a standalone rollback-journal file
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+
+
+class SnapshotPublisher:
+    """
+    Publish online-backup snapshots of the primary database.
+
+    Parameters:
+        db_path (str or Path): The primary database file.
+        snapshot_dir (str): Where the current snapshot is kept; defaults to a
+            temporary directory.
+        interval (float): Seconds between change checks when serving.
+    """
+
+    def __init__(self, db_path=DB_PATH, snapshot_dir=None, interval=INTERVAL):
+        self.db_path = str(db_path)
+        self.snapshot_dir = snapshot_dir or tempfile.mkdtemp(prefix="sandra-snapshots-")
+        self.interval = interval
+        self.path = os.path.join(self.snapshot_dir, "snapshot.db")
+        # Snapshot ids stay unique across restarts of the primary
+        self._boot = int(time.time())
+        self._sequence = 0
+        self._data_version = None
+        self._conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._meta = {"id": None, "created": None, "checked": None, "bytes": 0}
+        self.server = None
+
+    def publish(self):
+        """
+        Take a snapshot if the database changed since the last one.
+
+        ``PRAGMA data_version`` of the publisher's own connection changes
+        whenever any other connection or process commits.
+
+        Returns:
+            bool: True if a new snapshot was published.
+        """
+        now = time.time()
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            with self._lock:
+                self._meta["checked"] = now
+            return False
+        pending = self.path + ".tmp"
+        _copy(self._conn, pending)
+        size = os.path.getsize(pending)
+        with self._lock:
+            os.replace(pending, self.path)
+            self._sequence += 1
+            self._data_version = version
+            self._meta = {"id": f"{self._boot}-{self._sequence}", "created": now, "checked": now, "bytes": size}
+        return True
+
+    def status(self):
+        """
+        Describe the current snapshot.
+
+        Returns:
+            dict: ``id``, ``created`` and ``checked`` (epoch seconds) and
+            ``bytes``; ``checked`` is the last time the primary found no newer
+            commits.
+        """
+        with self._lock:
+            return dict(self._meta)
+
+    def open_snapshot(self):
+        """
+        Open the current snapshot for reading.
+
+        Returns:
+            tuple: The status and a binary file object, or ``(status, None)``
+            if nothing was published yet.
+        """
+        with self._lock:
+            if self._meta["id"] is None:
+                return dict(self._meta), None
+            return dict(self._meta), open(self.path, "rb")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.publish()
+            except sqlite3.Error as exc:
+                print(f"Snapshot failed: {exc}", file=sys.stderr)
+            self._stop.wait(self.interval)
+
+    def serve(self, port=PORT, host="127.0.0.1"):
+        """
+        Publish snapshots in the background and serve them over HTTP.
+
+        ``GET /snapshot/meta`` returns the status as JSON and
+        ``GET /snapshot`` the database file, with its id in ``X-Snapshot-Id``.
+
+        Parameters:
+            port (int): Port to listen on.
+            host (str): Interface to bind.
+
+        Returns:
+            ThreadingHTTPServer: The running server.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        publisher = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/snapshot/meta":
+                    body = json.dumps(publisher.status()).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == "/snapshot":
+                    meta, snapshot = publisher.open_snapshot()
+                    if snapshot is None:
+                        self.send_error(503, "No snapshot published yet")
+                        return
+                    with snapshot:
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/vnd.sqlite3")
+                        self.send_header("Content-Length", str(os.fstat(snapshot.fileno()).st_size))
+                        self.send_header("X-Snapshot-Id", meta["id"])
+                        self.send_header("X-Snapshot-Created", str(meta["created"]))
+                        self.end_headers()
+                        shutil.copyfileobj(snapshot, self.wfile)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.publish()
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="sandra-snapshots", daemon=True).start()
+        threading.Thread(target=self._run, name="sandra-publisher", daemon=True).start()
+        return self.server
+
+    def stop(self):
+        """Stop publishing and serving."""
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class SnapshotReplica:
+    """
+    Keep a read-only local copy of the primary's database current.
+
+    Parameters:
+        primary_url (str): Base URL of the primary's publisher, e.g.
+            ``http://primary:8765``.
+        db_path (str or Path): The local replica database file.
+        interval (float): Seconds between polls when running in the background.
+    """
+
+    def __init__(self, primary_url, db_path=DB_PATH, interval=INTERVAL):
+        self.primary_url = primary_url.rstrip("/")
+        self.db_path = str(db_path)
+        self.interval = interval
+        self.applied = None
+        self.applied_at = None
+        self.applied_created = None
+        self.primary = None
+        self.error = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _get(self, path):
+        return urllib.request.urlopen(self.primary_url + path, timeout=TIMEOUT)
+
+    def _apply(self, response):
+        incoming = self.db_path + ".incoming"
+        with open(incoming, "wb") as target:
+            shutil.copyfileobj(response, target)
+        source = sqlite3.connect(incoming)
+        try:
+            if source.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                raise sqlite3.DatabaseError("Received a corrupt snapshot")
+            # One write transaction on the replica: readers see the old state
+            # or the new one, never a mix.
+            target = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+            os.remove(incoming)
+
+    def sync(self):
+        """
+        Fetch and apply the primary's snapshot if it is newer than the local copy.
+
+        Returns:
+            bool: True if a snapshot was applied.
+        """
+        try:
+            with self._get("/snapshot/meta") as response:
+                meta = json.load(response)
+            with self._lock:
+                self.primary = meta
+            if meta["id"] is None or meta["id"] == self.applied:
+                self.error = None
+                return False
+            with self._get("/snapshot") as response:
+                snapshot = response.headers["X-Snapshot-Id"]
+                created = float(response.headers["X-Snapshot-Created"])
+                self._apply(response)
+        except (OSError, ValueError, sqlite3.Error) as exc:
+            self.error = str(exc)
+            return False
+        with self._lock:
+            self.applied = snapshot
+            self.applied_at = time.time()
+            self.applied_created = created
+            self.error = None
+        return True
+
+    def status(self):
+        """
+        Describe the replica's state.
+
+        Returns:
+            dict: ``applied`` snapshot id, ``applied_at``, the last seen
+            ``primary`` status, ``in_sync``, ``lag`` in seconds (None before
+            the first snapshot) and the last ``error``.
+        """
+        with self._lock:
+            primary = dict(self.primary or {})
+            in_sync = self.applied is not None and primary.get("id") == self.applied
+            if self.applied is None:
+                lag = None
+            elif in_sync:
+                lag = time.time() - (primary.get("checked") or self.applied_created)
+            else:
+                lag = time.time() - self.applied_created
+            return {
+                "applied": self.applied,
+                "applied_at": self.applied_at,
+                "primary": primary,
+                "in_sync": in_sync,
+                "lag": lag,
+                "error": self.error,
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sync()
+
+    def start(self):
+        """
+        Sync once, then keep polling in a background thread.
+
+        Returns:
+            SnapshotReplica: self.
+        """
+        self.sync()
+        threading.Thread(target=self._run, name="sandra-replica", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop polling."""
+        self._stop.set()
+
+
+def main(argv=None):
+    """Command-line entry point for a headless primary or replica node."""
+    parser = argparse.ArgumentParser(
+        prog="sandra-replication", description="Ship SANDRA database snapshots to read replicas."
+    )
+    parser.add_argument("role", choices=ROLES[1:])
+    parser.add_argument("--db", default=str(DB_PATH), help="Database file")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="Seconds between checks")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to serve on (primary)")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to serve on (primary)")
+    parser.add_argument("--primary", help="Primary URL (replica), e.g. http://primary:8765")
+    args = parser.parse_args(argv)
+
+    if args.role == "primary":
+        node = SnapshotPublisher(args.db, interval=args.interval)
+        node.serve(args.port, args.host)
+        print(f"Serving snapshots of {args.db} on {args.host}:{args.port}", file=sys.stderr)
+    else:
+        if not args.primary:
+            parser.error("--primary is required for a replica")
+        node = SnapshotReplica(args.primary, args.db, interval=args.interval).start()
+        print(f"Replicating {args.primary} into {args.db}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(args.interval)
+            if args.role == "replica":
+                status = node.status()
+                lag = "n/a" if status["lag"] is None else f"{status['lag']:.1f}s"
+                print(f"snapshot {status['applied']}, lag {lag}, error {status['error']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        node.stop()
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Pre-aggregated rollups for the SANDRA Streamlit app.
+
+``telemetry_rollups`` keeps min, max, sum and count per parameter for every
+minute, hour and day of ``real_time_monitoring`` readings. It is updated
+incrementally from each ingested chunk, so charts read a few hundred buckets
+at the resolution that matches their time range instead of raw rows.
+Record counts and total capacity of ``energy_storage`` by status, by
+technology and by both, and the latest reading of every monitored parameter,
+are materialized views (see ``views``) kept current by triggers.
+"""
+
+try:
+    from .telemetry import to_epoch, to_text
+    from .views import NULL_KEY, create_view, define_view, read_view, refresh_view
+except ImportError:
+    from telemetry import to_epoch, to_text
+    from views import NULL_KEY, create_view, define_view, read_view, refresh_view
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+MAX_POINTS = 500
+STORAGE_COLUMNS = {"technology", "capacity", "status"}
+READING_COLUMNS = {"parameter", "value", "unit", "timestamp"}
+
+STORAGE_VIEWS = {
+    group_by: define_view(
+        f"storage_by_{'_'.join(group_by)}", "energy_storage", group_by,
+        {"capacity": ("sum", "capacity")},
+    )
+    for group_by in (("status",), ("technology",), ("technology", "status"))
+}
+LATEST_READINGS = define_view(
+    "telemetry_latest", "real_time_monitoring", "parameter",
+    {"value": ("latest", "value"), "unit": ("latest", "unit"), "timestamp": ("latest", "timestamp")},
+    order_by="timestamp",
+)
+
+_UPSERT_ROLLUP = """
+    INSERT INTO telemetry_rollups
+        (resolution, parameter, bucket, min_value, max_value, sum_value, count)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, parameter, bucket) DO UPDATE SET
+        min_value = min(min_value, excluded.min_value),
+        max_value = max(max_value, excluded.max_value),
+        sum_value = sum_value + excluded.sum_value,
+        count = count + excluded.count
+"""
+
+
+def _has_columns(conn, table, columns):
+    return columns <= {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _views(conn):
+    views = []
+    if _has_columns(conn, "energy_storage", STORAGE_COLUMNS):
+        views += STORAGE_VIEWS.values()
+    if _has_columns(conn, "real_time_monitoring", READING_COLUMNS):
+        views.append(LATEST_READINGS)
+    return views
+
+
+def _has_view(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def initialize_rollups(conn):
+    """
+    Create the rollup table, and the materialized views whose source table
+    has the columns they aggregate.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_rollups (
+            resolution INTEGER NOT NULL,
+            parameter TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            min_value REAL,
+            max_value REAL,
+            sum_value REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (resolution, parameter, bucket)
+        ) WITHOUT ROWID;
+
+        -- Superseded by the storage_by_* views
+        DROP TRIGGER IF EXISTS storage_rollups_ai;
+        DROP TRIGGER IF EXISTS storage_rollups_ad;
+        DROP TRIGGER IF EXISTS storage_rollups_au;
+        DROP TABLE IF EXISTS storage_rollups;
+        """
+    )
+    for view in _views(conn):
+        create_view(conn, view)
+
+
+def aggregate_readings(readings):
+    """
+    Aggregate readings into rollup rows for every resolution.
+
+    Parameters:
+        readings (iterable): ``(parameter, value, unit, timestamp)`` tuples.
+
+    Returns:
+        list of tuples: Rows for the ``telemetry_rollups`` upsert. Readings
+        without a parameter, value or timestamp are left out.
+    """
+    buckets = {}
+    for parameter, value, _, timestamp in readings:
+        if parameter is None or value is None or timestamp is None:
+            continue
+        value = float(value)
+        epoch = to_epoch(timestamp)
+        for seconds in RESOLUTIONS.values():
+            key = (seconds, parameter, epoch - epoch % seconds)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [value, value, value, 1]
+            else:
+                if value < agg[0]:
+                    agg[0] = value
+                if value > agg[1]:
+                    agg[1] = value
+                agg[2] += value
+                agg[3] += 1
+    return [key + tuple(agg) for key, agg in buckets.items()]
+
+
+def update_rollups(conn, readings):
+    """
+    Fold a batch of readings into the rollups; the caller commits.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        readings (iterable): ``(parameter, value, unit, timestamp)`` tuples.
+    """
+    conn.executemany(_UPSERT_ROLLUP, aggregate_readings(readings))
+
+
+def rebuild_rollups(conn, batch_size=50000):
+    """
+    Recompute all rollups from the raw tables, e.g. after bulk deletes.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        batch_size (int): Rows read per batch from ``real_time_monitoring``.
+    """
+    with conn:
+        conn.execute("DELETE FROM telemetry_rollups")
+        cursor = conn.execute(
+            "SELECT parameter, value, unit, timestamp FROM real_time_monitoring"
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            update_rollups(conn, rows)
+    for view in _views(conn):
+        if _has_view(conn, view.name):
+            refresh_view(conn, view)
+        else:
+            create_view(conn, view)
+
+
+def refresh_rollups(conn, days):
+    """
+    Recompute the rollups of some parameter-days from the raw readings, e.g.
+    after rows in them were deleted or rewritten; the caller commits.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        days (iterable): ``(parameter, timestamp)`` pairs; every resolution
+            of the UTC day containing ``timestamp`` is rebuilt.
+    """
+    day = RESOLUTIONS["day"]
+    for parameter, start in {(p, to_epoch(t) - to_epoch(t) % day) for p, t in days}:
+        conn.execute(
+            "DELETE FROM telemetry_rollups WHERE parameter = ? AND bucket >= ? AND bucket < ?",
+            (parameter, start, start + day),
+        )
+        rows = conn.execute(
+            """
+            SELECT parameter, value, unit, timestamp FROM real_time_monitoring
+            WHERE parameter = ? AND timestamp >= ? AND timestamp < ?
+            """,
+            (parameter, to_text(start), to_text(start + day)),
+        ).fetchall()
+        update_rollups(conn, rows)
+
+
+def choose_resolution(start, end, max_points=MAX_POINTS):
+    """
+    Pick the finest resolution that keeps a time range under ``max_points`` buckets.
+
+    Parameters:
+        start: Range start, anything ``to_epoch`` accepts.
+        end: Range end, anything ``to_epoch`` accepts.
+        max_points (int): Upper bound on buckets per parameter.
+
+    Returns:
+        str: A key of ``RESOLUTIONS``.
+    """
+    span = max(to_epoch(end) - to_epoch(start), 1)
+    for name, seconds in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return name
+    return "day"
+
+
+def load_rollup(conn, resolution, start=None, end=None, parameter=None):
+    """
+    Read rollup buckets for a time range.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        resolution (str): A key of ``RESOLUTIONS``.
+        start: Inclusive range start, or ``None``.
+        end: Exclusive range end, or ``None``.
+        parameter (str): Restrict to one parameter, or ``None`` for all.
+
+    Returns:
+        tuple: The list of ``(parameter, bucket, min, max, mean, count)`` rows
+        and the list of column names.
+    """
+    query = """
+        SELECT parameter, bucket, min_value AS min, max_value AS max,
+               sum_value / count AS mean, count
+        FROM telemetry_rollups WHERE resolution = ?
+    """
+    params = [RESOLUTIONS[resolution]]
+    if parameter is not None:
+        query += " AND parameter = ?"
+        params.append(parameter)
+    if start is not None:
+        query += " AND bucket >= ?"
+        params.append(to_epoch(start) - to_epoch(start) % RESOLUTIONS[resolution])
+    if end is not None:
+        query += " AND bucket < ?"
+        params.append(to_epoch(end))
+    query += " ORDER BY parameter, bucket"
+    cursor = conn.execute(query, params)
+    return cursor.fetchall(), [description[0] for description in cursor.description]
+
+
+def telemetry_span(conn):
+    """
+    Return the first and last rolled-up minute, or ``(None, None)`` if empty.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    return conn.execute(
+        "SELECT min(bucket), max(bucket) + 60 FROM telemetry_rollups WHERE resolution = 60"
+    ).fetchone()
+
+
+def load_storage_counts(conn, dimension):
+    """
+    Read ``energy_storage`` counts and capacity grouped by status and/or technology.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        dimension (str or tuple): "status", "technology" or
+            ``("technology", "status")``.
+
+    Returns:
+        tuple: The list of ``(*keys, count, capacity)`` rows and the column
+        names; no rows if ``energy_storage`` has no such columns.
+    """
+    view = STORAGE_VIEWS[(dimension,) if isinstance(dimension, str) else tuple(dimension)]
+    if not _has_view(conn, view.name):
+        return [], list(view.group_by) + ["count", "capacity"]
+    return read_view(conn, view)
+
+
+def load_latest_readings(conn):
+    """
+    Read the latest reading of every monitored parameter.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+
+    Returns:
+        tuple: The list of ``(parameter, count, value, unit, timestamp)`` rows
+        and the column names; no rows if ``real_time_monitoring`` has no
+        readings columns. Rows without a parameter (grouped by the view as
+        "unknown") are left out.
+    """
+    if not _has_view(conn, LATEST_READINGS.name):
+        return [], ["parameter", "count", "value", "unit", "timestamp"]
+    rows, columns = read_view(conn, LATEST_READINGS)
+    return [row for row in rows if row[0] != NULL_KEY], columns
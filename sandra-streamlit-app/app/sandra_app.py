@@ -1,93 +1,368 @@
-import sqlite3
+import io
+import json
+import math
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from functools import partial
+from queue import Full
+
 import pandas as pd
 import streamlit as st
 import altair as alt
-import pandas as pd
-
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
+try:
+    from .alerts import KINDS, SEVERITIES, AlertEngine, add_rule, initialize_alerts, load_alerts
+    from .cache import QueryCache, install_version_triggers, sizeof
+    from .charts import MAX_POINTS, chart_suite, downsample, generate_bar_chart, generate_charts
+    from .database import DB_PATH, bulk_delete, bulk_update, get_pool, table_columns
+    from .live import LatestValues, TelemetryFrame, install_change_log
+    from .metrics import metrics
+    from .migrations import migrate
+    from .replication import SnapshotPublisher, SnapshotReplica
+    from .rollups import (
+        choose_resolution,
+        initialize_rollups,
+        load_rollup,
+        load_storage_counts,
+        telemetry_span,
+    )
+    from .search import create_search_index, rebuild_search_index, search_table
+    from .transfer import FORMATS, detect_format, export_to, import_file
+    from .transfer import serve as serve_exports
+    from .writer import WriteBehindQueue
+except ImportError:
+    from alerts import KINDS, SEVERITIES, AlertEngine, add_rule, initialize_alerts, load_alerts
+    from cache import QueryCache, install_version_triggers, sizeof
+    from charts import MAX_POINTS, chart_suite, downsample, generate_bar_chart, generate_charts
+    from database import DB_PATH, bulk_delete, bulk_update, get_pool, table_columns
+    from live import LatestValues, TelemetryFrame, install_change_log
+    from metrics import metrics
+    from migrations import migrate
+    from replication import SnapshotPublisher, SnapshotReplica
+    from rollups import (
+        choose_resolution,
+        initialize_rollups,
+        load_rollup,
+        load_storage_counts,
+        telemetry_span,
+    )
+    from search import create_search_index, rebuild_search_index, search_table
+    from transfer import FORMATS, detect_format, export_to, import_file
+    from transfer import serve as serve_exports
+    from writer import WriteBehindQueue
 
+WRITE_ACK_TIMEOUT = 0.5
+PAGE_SIZES = [25, 100, 500]
+TABLES = ["energy_storage", "real_time_monitoring", "applications"]
+SEARCH_LIMITS = [20, 50, 200]
+REFRESH_RATES = [1, 2, 5, 10, 30]
+LIVE_WINDOWS = [100, 500, 2000]
+METRICS_FORMATS = {"Prometheus": False, "OpenMetrics": True}
+METRICS_PORT = os.environ.get("SANDRA_METRICS_PORT")
+EXPORT_PORT = os.environ.get("SANDRA_EXPORT_PORT")
+# The only directory the Admin page may write metrics files to
+METRICS_DIR = os.environ.get("SANDRA_METRICS_DIR")
+IMPORT_CHUNK_SIZES = [5000, 20000, 100000]
+# Sessions not seen for this long are dropped from the memory report
+SESSION_MEMORY_TTL = 3600
+# Replication: "standalone", "primary" (publishes snapshots) or "replica" (read-only copy)
+ROLE = os.environ.get("SANDRA_ROLE", "standalone")
+PRIMARY_URL = os.environ.get("SANDRA_PRIMARY_URL", "http://127.0.0.1:8765")
+REPLICATION_HOST = os.environ.get("SANDRA_REPLICATION_HOST", "127.0.0.1")
+REPLICATION_PORT = int(os.environ.get("SANDRA_REPLICATION_PORT", "8765"))
+# Numeric column whose peaks and dips downsampling keeps; tables without one are strided
+VALUE_COLUMNS = {"energy_storage": "capacity", "real_time_monitoring": "value"}
+ZOOM_LEVELS = {"Last hour": 3600, "Last day": 86400, "Last week": 7 * 86400, "Last 30 days": 30 * 86400, "All": None}
 
 
 # Database connection and initialization
-def connect_db():
-    conn = sqlite3.connect("sand_battery.db")
-    return conn
+@st.cache_resource
+def get_db_pool():
+    """Create the app's connection pool once per process and set up the schema."""
+    if ROLE == "replica":
+        # The schema and data come from the primary's snapshots
+        get_replication()
+        return get_pool(DB_PATH, read_only=True)
+    return get_pool(DB_PATH, initializer=initialize_db)
+
+@st.cache_resource
+def get_replication():
+    """Start publishing snapshots (primary) or following the primary (replica)."""
+    if ROLE == "primary":
+        publisher = SnapshotPublisher(DB_PATH)
+        publisher.serve(REPLICATION_PORT, REPLICATION_HOST)
+        return publisher
+    if ROLE == "replica":
+        return SnapshotReplica(PRIMARY_URL, DB_PATH).start()
+    return None
+
+@st.cache_resource
+def get_writer():
+    """Start the shared background writer that commits UI mutations."""
+    return None if ROLE == "replica" else WriteBehindQueue(get_db_pool())
+
+@st.cache_resource
+def get_query_cache():
+    """Create the query result cache shared by all sessions."""
+    return QueryCache()
+
+@st.cache_resource
+def get_latest_values():
+    """Create the last-value cache shared by all sessions."""
+    return LatestValues(get_db_pool())
+
+@st.cache_resource
+def get_telemetry_frame():
+    """Create the compact readings frame shared by all sessions."""
+    return TelemetryFrame(get_db_pool())
+
+@st.cache_resource
+def get_session_memory():
+    """Bytes held in session state per session id, with the time last seen."""
+    return {}
+
+@st.cache_resource
+def get_export_server():
+    """Serve streaming /export/<table>.<format> downloads when SANDRA_EXPORT_PORT is set."""
+    return serve_exports(int(EXPORT_PORT), db_path=DB_PATH) if EXPORT_PORT else None
+
+@st.cache_resource
+def get_metrics_server():
+    """Serve /metrics for Prometheus when SANDRA_METRICS_PORT is set."""
+    return metrics.serve(int(METRICS_PORT)) if METRICS_PORT else None
 
 def initialize_db(conn):
-    cursor = conn.cursor()
-    # Create tables if they don't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS energy_storage (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT
-    )
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS real_time_monitoring (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT
-    )
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS applications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        description TEXT
-    )
-    """)
-    conn.commit()
+    # Create or upgrade the tables to the schema shared with the library
+    migrate(conn)
+    # Full-text indexes for Search Data; index existing rows the first time
+    for table in TABLES:
+        if create_search_index(conn, table):
+            rebuild_search_index(conn, table)
+    initialize_rollups(conn)
+    initialize_alerts(conn)
+    # Let the query cache see writes made by other connections and processes
+    install_version_triggers(conn, TABLES)
+    # Lets the shared readings frame re-read only updated and deleted rows
+    install_change_log(conn)
 
 # Add data
-def add_data(conn, table_name, name, description):
-    cursor = conn.cursor()
-    cursor.execute(f"INSERT INTO {table_name} (name, description) VALUES (?, ?)", (name, description))
-    conn.commit()
+def add_data(writer, table_name, name, description):
+    return writer.submit(f"INSERT INTO {table_name} (name, description) VALUES (?, ?)", (name, description))
 
 # Fetch data
+@get_query_cache().memoize
+@metrics.instrument("query")
 def fetch_data(conn, table_name):
     query = f"SELECT * FROM {table_name}"
     return pd.read_sql(query, conn)
 
-# Update data
-def update_data(conn, table_name, record_id, name, description):
-    cursor = conn.cursor()
-    cursor.execute(f"""
-        UPDATE {table_name}
-        SET name = ?, description = ?
-        WHERE id = ?
-    """, (name, description, record_id))
-    conn.commit()
-
-# Delete data
-def delete_data(conn, table_name, record_id):
-    cursor = conn.cursor()
-    cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (record_id,))
-    conn.commit()
-
-# Search data
-def search_data(conn, table_name, keyword):
-    query = f"SELECT * FROM {table_name} WHERE name LIKE ? OR description LIKE ?"
-    return pd.read_sql(query, conn, params=(f"%{keyword}%", f"%{keyword}%"))
+# Fetch one page of rows after a given id (keyset pagination)
+@get_query_cache().memoize
+@metrics.instrument("query")
+def fetch_page(conn, table_name, after_id=0, page_size=PAGE_SIZES[0]):
+    query = f"SELECT * FROM {table_name} WHERE id > ? ORDER BY id LIMIT ?"
+    return pd.read_sql(query, conn, params=(after_id, page_size))
+
+# Count rows; cached because COUNT(*) walks the whole table
+@get_query_cache().memoize
+@metrics.instrument("query")
+def count_rows(conn, table_name):
+    return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+# Show one page of a table with previous/next controls; only that page is read
+def show_table_page(conn, table_name, key):
+    cursors = st.session_state.setdefault(f"{key}_cursors", [0])
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    data = fetch_page(conn, table_name, cursors[-1], page_size)
+    total = count_rows(conn, table_name)
+    st.dataframe(data)
+    st.caption(f"Page {len(cursors)} of {max(1, math.ceil(total / page_size))} ({total} rows)")
+    prev_col, next_col = st.columns(2)
+    prev_col.button("Previous", key=f"{key}_prev", disabled=len(cursors) == 1, on_click=cursors.pop)
+    next_col.button(
+        "Next",
+        key=f"{key}_next",
+        disabled=len(data) < page_size,
+        on_click=cursors.append,
+        args=(int(data["id"].iloc[-1]) if len(data) else 0,),
+    )
+    return total
+
+# Choose the rows a bulk update or delete applies to; None until something is selected
+def select_records(conn, table_name, key):
+    columns = table_columns(conn, table_name)
+    modes = ["IDs", "ID range"]
+    if {"parameter", "timestamp"} <= set(columns):
+        modes.append("Parameter and time")
+    mode = st.radio("Select records by", modes, horizontal=True, key=f"{key}_mode")
+    if mode == "IDs":
+        # Ids of the page shown above (cached, so this does not query again)
+        page = fetch_page(conn, table_name, st.session_state[f"{key}_cursors"][-1], st.session_state[f"{key}_page_size"])
+        ids = st.multiselect("Record IDs", page["id"].tolist(), key=f"{key}_ids")
+        return {"ids": ids} if ids else None
+    if mode == "ID range":
+        first_col, last_col = st.columns(2)
+        first = first_col.number_input("First ID", min_value=1, step=1, key=f"{key}_first")
+        last = last_col.number_input("Last ID", min_value=1, step=1, key=f"{key}_last")
+        return {"id_range": (first, last)} if first <= last else None
+    parameters = sorted(get_latest_values().latest_all())
+    parameter = st.selectbox("Parameter", parameters, key=f"{key}_parameter")
+    dates = st.date_input("Between (UTC dates, inclusive)", value=(), key=f"{key}_dates")
+    if parameter is None or len(dates) != 2:
+        return None
+    start, end = (datetime(day.year, day.month, day.day) for day in dates)
+    return {"parameter": parameter, "start": start, "end": end + timedelta(days=1)}
+
+# Update every selected record in one transaction; rollups of the touched days are refreshed with it
+def update_data(writer, table_name, selection, name, description):
+    values = {"name": name, "description": description}
+    return writer.submit(partial(bulk_update, table_name=table_name, values=values, **selection))
+
+# Delete every selected record in one transaction; rollups of the touched days are refreshed with it
+def delete_data(writer, table_name, selection):
+    return writer.submit(partial(bulk_delete, table_name=table_name, **selection))
+
+# Report a queued write without holding the page for the commit
+def show_write_result(submit, table_name, message):
+    try:
+        future = submit()
+    except Full:
+        st.error("The database is busy, please try again in a moment")
+        return
+    future.add_done_callback(lambda _: get_query_cache().invalidate(table_name))
+    try:
+        rows = future.result(timeout=WRITE_ACK_TIMEOUT)
+    except FutureTimeoutError:
+        st.info(f"{message} (queued, committing in the background)")
+    except Exception as exc:
+        st.error(f"Write failed: {exc}")
+    else:
+        st.success(f"{message} ({rows} rows affected)")
+
+# Draw a chart; the time includes Altair serialization and Streamlit rendering
+def show_chart(name, chart):
+    with metrics.timed("render", name):
+        st.altair_chart(chart, use_container_width=True)
+
+# Encode a table chunk by chunk for download; only the encoded file is held,
+# which Streamlit serves from memory (the export endpoint streams instead)
+def export_file(table_name, fmt):
+    target = io.BytesIO()
+    with metrics.timed("query", f"export_{fmt}"):
+        export_to(target, get_db_pool().connection(), table_name, fmt)
+    return target
+
+# Summary tiles, read from the trigger-maintained views (a few rows each)
+def show_summary_tiles(conn):
+    with metrics.timed("query", "summary_tiles"):
+        statuses, _ = load_storage_counts(conn, "status")
+    if statuses:
+        st.subheader("Storage by status")
+        for column, (status, count, capacity) in zip(st.columns(len(statuses)), statuses):
+            column.metric(status.capitalize(), f"{count:,}", f"{capacity:,.0f} capacity", delta_color="off")
+
+# Current reading of every parameter, from the in-memory last-value cache
+def show_current_status():
+    with metrics.timed("query", "current_status"):
+        latest = get_latest_values().latest_all()
+    if latest:
+        st.subheader("Current Status")
+        for column, reading in zip(st.columns(len(latest)), sorted(latest.values())):
+            value = "n/a" if reading.value is None else f"{reading.value:,.2f} {reading.unit or ''}".strip()
+            column.metric(reading.parameter, value, reading.timestamp, delta_color="off")
+
+# Record what this session's own state holds; shared frames and caches are reported once
+def record_session_memory():
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return 0
+    held = sum(sizeof(value) for value in st.session_state.to_dict().values())
+    sessions = get_session_memory()
+    now = time.time()
+    sessions[ctx.session_id] = (held, now)
+    for session_id, (_, seen) in list(sessions.items()):
+        if now - seen > SESSION_MEMORY_TTL:
+            sessions.pop(session_id, None)
+    return held
+
+# Open alerts, raised by the ingestion worker's alert engine
+def show_active_alerts(conn):
+    with metrics.timed("query", "active_alerts"):
+        rows, columns = load_alerts(conn, active=True)
+    for row in rows:
+        alert = dict(zip(columns, row))
+        show = st.error if alert["severity"] == "critical" else st.warning
+        show(f"{alert['message']} (since {alert['started']}, {alert['readings']} readings)")
+
+# Search data (BM25-ranked, through the table's FTS5 index)
+@get_query_cache().memoize
+@metrics.instrument("query")
+def search_data(conn, table_name, keyword, limit=SEARCH_LIMITS[0]):
+    rows, columns = search_table(conn, table_name, keyword, limit)
+    return pd.DataFrame(rows, columns=columns)
 
 # Streamlit App
 st.title("Sandra: Sand Battery Solutions Database")
 
 # Sidebar for navigation
-nav = st.sidebar.radio("Navigation", ["Database Overview", "Add Data", "Update Data", "Delete Data", "Search Data", "Visualizations"])
+pages = ["Database Overview", "Add Data", "Update Data", "Delete Data", "Search Data", "Visualizations", "Live Monitoring", "Alerts", "Import / Export", "Admin"]
+if ROLE == "replica":
+    # Writes go to the primary
+    pages = [page for page in pages if page not in ("Add Data", "Update Data", "Delete Data")]
+nav = st.sidebar.radio("Navigation", pages)
 
-# Connect to database and initialize
-conn = connect_db()
-initialize_db(conn)
+# Reuse this thread's pooled connection; the schema was created with the pool
+conn = get_db_pool().connection()
+writer = get_writer()
+replication = get_replication()
+get_metrics_server()
+get_export_server()
+
+if ROLE == "replica":
+    status = replication.status()
+    if status["applied"] is None:
+        st.warning(f"Waiting for the first snapshot from {PRIMARY_URL}: {status['error'] or 'not published yet'}")
+        get_db_pool().release()
+        st.stop()
+    st.sidebar.caption(
+        f"Read-only replica of {PRIMARY_URL}: "
+        f"{'in sync' if status['in_sync'] else 'catching up'}, lag {status['lag']:.1f}s"
+        + (f" (last error: {status['error']})" if status["error"] else "")
+    )
+elif ROLE == "primary":
+    status = replication.status()
+    st.sidebar.caption(f"Primary: snapshot {status['id']} ({status['bytes'] / 1e6:.1f} MB)")
+
+cache_stats = get_query_cache().stats()
+st.sidebar.caption(
+    f"Query cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+    f"({cache_stats['hit_ratio']:.0%}), {cache_stats['entries']} entries, "
+    f"{cache_stats['bytes'] / 1e6:.1f} MB"
+)
+active_alerts, critical_alerts = conn.execute(
+    "SELECT count(*), coalesce(sum(severity = 'critical'), 0) FROM alerts WHERE cleared IS NULL"
+).fetchone()
+if active_alerts:
+    st.sidebar.error(f"{active_alerts} active alerts ({critical_alerts} critical)")
+frame_memory = get_telemetry_frame().memory_usage()
+st.sidebar.caption(
+    f"Memory: this session {record_session_memory() / 1e3:.1f} kB; "
+    f"shared readings {frame_memory['bytes'] / 1e6:.1f} MB ({frame_memory['rows']:,} rows) "
+    f"across {len(get_session_memory())} sessions"
+)
 
 if nav == "Database Overview":
     st.header("Database Overview")
+    show_active_alerts(conn)
+    show_current_status()
+    show_summary_tiles(conn)
     tables = ["energy_storage", "real_time_monitoring", "applications"]
     for table in tables:
         st.subheader(table.capitalize())
-        data = fetch_data(conn, table)
-        st.dataframe(data)
+        show_table_page(conn, table, f"overview_{table}")
 
 elif nav == "Add Data":
     st.header("Add Data")
@@ -96,24 +371,22 @@ elif nav == "Add Data":
     description = st.text_area("Description")
     if st.button("Add Data"):
         if name and description:
-            add_data(conn, table, name, description)
-            st.success(f"Data added to {table}")
+            show_write_result(lambda: add_data(writer, table, name, description), table, f"Data added to {table}")
         else:
             st.error("All fields are required!")
 
 elif nav == "Update Data":
     st.header("Update Data")
     table = st.selectbox("Choose a table to update data", ["energy_storage", "real_time_monitoring", "applications"])
-    data = fetch_data(conn, table)
-    if not data.empty:
-        st.dataframe(data)
-        record_id = st.number_input("Enter ID of the record to update", min_value=1, step=1)
+    if show_table_page(conn, table, f"update_{table}"):
+        selection = select_records(conn, table, f"update_{table}")
         name = st.text_input("Updated Name")
         description = st.text_area("Updated Description")
         if st.button("Update Data"):
-            if name and description:
-                update_data(conn, table, record_id, name, description)
-                st.success("Data updated successfully")
+            if selection is None:
+                st.error("Select the records to update")
+            elif name and description:
+                show_write_result(lambda: update_data(writer, table, selection, name, description), table, "Data updated successfully")
             else:
                 st.error("All fields are required!")
     else:
@@ -122,13 +395,13 @@ elif nav == "Update Data":
 elif nav == "Delete Data":
     st.header("Delete Data")
     table = st.selectbox("Choose a table to delete data", ["energy_storage", "real_time_monitoring", "applications"])
-    data = fetch_data(conn, table)
-    if not data.empty:
-        st.dataframe(data)
-        record_id = st.number_input("Enter ID of the record to delete", min_value=1, step=1)
+    if show_table_page(conn, table, f"delete_{table}"):
+        selection = select_records(conn, table, f"delete_{table}")
         if st.button("Delete Data"):
-            delete_data(conn, table, record_id)
-            st.success("Data deleted successfully")
+            if selection is None:
+                st.error("Select the records to delete")
+            else:
+                show_write_result(lambda: delete_data(writer, table, selection), table, "Data deleted successfully")
     else:
         st.warning("No data available in the table")
 
@@ -136,128 +409,288 @@ elif nav == "Search Data":
     st.header("Search Data")
     table = st.selectbox("Choose a table to search data", ["energy_storage", "real_time_monitoring", "applications"])
     keyword = st.text_input("Enter a keyword to search")
+    limit = st.selectbox("Maximum results", SEARCH_LIMITS)
     if st.button("Search"):
-        data = search_data(conn, table, keyword)
+        data = search_data(conn, table, keyword, limit)
         if not data.empty:
-            st.dataframe(data)
+            st.dataframe(data.drop(columns="rank"))
         else:
             st.warning("No matching records found")
 
 elif nav == "Visualizations":
     st.header("Visualizations")
     table = st.selectbox("Choose a table to visualize", ["energy_storage", "real_time_monitoring", "applications"])
-    data = fetch_data(conn, table)
-    
+    first, last = telemetry_span(conn)
+    storage_rows, _ = load_storage_counts(conn, "status")
+    from_rollups = (table == "real_time_monitoring" and first is not None) or (table == "energy_storage" and bool(storage_rows))
+    data = pd.DataFrame()
+    if from_rollups and table == "real_time_monitoring":
+        # Read the rollup resolution that matches the selected time range
+        zoom = st.selectbox("Time range", list(ZOOM_LEVELS))
+        start = first if ZOOM_LEVELS[zoom] is None else max(first, last - ZOOM_LEVELS[zoom])
+        resolution = choose_resolution(start, last)
+        rows, columns = load_rollup(conn, resolution, start, last)
+        rollup = pd.DataFrame(rows, columns=columns)
+        rollup["time"] = pd.to_datetime(rollup["bucket"], unit="s")
+        st.caption(f"{len(rollup)} {resolution} buckets")
+        started = time.perf_counter()
+        base = alt.Chart(rollup).encode(x=alt.X("time:T", title="Time"), color="parameter:N")
+        band = base.mark_area(opacity=0.25).encode(y=alt.Y("min:Q", title="Value"), y2="max:Q")
+        line = base.mark_line().encode(y="mean:Q", tooltip=["parameter", "time", "mean", "min", "max", "count"])
+        chart = (band + line).interactive()
+        metrics.observe("chart", "telemetry_rollup", time.perf_counter() - started, len(rollup))
+        show_chart("telemetry_rollup", chart)
+    elif from_rollups:
+        started = time.perf_counter()
+        counts = []
+        charts = []
+        for dimension in ("status", "technology"):
+            rows, _ = load_storage_counts(conn, dimension)
+            counts += [{"dimension": dimension, "key": key, "count": count, "capacity": capacity} for key, count, capacity in rows]
+            charts.append(alt.Chart().mark_bar().encode(
+                x=alt.X("key:N", title=dimension.capitalize()),
+                y=alt.Y("count:Q", title="Records"),
+                tooltip=["key", "count", "capacity"]
+            ).transform_filter(alt.datum.dimension == dimension).properties(title=f"Energy Storage by {dimension.capitalize()}"))
+        suite = chart_suite(charts, pd.DataFrame(counts))
+        metrics.observe("chart", "storage_counts", time.perf_counter() - started, len(counts))
+        show_chart("storage_counts", suite)
+        rows, columns = load_storage_counts(conn, ("technology", "status"))
+        started = time.perf_counter()
+        chart = generate_bar_chart(pd.DataFrame(rows, columns=columns))
+        metrics.observe("chart", "storage_capacity", time.perf_counter() - started, len(rows))
+        show_chart("storage_capacity", chart)
+    else:
+        data = fetch_data(conn, table)
+
     if not data.empty:
-        # Bar Chart
-        chart = alt.Chart(data).mark_bar().encode(
-            x="id:O",
-            y=alt.Y("name:N", sort=None),
-            tooltip=["name", "description"]
-        ).interactive()
-        st.altair_chart(chart, use_container_width=True)
+        # One spec with the (downsampled) rows attached once, shared by every chart
+        started = time.perf_counter()
+        total_rows = len(data)
+        data = downsample(data, x="id", y=VALUE_COLUMNS.get(table), target=MAX_POINTS)
+        if len(data) < total_rows:
+            st.caption(f"Showing {len(data)} of {total_rows} rows")
 
-        # Pie Chart
-        pie_chart = alt.Chart(data).mark_arc().encode(
-            theta=alt.Theta(field="id", type="quantitative"),
-            color=alt.Color(field="name", type="nominal"),
-            tooltip=["name", "description"]
-        ).properties(title="Distribution of Records by Name")
-        st.altair_chart(pie_chart, use_container_width=True)
-
-        # Scatter Plot
-        scatter_plot = alt.Chart(data).mark_circle(size=100).encode(
-            x=alt.X("id:O", axis=alt.Axis(title="ID")),
-            y=alt.Y("name:N", axis=alt.Axis(title="Name")),
-            color="name:N",
-            tooltip=["name", "description"]
-        ).interactive().properties(title="Scatter Plot of Records")
-        st.altair_chart(scatter_plot, use_container_width=True)
-
-        # Line Chart
-        line_chart = alt.Chart(data).mark_line(point=True).encode(
-            x=alt.X("id:O", axis=alt.Axis(title="ID")),
-            y=alt.Y("id:Q", axis=alt.Axis(title="ID (Quantitative for Line)")),
-            color="name:N",
-            tooltip=["name", "description"]
-        ).interactive().properties(title="Trend of IDs Across Records")
-        st.altair_chart(line_chart, use_container_width=True)
-
-        # Stacked Bar Chart
-        stacked_bar_chart = alt.Chart(data).mark_bar().encode(
-            x=alt.X("name:N", axis=alt.Axis(title="Name")),
-            y=alt.Y("id:Q", axis=alt.Axis(title="ID")),
-            color="name:N",
-            tooltip=["name", "description"]
-        ).properties(title="Stacked Bar Chart of Names")
-        st.altair_chart(stacked_bar_chart, use_container_width=True)
-
-        # Heatmap
-        heatmap = alt.Chart(data).mark_rect().encode(
-            x=alt.X("name:N", axis=alt.Axis(title="Name")),
-            y=alt.Y("id:O", axis=alt.Axis(title="ID")),
-            color=alt.Color("id:Q", scale=alt.Scale(scheme="blues"), title="ID Value"),
-            tooltip=["name", "description"]
-        ).properties(title="Heatmap of IDs by Name")
-        st.altair_chart(heatmap, use_container_width=True)
-
-        # Area Chart
-        area_chart = alt.Chart(data).mark_area(opacity=0.5).encode(
-            x=alt.X("id:O", axis=alt.Axis(title="ID")),
-            y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
-            color=alt.Color("name:N", legend=alt.Legend(title="Name")),
-            tooltip=["name", "description"]
-        ).properties(title="Area Chart of IDs by Name")
-        st.altair_chart(area_chart, use_container_width=True)
-
-        # Histogram
-        histogram = alt.Chart(data).mark_bar().encode(
-            x=alt.X("id:Q", bin=True, axis=alt.Axis(title="ID Bins")),
-            y=alt.Y("count():Q", axis=alt.Axis(title="Count")),
-            color=alt.Color("name:N", legend=alt.Legend(title="Name")),
-            tooltip=["name", "description"]
-        ).properties(title="Histogram of IDs")
-        st.altair_chart(histogram, use_container_width=True)
-
-        # Scatter Plot with Brush
-        brush = alt.selection_interval()
-        scatter_with_brush = alt.Chart(data).mark_circle(size=100).encode(
-            x=alt.X("id:O", axis=alt.Axis(title="ID")),
-            y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
-            color=alt.condition(brush, "name:N", alt.value("lightgray")),
-            tooltip=["name", "description"]
-        ).add_params(
-            brush
-        ).properties(title="Scatter Plot with Interactive Brush Filter")
-        st.altair_chart(scatter_with_brush, use_container_width=True)
-
-        # Bubble Chart
-        bubble_chart = alt.Chart(data).mark_circle().encode(
-            x=alt.X("id:Q", axis=alt.Axis(title="ID")),
-            y=alt.Y("id:Q", axis=alt.Axis(title="ID Value")),
-            size=alt.Size("id:Q", title="Size by ID"),
-            color="name:N",
-            tooltip=["name", "description"]
-        ).properties(title="Bubble Chart of IDs by Name")
-        st.altair_chart(bubble_chart, use_container_width=True)
-
-        # Sorted Bar Chart
-        sorted_bar_chart = alt.Chart(data).mark_bar().encode(
-            x=alt.X("id:Q", axis=alt.Axis(title="ID Value")),
-            y=alt.Y("name:N", sort="-x", axis=alt.Axis(title="Name")),
-            color="name:N",
-            tooltip=["name", "description"]
-        ).properties(title="Bar Chart Sorted by ID")
-        st.altair_chart(sorted_bar_chart, use_container_width=True)
-
-        # Text Chart
-        text_chart = alt.Chart(data).mark_text(size=14).encode(
-            x=alt.X("id:O", axis=alt.Axis(title="ID")),
-            y=alt.Y("name:N", axis=alt.Axis(title="Name")),
-            text="description:N",
-            color=alt.Color("name:N", legend=alt.Legend(title="Name")),
-            tooltip=["name", "description"]
-        ).properties(title="Text Chart Displaying Descriptions")
-        st.altair_chart(text_chart, use_container_width=True)
-    else:
+        suite = generate_charts(data)
+        metrics.observe("chart", f"{table}_suite", time.perf_counter() - started, len(data))
+        show_chart(f"{table}_suite", suite)
+    elif not from_rollups:
         st.warning("No data available to visualize")
+
+elif nav == "Live Monitoring":
+    st.header("Live Monitoring")
+    if not {"parameter", "value", "timestamp"} <= set(table_columns(conn, "real_time_monitoring")):
+        st.warning("real_time_monitoring has no parameter/value/timestamp readings to follow")
+    else:
+        refresh = st.select_slider("Refresh every (seconds)", REFRESH_RATES, value=2)
+        window = st.selectbox("Readings kept per parameter", LIVE_WINDOWS, index=1)
+
+        # Every session draws from the one shared frame; the selection per window is computed once per refresh
+        def show_live():
+            show_active_alerts(get_db_pool().connection())
+            show_current_status()
+            frame = get_telemetry_frame().recent(window)
+            if frame.empty:
+                st.info("Waiting for readings...")
+                return
+            started = time.perf_counter()
+            frame["time"] = pd.to_datetime(frame["timestamp"], unit="s")
+            st.caption(f"{len(frame)} recent readings, last id {frame['id'].max()}")
+            chart = alt.Chart(frame).mark_line().encode(
+                x=alt.X("time:T", title="Time"),
+                y=alt.Y("value:Q", title="Value"),
+                color="parameter:N",
+                tooltip=["parameter", "time", "value", "unit"]
+            )
+            metrics.observe("chart", "live", time.perf_counter() - started, len(frame))
+            show_chart("live", chart)
+
+        if hasattr(st, "fragment"):
+            st.fragment(run_every=refresh)(show_live)()
+        else:
+            show_live()
+            get_db_pool().release()
+            time.sleep(refresh)
+            st.experimental_rerun()
+
+elif nav == "Alerts":
+    st.header("Alerts")
+    show_active_alerts(conn)
+    rows, columns = load_alerts(conn, limit=500)
+    history = pd.DataFrame(rows, columns=columns)
+    st.subheader("Recent alerts")
+    if history.empty:
+        st.info("No alerts raised yet")
+    else:
+        st.dataframe(history, use_container_width=True)
+        pending = history.loc[history["acknowledged"] == 0, "id"].tolist()
+        if ROLE != "replica" and pending:
+            chosen = st.multiselect("Acknowledge alerts", pending)
+            if st.button("Acknowledge") and chosen:
+                show_write_result(
+                    lambda: writer.submit(
+                        "UPDATE alerts SET acknowledged = 1 WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(chosen),),
+                    ),
+                    "alerts",
+                    f"Acknowledged {len(chosen)} alerts",
+                )
+
+    st.subheader("Rules")
+    st.caption(
+        "Checked by the ingestion worker on every batch: threshold bounds, change per second, "
+        "and z-score against rolling statistics over about `span` readings"
+    )
+    rules = pd.read_sql("SELECT * FROM alert_rules ORDER BY id", conn)
+    if rules.empty:
+        st.info("No rules defined")
+    else:
+        st.dataframe(rules, use_container_width=True)
+    if ROLE != "replica":
+        with st.form("add_rule"):
+            parameter = st.text_input("Parameter", "core_temperature")
+            kind = st.selectbox("Kind", KINDS)
+            severity = st.selectbox("Severity", SEVERITIES, index=1)
+            low = st.number_input("Low bound (threshold)", value=None)
+            high = st.number_input("High bound (threshold)", value=None)
+            max_change = st.number_input("Max change per second (rate)", value=None)
+            max_score = st.number_input("Max z-score (zscore)", value=None)
+            span = st.number_input("Readings in the rolling statistics (zscore)", min_value=10, value=1000)
+            if st.form_submit_button("Add rule"):
+                try:
+                    rule_id = add_rule(
+                        conn, parameter.strip(), kind, low=low, high=high, max_change=max_change,
+                        max_score=max_score, span=int(span), severity=severity,
+                    )
+                except ValueError as exc:
+                    st.error(str(exc))
+                else:
+                    st.success(f"Rule {rule_id} added")
+        enabled = rules.loc[rules["enabled"] == 1, "id"].tolist() if not rules.empty else []
+        if enabled:
+            disabled = st.multiselect("Disable rules", enabled)
+            if st.button("Disable") and disabled:
+                show_write_result(
+                    lambda: writer.submit(
+                        "UPDATE alert_rules SET enabled = 0 WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(disabled),),
+                    ),
+                    "alert_rules",
+                    f"Disabled {len(disabled)} rules",
+                )
+
+elif nav == "Import / Export":
+    st.header("Export")
+    table = st.selectbox("Choose a table to export", TABLES)
+    fmt = st.radio("Format", list(FORMATS), horizontal=True)
+    st.download_button(
+        "Download",
+        # Generated when clicked, in chunks, so the table is never loaded into a DataFrame
+        data=lambda: export_file(table, fmt),
+        file_name=f"{table}.{fmt}",
+        mime=FORMATS[fmt],
+    )
+    if EXPORT_PORT:
+        st.caption(f"Streaming endpoint for large exports: http://127.0.0.1:{EXPORT_PORT}/export/{table}.{fmt}")
+    else:
+        st.caption("Set SANDRA_EXPORT_PORT to stream large exports over HTTP instead of through the browser session")
+
+    if ROLE != "replica":
+        st.header("Import")
+        table = st.selectbox("Choose a table to import into", TABLES)
+        upload = st.file_uploader("CSV, gzip-CSV, Parquet or Excel file", type=["csv", "gz", "parquet", "xlsx"])
+        chunk_size = st.selectbox("Rows per chunk", IMPORT_CHUNK_SIZES, index=1)
+        keep_ids = st.checkbox("Keep the file's ids", value=False)
+        # Historical backfills do not raise alerts unless asked to
+        check_alerts = table == "real_time_monitoring" and st.checkbox(
+            "Check imported readings against the alert rules",
+            value=False,
+            help="Alerts are stamped with the readings' own times; z-score and rate rules start without history",
+        )
+        if upload is not None and st.button("Import"):
+            progress = st.empty()
+            try:
+                fmt = detect_format(upload.name)
+                stats = import_file(
+                    conn, table, upload, fmt, chunk_size, keep_ids=keep_ids,
+                    latest=get_latest_values(), alerts=AlertEngine() if check_alerts else None,
+                    on_chunk=lambda stats: progress.caption(f"{stats['rows']:,} rows imported, {stats['rejected']:,} rejected"),
+                )
+            except Exception as exc:
+                st.error(f"Import failed: {exc}")
+            else:
+                st.success(f"Imported {stats['rows']:,} rows in {stats['chunks']} chunks ({stats['rejected']:,} rejected)")
+                if stats["rejects"]:
+                    st.dataframe(pd.DataFrame(stats["rejects"], columns=["row", "reason"]))
+            finally:
+                get_query_cache().invalidate(table)
+
+elif nav == "Admin":
+    st.header("Admin: Query Profiler")
+    st.caption(
+        "Latency per stage: sql (statement execution), fetch (reading results), "
+        "query (helpers incl. DataFrame construction), chart (building specs) and "
+        "render (Altair serialization and Streamlit drawing). Query cache hits never reach these."
+    )
+    summary = pd.DataFrame(metrics.snapshot())
+    if summary.empty:
+        st.info("Nothing recorded yet")
+    else:
+        stages = st.multiselect("Stages", sorted(summary["stage"].unique()), default=sorted(summary["stage"].unique()))
+        st.dataframe(summary[summary["stage"].isin(stages)], use_container_width=True)
+
+    st.subheader("Slow queries")
+    metrics.slow_query = st.number_input(
+        "Keep plans of statements slower than (seconds)", min_value=0.0, value=float(metrics.slow_query), step=0.05
+    )
+    slow = metrics.slow_queries()
+    if not slow:
+        st.info("No slow queries recorded")
+    for entry in slow:
+        with st.expander(f"{entry['seconds'] * 1000:.1f} ms: {entry['sql']}"):
+            st.caption(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["at"])) + f", rows: {entry['rows']}")
+            st.code("\n".join(entry["plan"]) or "(no plan)")
+
+    st.subheader("Export")
+    export_format = st.radio("Format", list(METRICS_FORMATS), horizontal=True)
+    exposition = metrics.export(openmetrics=METRICS_FORMATS[export_format])
+    st.download_button("Download metrics", exposition, file_name="sandra.prom", mime="text/plain")
+    if METRICS_DIR:
+        file_name = st.text_input(f"Write to a file in {METRICS_DIR} (e.g. a node_exporter textfile directory)", "sandra.prom")
+        if st.button("Write metrics file"):
+            # A bare file name only, so the file cannot land outside METRICS_DIR
+            separators = {"/", os.sep, os.altsep} - {None}
+            if not file_name or file_name.startswith(".") or any(sep in file_name for sep in separators):
+                st.error("Enter a file name without path separators")
+            else:
+                path = os.path.join(METRICS_DIR, file_name)
+                metrics.write(path, openmetrics=METRICS_FORMATS[export_format])
+                st.success(f"Metrics written to {path}")
+    else:
+        st.caption("Set SANDRA_METRICS_DIR to write metrics files from here")
+    if METRICS_PORT:
+        st.caption(f"Scrape endpoint: http://127.0.0.1:{METRICS_PORT}/metrics")
+    st.button("Reset metrics", on_click=metrics.reset)
+
+    st.subheader("Memory")
+    memory = get_telemetry_frame().memory_usage()
+    st.caption(
+        f"Shared readings frame: {memory['rows']:,} rows, {memory['bytes'] / 1e6:.1f} MB, held once for all sessions"
+    )
+    if memory["columns"]:
+        st.dataframe(pd.DataFrame({"bytes": memory["columns"]}))
+    sessions = get_session_memory()
+    st.dataframe(pd.DataFrame(
+        [
+            {"session": session_id, "bytes": held, "last seen": time.strftime("%H:%M:%S", time.localtime(seen))}
+            for session_id, (held, seen) in sessions.items()
+        ],
+        columns=["session", "bytes", "last seen"],
+    ))
+
+    if replication is not None:
+        st.subheader("Replication")
+        st.json(replication.status())
+
+# Each rerun runs on a new thread; hand this run's connection back to the pool
+get_db_pool().release()
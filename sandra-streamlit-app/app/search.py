@@ -0,0 +1,174 @@
+"""
+Full-text search for the SANDRA Streamlit app.
+
+Each searchable table gets an external-content FTS5 index named
+``<table>_fts`` that stores only the inverted index, not a second copy of the
+text. Insert, update and delete triggers keep the index in step with the
+table, and queries return BM25-ranked rows with highlighted snippets instead
+of scanning the table with ``LIKE '%keyword%'``.
+"""
+
+import argparse
+import sqlite3
+
+SEARCH_LIMIT = 50
+SEARCH_COLUMNS = ("name", "description")
+HIGHLIGHT = ("**", "**")
+
+
+def _index_name(table_name):
+    return f"{table_name}_fts"
+
+
+def text_columns(conn, table_name):
+    """
+    List the TEXT columns of a table.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to inspect.
+
+    Returns:
+        list of str: Column names declared as TEXT.
+    """
+    return [
+        row[1]
+        for row in conn.execute(f"PRAGMA table_info({table_name})")
+        if row[2].upper() == "TEXT"
+    ]
+
+
+def create_search_index(conn, table_name, columns=None):
+    """
+    Create the FTS5 index and sync triggers for a table.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to index; it must have an ``id`` primary key.
+        columns (sequence of str): The text columns to index; defaults to
+            the free-text ``SEARCH_COLUMNS`` the table has. Every indexed
+            column adds an FTS write to each insert, so high-volume columns
+            such as reading parameters are only indexed on request.
+
+    Returns:
+        bool: True if the index was newly created (or re-created for other
+        columns) and needs a rebuild.
+    """
+    if columns is None:
+        available = text_columns(conn, table_name)
+        columns = [column for column in SEARCH_COLUMNS if column in available]
+    index = _index_name(table_name)
+    indexed = [row[1] for row in conn.execute(f"PRAGMA table_info({index})")]
+    if indexed and indexed != list(columns):
+        conn.executescript(
+            f"""
+            DROP TRIGGER IF EXISTS {index}_ai;
+            DROP TRIGGER IF EXISTS {index}_ad;
+            DROP TRIGGER IF EXISTS {index}_au;
+            DROP TABLE {index};
+            """
+        )
+    created = indexed != list(columns)
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{column}" for column in columns)
+    old_cols = ", ".join(f"old.{column}" for column in columns)
+    conn.executescript(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {index}
+        USING fts5({cols}, content='{table_name}', content_rowid='id');
+
+        CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table_name} BEGIN
+            INSERT INTO {index} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table_name} BEGIN
+            INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE ON {table_name} BEGIN
+            INSERT INTO {index} ({index}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {index} (rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+        """
+    )
+    return created
+
+
+def rebuild_search_index(conn, table_name):
+    """
+    Re-index every existing row of a table.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The indexed table.
+    """
+    index = _index_name(table_name)
+    conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def to_match_query(keyword):
+    """
+    Turn free text into an FTS5 query that matches every word as a prefix.
+
+    Parameters:
+        keyword (str): The user's search input.
+
+    Returns:
+        str: The MATCH expression, or an empty string if there are no words.
+    """
+    terms = []
+    for word in keyword.split():
+        terms.append('"' + word.replace('"', '""') + '"*')
+    return " ".join(terms)
+
+
+def search_table(conn, table_name, keyword, limit=SEARCH_LIMIT):
+    """
+    Search a table through its FTS5 index.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The indexed table.
+        keyword (str): The user's search input.
+        limit (int): Maximum number of results.
+
+    Returns:
+        tuple: The list of rows, best match first, and the list of column
+        names. Each row is the table row followed by ``snippet`` and ``rank``.
+    """
+    match = to_match_query(keyword)
+    if not match:
+        return [], []
+    index = _index_name(table_name)
+    start, end = HIGHLIGHT
+    cursor = conn.execute(
+        f"""
+        SELECT t.*, snippet({index}, -1, ?, ?, '...', 12) AS snippet,
+               bm25({index}) AS rank
+        FROM {index}
+        JOIN {table_name} AS t ON t.id = {index}.rowid
+        WHERE {index} MATCH ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        (start, end, match, limit),
+    )
+    columns = [description[0] for description in cursor.description]
+    return cursor.fetchall(), columns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild SANDRA full-text search indexes.")
+    parser.add_argument("database", help="Path to the SQLite database file")
+    parser.add_argument("tables", nargs="+", help="Tables to re-index")
+    parser.add_argument(
+        "--columns", help="Comma-separated text columns to index (default: name and description)"
+    )
+    args = parser.parse_args()
+    connection = sqlite3.connect(args.database)
+    for table in args.tables:
+        create_search_index(connection, table, args.columns and args.columns.split(","))
+        rebuild_search_index(connection, table)
+        print(f"Rebuilt search index for {table}.")
+    connection.close()
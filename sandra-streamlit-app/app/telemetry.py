@@ -0,0 +1,301 @@
+"""
+Partitioned telemetry storage for the SANDRA Streamlit app.
+
+Sensor readings are stored with integer epoch timestamps (seconds, UTC) in
+one table per day or per month. Every partition carries a composite
+``(parameter, timestamp)`` index and is registered in the
+``telemetry_partitions`` catalog, so a range query for one parameter only
+reads the partitions overlapping the range and, inside them, only the index
+pages for that parameter. Partitions are created on first write and dropped
+once they fall outside the retention window.
+"""
+
+import calendar
+import threading
+import time
+from datetime import datetime, timezone
+
+GRANULARITIES = ("day", "month")
+PARTITION_PREFIX = "telemetry_"
+TEXT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_epoch(value):
+    """
+    Convert a timestamp to integer epoch seconds.
+
+    Parameters:
+        value (int, float, str or datetime): Epoch seconds, an ISO 8601
+            string, or a datetime. Naive values are treated as UTC.
+
+    Returns:
+        int: Seconds since the Unix epoch.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(float(value))
+        except ValueError:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    raise TypeError(f"Unsupported timestamp: {value!r}")
+
+
+def to_text(value):
+    """
+    Format a timestamp the way ``real_time_monitoring.timestamp`` stores it.
+
+    Parameters:
+        value: Anything ``to_epoch`` accepts.
+
+    Returns:
+        str: "YYYY-MM-DD HH:MM:SS" in UTC, which sorts chronologically as text.
+    """
+    return time.strftime(TEXT_FORMAT, time.gmtime(to_epoch(value)))
+
+
+def partition_bounds(epoch, granularity="day"):
+    """
+    Return the partition key and ``[start, end)`` range holding a timestamp.
+
+    Parameters:
+        epoch (int): Epoch seconds.
+        granularity (str): "day" or "month".
+
+    Returns:
+        tuple: ``(key, start, end)`` where key is e.g. "20240131" or "202401".
+    """
+    moment = time.gmtime(epoch)
+    if granularity == "day":
+        start = epoch - epoch % 86400
+        return time.strftime("%Y%m%d", moment), start, start + 86400
+    if granularity == "month":
+        year, month = moment.tm_year, moment.tm_mon
+        start = calendar.timegm((year, month, 1, 0, 0, 0))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        end = calendar.timegm((year, month, 1, 0, 0, 0))
+        return time.strftime("%Y%m", moment), start, end
+    raise ValueError(f"granularity must be one of {GRANULARITIES}")
+
+
+def initialize_telemetry(conn):
+    """
+    Create the partition catalog.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_partitions (
+            name TEXT PRIMARY KEY,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+
+class TelemetryStore:
+    """
+    Time-partitioned storage for ``real_time_monitoring`` style readings.
+
+    Parameters:
+        pool (ConnectionPool): The pool to take connections from.
+        granularity (str): Partition size, "day" or "month".
+        retention (int): Seconds of history to keep; ``None`` keeps everything.
+    """
+
+    def __init__(self, pool, granularity="day", retention=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}")
+        self.pool = pool
+        self.granularity = granularity
+        self.retention = retention
+        # Partitions known to be committed, and those created in a
+        # connection's still-open transaction (by connection id)
+        self._known = set()
+        self._pending = {}
+        self._lock = threading.Lock()
+        conn = pool.connection()
+        initialize_telemetry(conn)
+        self._known.update(
+            name for (name,) in conn.execute("SELECT name FROM telemetry_partitions")
+        )
+
+    def _settle(self, conn):
+        # Call with the lock held. Once the connection's transaction is over,
+        # its new partitions are either committed or rolled back.
+        pending = self._pending.get(id(conn))
+        if not pending or conn.in_transaction:
+            return
+        del self._pending[id(conn)]
+        committed = conn.execute(
+            f"SELECT name FROM telemetry_partitions WHERE name IN ({', '.join('?' * len(pending))})",
+            tuple(pending),
+        )
+        self._known.update(name for (name,) in committed)
+
+    def _ensure_partition(self, conn, epoch):
+        key, start, end = partition_bounds(epoch, self.granularity)
+        name = PARTITION_PREFIX + key
+        with self._lock:
+            self._settle(conn)
+            if name in self._known or name in self._pending.get(id(conn), ()):
+                return name, False
+        # Idempotent, and outside the lock: it may wait for another
+        # connection's write transaction
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY,
+                parameter TEXT NOT NULL,
+                value REAL,
+                unit TEXT,
+                timestamp INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {name}_parameter_timestamp "
+            f"ON {name} (parameter, timestamp)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO telemetry_partitions (name, start_ts, end_ts) "
+            "VALUES (?, ?, ?)",
+            (name, start, end),
+        )
+        with self._lock:
+            # Other connections create it too until this transaction commits
+            self._pending.setdefault(id(conn), set()).add(name)
+        return name, True
+
+    def insert_many(self, readings, commit=True):
+        """
+        Insert readings, routing each one to its time partition.
+
+        Parameters:
+            readings (iterable): ``(parameter, value, unit, timestamp)`` tuples;
+                timestamps may be anything ``to_epoch`` accepts.
+            commit (bool): Commit when done; pass False to batch in a caller's
+                transaction.
+
+        Returns:
+            int: The number of readings inserted.
+        """
+        conn = self.pool.connection()
+        created = False
+        by_partition = {}
+        for parameter, value, unit, timestamp in readings:
+            epoch = to_epoch(timestamp)
+            name, new = self._ensure_partition(conn, epoch)
+            created = created or new
+            by_partition.setdefault(name, []).append((parameter, value, unit, epoch))
+        count = 0
+        for name, rows in by_partition.items():
+            conn.executemany(
+                f"INSERT INTO {name} (parameter, value, unit, timestamp) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            count += len(rows)
+        if commit:
+            conn.commit()
+            with self._lock:
+                self._settle(conn)
+        if created and self.retention is not None:
+            self.prune()
+        return count
+
+    def partitions(self, start=None, end=None):
+        """
+        List partitions overlapping a time range, oldest first.
+
+        Parameters:
+            start: Inclusive lower bound, or ``None`` for unbounded.
+            end: Exclusive upper bound, or ``None`` for unbounded.
+
+        Returns:
+            list of str: Partition table names.
+        """
+        query = "SELECT name FROM telemetry_partitions WHERE 1 = 1"
+        params = []
+        if start is not None:
+            query += " AND end_ts > ?"
+            params.append(to_epoch(start))
+        if end is not None:
+            query += " AND start_ts < ?"
+            params.append(to_epoch(end))
+        query += " ORDER BY start_ts"
+        conn = self.pool.connection()
+        return [name for (name,) in conn.execute(query, params)]
+
+    def query(self, parameter, start=None, end=None, limit=None):
+        """
+        Read one parameter's readings in ``[start, end)``, oldest first.
+
+        Parameters:
+            parameter (str): The monitored parameter.
+            start: Inclusive lower bound, or ``None`` for unbounded.
+            end: Exclusive upper bound, or ``None`` for unbounded.
+            limit (int): Maximum number of rows to return.
+
+        Returns:
+            list of tuples: ``(timestamp, value, unit)`` rows.
+        """
+        names = self.partitions(start, end)
+        if not names:
+            return []
+        where = "parameter = ?"
+        params = [parameter]
+        if start is not None:
+            where += " AND timestamp >= ?"
+            params.append(to_epoch(start))
+        if end is not None:
+            where += " AND timestamp < ?"
+            params.append(to_epoch(end))
+        query = " UNION ALL ".join(
+            f"SELECT timestamp, value, unit FROM {name} WHERE {where}" for name in names
+        )
+        query += " ORDER BY timestamp"
+        all_params = params * len(names)
+        if limit is not None:
+            query += " LIMIT ?"
+            all_params.append(int(limit))
+        conn = self.pool.connection()
+        return conn.execute(query, all_params).fetchall()
+
+    def prune(self, now=None):
+        """
+        Drop partitions that ended before the retention window.
+
+        Parameters:
+            now (int): Reference epoch seconds; defaults to the current time.
+
+        Returns:
+            list of str: The partitions that were dropped.
+        """
+        if self.retention is None:
+            return []
+        cutoff = (int(time.time()) if now is None else to_epoch(now)) - self.retention
+        conn = self.pool.connection()
+        with self._lock:
+            self._settle(conn)
+            names = [
+                name
+                for (name,) in conn.execute(
+                    "SELECT name FROM telemetry_partitions WHERE end_ts <= ?", (cutoff,)
+                )
+            ]
+            for name in names:
+                conn.execute(f"DROP TABLE IF EXISTS {name}")
+                conn.execute("DELETE FROM telemetry_partitions WHERE name = ?", (name,))
+                self._known.discard(name)
+                for pending in self._pending.values():
+                    pending.discard(name)
+            conn.commit()
+        return names
@@ -0,0 +1,441 @@
+"""
+Streaming import and export of SANDRA tables.
+
+Exports read query results with a cursor in chunks of ``CHUNK_SIZE`` rows and
+encode each chunk as it arrives: CSV, gzip-compressed CSV, or Parquet with one
+row group per chunk. Imports read CSV (optionally gzip-compressed), Parquet
+or Excel files in chunks, validate each chunk with the batch validators and
+insert it in its own transaction. Memory therefore depends on the chunk size,
+not on the size of the table or file.
+
+``serve`` exposes exports over HTTP with chunked transfer encoding:
+
+    GET /export/real_time_monitoring.csv.gz?parameter=core_temperature&start=2024-01-01
+
+Parquet needs the optional ``pyarrow`` dependency and Excel import
+``openpyxl``.
+"""
+
+import csv
+import io
+import json
+import threading
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from .database import DB_PATH, get_pool, initialize_db, record_selection, table_columns
+    from .ingest import CHUNK_SIZE, ingest_readings
+    from .utils import as_check, combine_checks, validate_descriptions, validate_feature_names, validate_statuses
+    from .worker import validate_readings
+except ImportError:
+    from database import DB_PATH, get_pool, initialize_db, record_selection, table_columns
+    from ingest import CHUNK_SIZE, ingest_readings
+    from utils import as_check, combine_checks, validate_descriptions, validate_feature_names, validate_statuses
+    from worker import validate_readings
+
+FORMATS = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+IMPORT_FORMATS = ("csv", "csv.gz", "parquet", "xlsx")
+READING_COLUMNS = {"parameter", "value", "timestamp"}
+# Batch counterparts of the form checks, applied where a table has the column
+COLUMN_VALIDATORS = {
+    "feature": validate_feature_names,
+    "status": validate_statuses,
+    "description": validate_descriptions,
+}
+MAX_REJECTS = 100
+
+
+def detect_format(file_name):
+    """
+    Guess a transfer format from a file name.
+
+    Parameters:
+        file_name (str): e.g. "readings.csv.gz".
+
+    Returns:
+        str: One of ``IMPORT_FORMATS``.
+
+    Raises:
+        ValueError: If the extension is not supported.
+    """
+    name = file_name.lower()
+    for fmt in sorted(IMPORT_FORMATS, key=len, reverse=True):
+        if name.endswith("." + fmt):
+            return fmt
+    raise ValueError(f"Unsupported file type: {file_name} (expected {', '.join(IMPORT_FORMATS)})")
+
+
+def _select(conn, table_name, selection):
+    columns = table_columns(conn, table_name)
+    if not columns:
+        raise ValueError(f"No such table: {table_name}")
+    query = f"SELECT * FROM {table_name}"
+    params = []
+    if any(value is not None for value in selection.values()):
+        clause, params = record_selection(columns, **selection)
+        query += f" WHERE {clause}"
+    return conn.execute(query + " ORDER BY id", params)
+
+
+def _csv_chunks(cursor, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([description[0] for description in cursor.description])
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        if not rows:
+            return
+
+
+class _Sink:
+    # Write-only file for ParquetWriter whose contents are drained per row group
+    closed = False
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+
+    def write(self, data):
+        self.position += len(data)
+        return self.buffer.write(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+def _arrow_type(declared):
+    import pyarrow as pa
+
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _parquet_chunks(conn, table_name, cursor, chunk_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow") from None
+
+    declared = {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table_name})")}
+    names = [description[0] for description in cursor.description]
+    schema = pa.schema([(name, _arrow_type(declared.get(name))) for name in names])
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            arrays = []
+            for values, field in zip(columns, schema):
+                if pa.types.is_string(field.type):
+                    values = [None if value is None else str(value) for value in values]
+                arrays.append(pa.array(values, type=field.type, from_pandas=False))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_chunks(conn, table_name, fmt="csv", chunk_size=CHUNK_SIZE, **selection):
+    """
+    Stream a table, or the rows ``record_selection`` picks, as encoded chunks.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to export.
+        fmt (str): A key of ``FORMATS``.
+        chunk_size (int): Rows fetched and encoded per chunk.
+        **selection: Optional criteria accepted by ``record_selection``.
+
+    Yields:
+        bytes: Consecutive pieces of the file.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format {fmt!r}; use one of {list(FORMATS)}")
+    cursor = _select(conn, table_name, selection)
+    if fmt == "parquet":
+        yield from _parquet_chunks(conn, table_name, cursor, chunk_size)
+        return
+    chunks = _csv_chunks(cursor, chunk_size)
+    if fmt == "csv":
+        yield from chunks
+        return
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_to(target, conn, table_name, fmt="csv", chunk_size=CHUNK_SIZE, **selection):
+    """
+    Write an export to a binary file object.
+
+    Parameters:
+        target: A binary file object, e.g. ``open(path, "wb")``.
+        conn, table_name, fmt, chunk_size, **selection: As for ``export_chunks``.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    size = 0
+    for chunk in export_chunks(conn, table_name, fmt, chunk_size, **selection):
+        target.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def _excel_chunks(source, chunk_size):
+    import pandas as pd
+
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Excel import requires openpyxl: pip install openpyxl") from None
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name) for name in next(rows, ())]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, fmt, chunk_size=CHUNK_SIZE):
+    """
+    Read a file as DataFrames of at most ``chunk_size`` rows.
+
+    Parameters:
+        source: A path or binary file object.
+        fmt (str): One of ``IMPORT_FORMATS``.
+        chunk_size (int): Rows per chunk.
+
+    Yields:
+        pandas.DataFrame: The next chunk, columns named by the file's header.
+    """
+    import pandas as pd
+
+    if fmt in ("csv", "csv.gz"):
+        compression = "gzip" if fmt == "csv.gz" else None
+        yield from pd.read_csv(source, chunksize=chunk_size, compression=compression, skipinitialspace=True)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import requires pyarrow: pip install pyarrow") from None
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif fmt == "xlsx":
+        yield from _excel_chunks(source, chunk_size)
+    else:
+        raise ValueError(f"Unsupported import format {fmt!r}; use one of {IMPORT_FORMATS}")
+
+
+def _validate_records(frame, table_info):
+    # NOT NULL columns without a default must be present, plus the form checks
+    import pandas as pd
+
+    checks = [as_check(pd.Series(True, index=frame.index), None)]
+    for name, notnull, default in table_info:
+        if notnull and default is None and name != "id":
+            present = frame[name].notna() if name in frame else pd.Series(False, index=frame.index)
+            checks.append(as_check(present, f"missing {name}"))
+        if name in COLUMN_VALIDATORS and name in frame:
+            checks.append(COLUMN_VALIDATORS[name](frame[name]))
+    return combine_checks(*checks)
+
+
+def import_chunks(conn, table_name, chunks, keep_ids=False, on_chunk=None, latest=None, alerts=None):
+    """
+    Insert chunks of records, each validated and committed on its own.
+
+    ``real_time_monitoring`` readings go through ``validate_readings`` and
+    ``ingest_readings``, which keeps rollups current (and the latest-value
+    cache and alerts, when given); other tables are
+    checked with the form validators of the columns they have and their
+    NOT NULL constraints. Unknown columns are ignored.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to insert into.
+        chunks (iterable of pandas.DataFrame): e.g. from ``read_chunks``.
+        keep_ids (bool): Insert the ``id`` column too instead of letting
+            SQLite assign new ids.
+        on_chunk (callable): Called with the running stats after each chunk.
+        latest (LatestValues): Latest-value cache to fold imported readings
+            into, as for ``ingest_readings``.
+        alerts (AlertEngine): Check imported readings against the alert
+            rules, as for ``ingest_readings``.
+
+    Returns:
+        dict: ``rows`` inserted, ``rejected`` count, ``chunks`` and up to
+        ``MAX_REJECTS`` sample ``rejects`` as ``(chunk row, reason)`` pairs.
+    """
+    info = [(row[1], row[3], row[4]) for row in conn.execute(f"PRAGMA table_info({table_name})")]
+    if not info:
+        raise ValueError(f"No such table: {table_name}")
+    columns = [name for name, _, _ in info if keep_ids or name != "id"]
+    readings = table_name == "real_time_monitoring" and READING_COLUMNS <= {name for name, _, _ in info}
+    stats = {"rows": 0, "rejected": 0, "chunks": 0, "rejects": []}
+    for frame in chunks:
+        if readings:
+            rows, (mask, reasons) = validate_readings(frame)
+            inserted = ingest_readings(
+                rows, conn, chunk_size=max(len(rows), 1), latest=latest, alerts=alerts
+            ).rows if rows else 0
+        else:
+            mask, reasons = _validate_records(frame, info)
+            present = [name for name in columns if name in frame]
+            valid = frame.loc[mask.to_numpy(), present].astype(object)
+            rows = valid.where(valid.notna(), None).itertuples(index=False, name=None)
+            with conn:
+                inserted = conn.executemany(
+                    f"INSERT INTO {table_name} ({', '.join(present)}) VALUES ({', '.join('?' * len(present))})",
+                    rows,
+                ).rowcount
+        rejected = (~mask).to_numpy().nonzero()[0]
+        for index in rejected[: MAX_REJECTS - len(stats["rejects"])]:
+            stats["rejects"].append((int(frame.index[index]), reasons.iloc[index]))
+        stats["rows"] += inserted
+        stats["rejected"] += len(rejected)
+        stats["chunks"] += 1
+        if on_chunk is not None:
+            on_chunk(stats)
+    return stats
+
+
+def import_file(conn, table_name, source, fmt=None, chunk_size=CHUNK_SIZE, **options):
+    """
+    Import a CSV, gzip-CSV, Parquet or Excel file in chunks.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        table_name (str): The table to insert into.
+        source: A path, or a binary file object with a ``name``.
+        fmt (str): One of ``IMPORT_FORMATS``; guessed from the name if omitted.
+        chunk_size (int): Rows read, validated and committed at a time.
+        **options: ``keep_ids``, ``on_chunk``, ``latest`` and ``alerts``, as
+            for ``import_chunks``.
+
+    Returns:
+        dict: The stats of ``import_chunks``.
+    """
+    fmt = fmt or detect_format(str(getattr(source, "name", source)))
+    return import_chunks(conn, table_name, read_chunks(source, fmt, chunk_size), **options)
+
+
+def _query_selection(query):
+    values = {name: items[-1] for name, items in parse_qs(query).items()}
+    selection = {"parameter": values.get("parameter"), "start": values.get("start"), "end": values.get("end")}
+    if "ids" in values:
+        selection["ids"] = [int(record_id) for record_id in values["ids"].split(",") if record_id]
+    if "first" in values or "last" in values:
+        selection["id_range"] = (int(values.get("first", 1)), int(values.get("last", 2**63 - 1)))
+    return selection
+
+
+def serve(port, host="127.0.0.1", db_path=DB_PATH, chunk_size=CHUNK_SIZE):
+    """
+    Serve ``GET /export/<table>.<format>`` from a background HTTP server.
+
+    The query string may select rows with ``ids=1,2,3``, ``first``/``last``,
+    ``parameter``, ``start`` and ``end``. Responses use chunked transfer
+    encoding, one piece per chunk of rows.
+
+    Parameters:
+        port (int): Port to listen on.
+        host (str): Interface to bind.
+        db_path (str or Path): The database to export from.
+        chunk_size (int): Rows per chunk.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call ``shutdown()`` to stop it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    pool = get_pool(db_path, initializer=initialize_db)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            name = url.path.rsplit("/", 1)[-1]
+            table_name, _, fmt = name.partition(".")
+            if not url.path.startswith("/export/") or fmt not in FORMATS or not table_name.isidentifier():
+                self.send_error(404)
+                return
+            conn = pool.connection()
+            try:
+                self._export(conn, name, table_name, fmt, url.query)
+            finally:
+                # Request threads end with the request; hand the connection back
+                pool.release()
+
+        def _export(self, conn, name, table_name, fmt, query):
+            try:
+                chunks = export_chunks(conn, table_name, fmt, chunk_size, **_query_selection(query))
+                first = next(chunks)
+            except (ValueError, ImportError) as exc:
+                body = json.dumps({"error": str(exc)}).encode()
+                self.send_response(400)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", FORMATS[fmt])
+            self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for chunk in _prepend(first, chunks):
+                    if chunk:
+                        self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            finally:
+                chunks.close()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="sandra-export", daemon=True).start()
+    return server
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
@@ -1,24 +1,22 @@
-import altair as alt
-
-def generate_bar_chart(df):
-    """Generates a bar chart for energy storage data."""
-    chart = alt.Chart(df).mark_bar().encode(
-        x='technology:N',
-        y='capacity:Q',
-        color='status:N'
-    ).properties(title='Energy Storage Technologies')
-    return chart
-
-
 """
 Utility module for the SANDRA Streamlit app.
 
 This module provides helper functions for common operations such as
 data validation, formatting, and user feedback.
+
+Besides the scalar validators used by the forms, batch validators check a
+whole column at once (a pandas Series, an Arrow array or a list) with
+vectorized string operations, returning a boolean mask and a reason for
+every rejected row. pandas is imported only when a batch validator runs.
 """
 
 import re
 
+VALID_STATUSES = frozenset(["active", "inactive", "pending", "archived"])
+MIN_DESCRIPTION_LENGTH = 10
+ID_PATTERN = re.compile(r"\b(\d+)\b")
+MAX_ID = str(2**63 - 1)
+
 
 def validate_feature_name(feature_name):
     """
@@ -45,8 +43,7 @@ def validate_status(status):
     Returns:
         bool: True if the status is valid, False otherwise.
     """
-    valid_statuses = ["active", "inactive", "pending", "archived"]
-    return status.lower() in valid_statuses
+    return status.lower() in VALID_STATUSES
 
 
 def format_description(description):
@@ -62,6 +59,22 @@ def format_description(description):
     return description.strip()
 
 
+def format_data(records, columns):
+    """
+    Format query results as a table for display.
+
+    Parameters:
+        records (list of tuples): Rows, e.g. from ``load_table``.
+        columns (list of str): The column names.
+
+    Returns:
+        pandas.DataFrame: The rows with named columns.
+    """
+    import pandas as pd
+
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
 def validate_description(description):
     """
     Validate the description input.
@@ -72,7 +85,7 @@ def validate_description(description):
     Returns:
         bool: True if the description is valid, False otherwise.
     """
-    if not description or len(description.strip()) < 10:
+    if not description or len(description.strip()) < MIN_DESCRIPTION_LENGTH:
         return False
     return True
 
@@ -105,10 +118,160 @@ def extract_id_from_input(input_str):
     Returns:
         int or None: The extracted ID, or None if no valid ID is found.
     """
-    match = re.search(r'\b\d+\b', input_str)
+    match = ID_PATTERN.search(input_str)
     return int(match.group()) if match else None
 
 
+def as_series(values):
+    """
+    Convert a column to a pandas Series of strings (missing values stay NA).
+
+    Parameters:
+        values (pandas.Series, pyarrow.Array, pyarrow.ChunkedArray or list):
+            The column.
+
+    Returns:
+        pandas.Series: The column with the pandas ``string`` dtype.
+    """
+    import pandas as pd
+
+    if hasattr(values, "to_pandas") and not isinstance(values, pd.Series):
+        values = values.to_pandas()
+    return pd.Series(values).astype("string")
+
+
+def _reasons(ok, reason, index):
+    import numpy as np
+    import pandas as pd
+
+    return pd.Series(np.where(ok, None, reason).astype(object), index=index, dtype=object)
+
+
+def as_check(ok, reason):
+    """
+    Turn a boolean Series into a ``(mask, reasons)`` check result.
+
+    Parameters:
+        ok (pandas.Series): True for valid rows; NA counts as invalid.
+        reason (str): The reason reported for invalid rows.
+
+    Returns:
+        tuple: The validity mask and the per-row reasons.
+    """
+    ok = ok.fillna(False).astype(bool)
+    return ok, _reasons(ok.to_numpy(), reason, ok.index)
+
+
+def validate_feature_names(values, reason="missing name"):
+    """
+    Batch version of ``validate_feature_name``.
+
+    Parameters:
+        values: A column accepted by ``as_series``.
+        reason (str): The reason reported for invalid rows.
+
+    Returns:
+        tuple: A boolean Series (True for valid rows) and a Series holding
+        the rejection reason of each invalid row, ``None`` for valid ones.
+    """
+    return as_check(as_series(values).str.strip().str.len() > 0, reason)
+
+
+def validate_statuses(values, reason="invalid status"):
+    """
+    Batch version of ``validate_status``.
+
+    Parameters:
+        values: A column accepted by ``as_series``.
+        reason (str): The reason reported for invalid rows.
+
+    Returns:
+        tuple: The validity mask and the per-row reasons.
+    """
+    return as_check(as_series(values).str.lower().isin(VALID_STATUSES), reason)
+
+
+def validate_descriptions(values, reason="description too short"):
+    """
+    Batch version of ``validate_description``.
+
+    Parameters:
+        values: A column accepted by ``as_series``.
+        reason (str): The reason reported for invalid rows.
+
+    Returns:
+        tuple: The validity mask and the per-row reasons.
+    """
+    lengths = as_series(values).str.strip().str.len()
+    return as_check(lengths >= MIN_DESCRIPTION_LENGTH, reason)
+
+
+def extract_ids(values):
+    """
+    Batch version of ``extract_id_from_input``.
+
+    Parameters:
+        values: A column accepted by ``as_series``.
+
+    Returns:
+        pandas.Series: The first standalone number of each row as a nullable
+        integer, NA where there is none or it does not fit in 64 bits.
+    """
+    digits = as_series(values).str.extract(ID_PATTERN, expand=False)
+    return digits.mask(~_fits_int64(digits)).astype("Int64")
+
+
+def _fits_int64(digits):
+    # Same-length digit strings compare like the numbers they spell; rows
+    # without digits are not out of range
+    digits = digits.str.lstrip("0")
+    lengths = digits.str.len()
+    shorter = (lengths < len(MAX_ID)).fillna(True).astype(bool)
+    same = (lengths == len(MAX_ID)).fillna(False).astype(bool)
+    return shorter | (same & (digits <= MAX_ID).fillna(True).astype(bool))
+
+
+def validate_ids(values):
+    """
+    Batch check that each row names an ID ``extract_ids`` can return.
+
+    Parameters:
+        values: A column accepted by ``as_series``.
+
+    Returns:
+        tuple: The validity mask and the per-row reasons, "missing id" or
+        "id out of range".
+    """
+    digits = as_series(values).str.extract(ID_PATTERN, expand=False)
+    return combine_checks(
+        as_check(digits.notna(), "missing id"),
+        as_check(_fits_int64(digits), "id out of range"),
+    )
+
+
+def combine_checks(*checks):
+    """
+    Combine the results of several batch validators over the same rows.
+
+    Parameters:
+        *checks (tuple): ``(mask, reasons)`` pairs, in priority order.
+
+    Returns:
+        tuple: A mask that is True only where every check passed, and the
+        reason of the first failed check of each row.
+    """
+    import pandas as pd
+
+    mask, reasons = checks[0]
+    reasons = reasons.to_numpy(dtype=object, copy=True)
+    for other_mask, other_reasons in checks[1:]:
+        # Only rows that passed every earlier check take the new reason
+        take = mask.to_numpy() & ~other_mask.to_numpy()
+        reasons[take] = other_reasons.to_numpy(dtype=object)[take]
+        mask = mask & other_mask
+    return mask, pd.Series(reasons, index=mask.index, dtype=object)
+
+
 if __name__ == "__main__":
     # Testing the utility functions
     print("Validating feature name:", validate_feature_name("Energy Storage"))  # True
@@ -116,3 +279,5 @@ if __name__ == "__main__":
     print("Formatting description:", format_description("  A valid description.  "))  # "A valid description."
     print("Validating description:", validate_description("Too short"))  # False
     print("Extracting ID from input:", extract_id_from_input("Delete ID 123"))  # 123
+    print("Validating IDs:", validate_ids(["ID 7", "no id", "ID " + "9" * 20])[1].tolist())  # [None, 'missing id', 'id out of range']
+    print("Validating statuses:", validate_statuses(["Active", "unknown", None])[0].tolist())  # [True, False, False]
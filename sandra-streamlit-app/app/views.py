@@ -0,0 +1,281 @@
+"""
+Incrementally maintained materialized views for the SANDRA database.
+
+A view is declared once as a source table, grouping columns and aggregates.
+``create_view`` turns the declaration into a backing table with one row per
+group and insert, update and delete triggers on the source that keep it
+current inside the writing transaction, so dashboards read a handful of
+rows instead of scanning the source.
+
+Counts and sums are adjusted in place. ``min``, ``max`` and ``latest`` are
+folded in on insert; when a row leaves a group they are recomputed for that
+group only, which is cheap when the source is indexed on the grouping
+columns (followed by the ``order_by`` column for ``latest``).
+
+NULL grouping values are stored under the key "unknown". Counts and sums
+treat them as that group; the recomputation of ``min``, ``max`` and
+``latest`` does not, so a source should not mix NULLs with a literal
+"unknown" in columns grouped by such a view.
+"""
+
+import json
+from collections import namedtuple
+
+AGGREGATES = ("sum", "min", "max", "latest")
+NULL_KEY = "unknown"
+
+
+class MaterializedView(
+    namedtuple("MaterializedView", ["name", "source", "group_by", "aggregates", "order_by"])
+):
+    """
+    Declaration of a materialized view.
+
+    Parameters:
+        name (str): Backing table name.
+        source (str): The table being aggregated.
+        group_by (tuple of str): Grouping columns; NULLs are grouped as "unknown".
+        aggregates (tuple of tuples): ``(alias, function, column)`` entries with
+            function one of ``AGGREGATES``. Every view also has a ``count``
+            column with the number of source rows in the group.
+        order_by (str): Column deciding which row is the ``latest``.
+    """
+
+    __slots__ = ()
+
+    def definition(self):
+        """str: A stable serialization, used to detect changed declarations."""
+        return json.dumps(
+            [self.source, list(self.group_by), [list(a) for a in self.aggregates], self.order_by]
+        )
+
+
+def define_view(name, source, group_by, aggregates=None, order_by="id"):
+    """
+    Declare a materialized view.
+
+    Parameters:
+        name (str): Backing table name.
+        source (str): The table being aggregated.
+        group_by (str or sequence of str): Grouping column(s).
+        aggregates (dict): ``alias -> (function, column)``, e.g.
+            ``{"capacity": ("sum", "capacity")}``.
+        order_by (str): Column deciding the ``latest`` row.
+
+    Returns:
+        MaterializedView: The declaration, ready for ``create_view``.
+    """
+    if isinstance(group_by, str):
+        group_by = (group_by,)
+    aggregates = tuple((alias, func, column) for alias, (func, column) in (aggregates or {}).items())
+    for alias, func, column in aggregates:
+        if func not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate {func!r} for {alias}; use one of {AGGREGATES}")
+    if not group_by:
+        raise ValueError("A materialized view needs at least one grouping column")
+    return MaterializedView(name, source, tuple(group_by), aggregates, order_by)
+
+
+def _key(row, column):
+    return f"coalesce({row}.{column}, '{NULL_KEY}')"
+
+
+def _group_match(view, row):
+    # Source rows sharing the group of ``row``, as one indexable equality
+    # per column (``IS`` so that NULL keys match too).
+    return " AND ".join(f"{column} IS {row}.{column}" for column in view.group_by)
+
+
+def _has_latest(view):
+    return any(func == "latest" for _, func, _ in view.aggregates)
+
+
+def _add_sql(view, row):
+    columns = list(view.group_by) + ["count"]
+    values = [_key(row, column) for column in view.group_by] + ["1"]
+    updates = ["count = count + 1"]
+    for alias, func, column in view.aggregates:
+        columns.append(alias)
+        if func == "sum":
+            values.append(f"coalesce({row}.{column}, 0)")
+            updates.append(f"{alias} = {alias} + excluded.{alias}")
+        elif func in ("min", "max"):
+            values.append(f"{row}.{column}")
+            updates.append(
+                f"{alias} = coalesce({func}({alias}, excluded.{alias}), {alias}, excluded.{alias})"
+            )
+        else:
+            values.append(f"{row}.{column}")
+            updates.append(
+                f"{alias} = CASE WHEN latest_order IS NULL OR excluded.latest_order >= latest_order "
+                f"THEN excluded.{alias} ELSE {alias} END"
+            )
+    if _has_latest(view):
+        columns.append("latest_order")
+        values.append(f"{row}.{view.order_by}")
+        updates.append("latest_order = coalesce(max(latest_order, excluded.latest_order), latest_order, excluded.latest_order)")
+    return f"""
+        INSERT INTO {view.name} ({", ".join(columns)}) VALUES ({", ".join(values)})
+        ON CONFLICT ({", ".join(view.group_by)}) DO UPDATE SET {", ".join(updates)};
+    """
+
+
+def _remove_sql(view, row):
+    match = _group_match(view, row)
+    updates = ["count = count - 1"]
+    for alias, func, column in view.aggregates:
+        if func == "sum":
+            updates.append(f"{alias} = {alias} - coalesce({row}.{column}, 0)")
+        elif func in ("min", "max"):
+            updates.append(f"{alias} = (SELECT {func}({column}) FROM {view.source} WHERE {match})")
+        else:
+            updates.append(
+                f"{alias} = (SELECT {column} FROM {view.source} WHERE {match} "
+                f"ORDER BY {view.order_by} DESC, rowid DESC LIMIT 1)"
+            )
+    if _has_latest(view):
+        updates.append(f"latest_order = (SELECT max({view.order_by}) FROM {view.source} WHERE {match})")
+    where = " AND ".join(f"{column} = {_key(row, column)}" for column in view.group_by)
+    return f"""
+        UPDATE {view.name} SET {", ".join(updates)} WHERE {where};
+        DELETE FROM {view.name} WHERE {where} AND count <= 0;
+    """
+
+
+def _backfill(conn, view):
+    keys = ", ".join(f"coalesce({column}, '{NULL_KEY}')" for column in view.group_by)
+    columns = list(view.group_by) + ["count"]
+    selects = ["count(*)"]
+    for alias, func, column in view.aggregates:
+        if func == "latest":
+            continue
+        columns.append(alias)
+        selects.append(f"coalesce(sum({column}), 0)" if func == "sum" else f"{func}({column})")
+    if _has_latest(view):
+        columns.append("latest_order")
+        selects.append(f"max({view.order_by})")
+    conn.execute(
+        f"INSERT INTO {view.name} ({', '.join(columns)}) "
+        f"SELECT {keys}, {', '.join(selects)} FROM {view.source} GROUP BY {keys}"
+    )
+    latest = [(alias, column) for alias, func, column in view.aggregates if func == "latest"]
+    if latest:
+        match = " AND ".join(
+            f"coalesce({column}, '{NULL_KEY}') = {view.name}.{column}" for column in view.group_by
+        )
+        conn.execute(
+            f"UPDATE {view.name} SET "
+            + ", ".join(
+                f"{alias} = (SELECT {column} FROM {view.source} WHERE {match} "
+                f"ORDER BY {view.order_by} DESC, rowid DESC LIMIT 1)"
+                for alias, column in latest
+            )
+        )
+
+
+def drop_view(conn, name):
+    """
+    Remove a materialized view, its triggers and its catalog entry.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        name (str): The view name.
+    """
+    with conn:
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}_mv_{suffix}")
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS materialized_views (name TEXT PRIMARY KEY, definition TEXT NOT NULL)"
+        )
+        conn.execute("DELETE FROM materialized_views WHERE name = ?", (name,))
+
+
+def create_view(conn, view):
+    """
+    Create the backing table and triggers of a view and fill it from the source.
+
+    Does nothing if the view already exists with the same declaration; a
+    changed declaration is dropped and rebuilt.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        view (MaterializedView): The declaration.
+
+    Returns:
+        bool: True if the view was (re)built.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS materialized_views (name TEXT PRIMARY KEY, definition TEXT NOT NULL)"
+    )
+    stored = conn.execute(
+        "SELECT definition FROM materialized_views WHERE name = ?", (view.name,)
+    ).fetchone()
+    if stored is not None and stored[0] == view.definition():
+        return False
+    drop_view(conn, view.name)
+    columns = [f"{column} NOT NULL" for column in view.group_by] + ["count INTEGER NOT NULL"]
+    for alias, func, _ in view.aggregates:
+        columns.append(f"{alias} REAL NOT NULL DEFAULT 0" if func == "sum" else alias)
+    if _has_latest(view):
+        columns.append("latest_order")
+    with conn:
+        conn.execute(
+            f"CREATE TABLE {view.name} ({', '.join(columns)}, "
+            f"PRIMARY KEY ({', '.join(view.group_by)})) WITHOUT ROWID"
+        )
+        _backfill(conn, view)
+        conn.execute(
+            f"CREATE TRIGGER {view.name}_mv_ai AFTER INSERT ON {view.source} BEGIN "
+            f"{_add_sql(view, 'new')} END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER {view.name}_mv_ad AFTER DELETE ON {view.source} BEGIN "
+            f"{_remove_sql(view, 'old')} END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER {view.name}_mv_au AFTER UPDATE ON {view.source} BEGIN "
+            f"{_remove_sql(view, 'old')} {_add_sql(view, 'new')} END"
+        )
+        conn.execute(
+            "INSERT INTO materialized_views (name, definition) VALUES (?, ?)",
+            (view.name, view.definition()),
+        )
+    return True
+
+
+def refresh_view(conn, view):
+    """
+    Recompute a view from its source, e.g. after the triggers were bypassed.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        view (MaterializedView): The declaration.
+    """
+    with conn:
+        conn.execute(f"DELETE FROM {view.name}")
+        _backfill(conn, view)
+
+
+def read_view(conn, view, **filters):
+    """
+    Read the rows of a view.
+
+    Parameters:
+        conn (sqlite3.Connection): A connection object to the SQLite database.
+        view (MaterializedView or str): The view or its name.
+        **filters: Grouping column equality filters, e.g. ``status="active"``.
+
+    Returns:
+        tuple: The list of rows and the list of column names, ordered by the
+        grouping columns. The internal ``latest_order`` column is left out.
+    """
+    name = view if isinstance(view, str) else view.name
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})") if row[1] != "latest_order"]
+    query = f"SELECT {', '.join(columns)} FROM {name}"
+    if filters:
+        query += " WHERE " + " AND ".join(f"{column} = ?" for column in filters)
+    primary = [row[1] for row in sorted(conn.execute(f"PRAGMA table_info({name})"), key=lambda r: r[5]) if row[5]]
+    query += f" ORDER BY {', '.join(primary)}"
+    cursor = conn.execute(query, tuple(filters.values()))
+    return cursor.fetchall(), [description[0] for description in cursor.description]
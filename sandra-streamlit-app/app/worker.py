@@ -0,0 +1,415 @@
+"""
+Headless ingestion worker for SANDRA sensor feeds.
+
+Reads ``real_time_monitoring`` readings from CSV or JSON lines files, from
+standard input, or from a local TCP socket (one reading per line), without
+Streamlit. Lines are grouped into batches that a process pool parses and
+validates in parallel, and validated batches are handed, in order, to a
+single writer process, which owns the only database connection and inserts
+them through ``ingest_readings``. Validation runs on whole batches with the
+vectorized validators from ``utils``. Parsing therefore scales with the number
+of cores while SQLite sees one writer.
+
+    python -m app.worker readings.csv
+    tail -f feed.jsonl | python -m app.worker - --format jsonl
+    python -m app.worker tcp://127.0.0.1:9750
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .alerts import AlertEngine
+    from .database import DB_PATH, connect_db
+    from .ingest import CHUNK_SIZE, READING_FIELDS, ingest_readings
+    from .utils import (
+        as_check,
+        as_series,
+        combine_checks,
+        validate_descriptions,
+        validate_feature_names,
+        validate_statuses,
+    )
+except ImportError:
+    from alerts import AlertEngine
+    from database import DB_PATH, connect_db
+    from ingest import CHUNK_SIZE, READING_FIELDS, ingest_readings
+    from utils import (
+        as_check,
+        as_series,
+        combine_checks,
+        validate_descriptions,
+        validate_feature_names,
+        validate_statuses,
+    )
+
+BATCH_SIZE = 20000
+FLUSH_INTERVAL = 1.0
+FORMATS = ("csv", "jsonl")
+TCP_PREFIX = "tcp://"
+READ_HINT = 64 * 1024
+SEND_TIMEOUT = 0.5
+
+_EOF = object()
+
+
+def validate_readings(frame):
+    """
+    Validate parsed readings in one vectorized pass.
+
+    ``status`` and ``description``, when a feed carries them, must pass the
+    same checks as the app's forms; they are not stored.
+
+    Parameters:
+        frame (pandas.DataFrame): One row per reading, columns named after
+            the feed's fields.
+
+    Returns:
+        tuple: The list of valid ``real_time_monitoring`` rows and a
+        ``(mask, reasons)`` pair covering every input row.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def column(name):
+        if name in frame:
+            return frame[name]
+        return pd.Series(None, index=frame.index, dtype=object)
+
+    def blank(values):
+        return as_series(values).fillna("").str.strip() == ""
+
+    parameters = as_series(column("parameter")).str.strip()
+    values = pd.to_numeric(column("value"), errors="coerce")
+    raw = column("timestamp")
+    missing = blank(raw)
+    # Epoch numbers pass through; only text timestamps are parsed
+    epochs = pd.to_numeric(raw, errors="coerce").astype(float)
+    text = epochs.isna() & ~missing
+    if text.any():
+        parsed = pd.to_datetime(raw[text].astype(str).str.strip(), utc=True, format="mixed", errors="coerce")
+        epochs[text] = (parsed - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+    checks = [
+        as_check(parameters.str.len() > 0, "missing parameter"),
+        as_check(pd.Series(np.isfinite(values.to_numpy(dtype=float)), index=frame.index), "value is not a number"),
+        as_check(~missing, "missing timestamp"),
+        as_check(epochs.notna(), "invalid timestamp"),
+    ]
+    # Optional fields are only checked where present
+    for name, validate in (("status", validate_statuses), ("description", validate_descriptions)):
+        if name in frame:
+            ok, reasons = validate(frame[name])
+            checks.append((ok | blank(frame[name]), reasons))
+    mask, reasons = combine_checks(*checks)
+    valid = mask.to_numpy()
+    seconds = epochs[valid].to_numpy(dtype=np.int64).astype("datetime64[s]")
+    units = column("unit")[valid].tolist()
+    rows = list(
+        zip(
+            parameters[valid].tolist(),
+            values[valid].tolist(),
+            [unit if isinstance(unit, str) and unit else None for unit in units],
+            [stamp.replace("T", " ") for stamp in np.datetime_as_string(seconds).tolist()],
+        )
+    )
+    return rows, (mask, reasons)
+
+
+def parse_batch(lines, fmt="jsonl", fields=READING_FIELDS):
+    """
+    Parse and validate a batch of feed lines; runs in the process pool.
+
+    Parameters:
+        lines (list of str): Raw lines, one reading each.
+        fmt (str): "csv" or "jsonl".
+        fields (sequence of str): CSV column names.
+
+    Returns:
+        tuple: The list of valid rows and a list of ``(line, reason)`` rejects.
+    """
+    import pandas as pd
+
+    rejects, parsed, kept = [], [], []
+    if fmt == "csv":
+        for line, values in zip(lines, csv.reader(lines)):
+            if len(values) == len(fields):
+                parsed.append(values)
+                kept.append(line)
+            else:
+                rejects.append((line, "wrong number of fields"))
+        frame = pd.DataFrame(parsed, columns=list(fields))
+    else:
+        for line in lines:
+            record = _load_json(line)
+            if isinstance(record, dict):
+                parsed.append(record)
+                kept.append(line)
+            else:
+                rejects.append((line, "not a JSON object"))
+        frame = pd.DataFrame.from_records(parsed)
+    if frame.empty:
+        return [], rejects
+    rows, (mask, reasons) = validate_readings(frame)
+    for index in (~mask).to_numpy().nonzero()[0]:
+        rejects.append((kept[index], reasons.iloc[index]))
+    return rows, rejects
+
+
+def _load_json(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _write_batches(db_path, inbox, outbox, chunk_size, synchronous, alerts):
+    # The writer process: the only place that touches the database. It also
+    # owns the alert engine, whose rolling statistics follow the feed.
+    conn = connect_db(db_path)
+    engine = AlertEngine() if alerts else None
+    rows = 0
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        rows += ingest_readings(batch, conn, chunk_size, synchronous, alerts=engine).rows
+    outbox.put(rows)
+
+
+def _send(inbox, writer, item):
+    # The inbox is bounded and only the writer drains it: wait in short
+    # slices so that a dead writer is noticed instead of blocking forever.
+    while writer.is_alive():
+        try:
+            inbox.put(item, timeout=SEND_TIMEOUT)
+            return
+        except queue.Full:
+            pass
+    raise RuntimeError(f"Writer process failed with exit code {writer.exitcode}")
+
+
+def _read_stream(stream, lines):
+    # Files are read in blocks of lines; stdin line by line so a slow feed
+    # is never held back waiting for a full block.
+    if stream is sys.stdin:
+        blocks = ([line] for line in stream)
+    else:
+        blocks = iter(lambda: stream.readlines(READ_HINT), [])
+    for block in blocks:
+        block = [line.rstrip("\r\n") for line in block if line.strip()]
+        if block:
+            lines.put(block)
+    lines.put(_EOF)
+
+
+def _serve_socket(address, lines, ready):
+    host, _, port = address[len(TCP_PREFIX):].rpartition(":")
+    server = socket.create_server((host or "127.0.0.1", int(port)))
+    ready.put(server.getsockname())
+
+    def handle(client):
+        with client, client.makefile("r", encoding="utf-8", newline="") as stream:
+            for line in stream:
+                if line.strip():
+                    lines.put([line.rstrip("\r\n")])
+
+    while True:
+        client, _ = server.accept()
+        threading.Thread(target=handle, args=(client,), daemon=True).start()
+
+
+def _batches(lines, batch_size, flush_interval):
+    # Yields an empty batch when the feed is idle, so the caller can still
+    # hand finished work to the writer.
+    batch = []
+    deadline = None
+    while True:
+        timeout = flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            block = lines.get(timeout=timeout)
+        except queue.Empty:
+            if not batch:
+                yield batch
+                continue
+            block = None
+        if block is _EOF:
+            if batch:
+                yield batch
+            return
+        if block is not None:
+            batch.extend(block)
+            if deadline is None:
+                deadline = time.monotonic() + flush_interval
+        if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+            yield batch
+            batch, deadline = [], None
+
+
+def run_worker(
+    source,
+    fmt=None,
+    db_path=DB_PATH,
+    workers=None,
+    batch_size=BATCH_SIZE,
+    flush_interval=FLUSH_INTERVAL,
+    fields=None,
+    rejects=None,
+    chunk_size=CHUNK_SIZE,
+    synchronous="NORMAL",
+    on_listen=None,
+    alerts=True,
+):
+    """
+    Ingest a feed until it ends (files, stdin) or the process is interrupted (TCP).
+
+    Parameters:
+        source (str): A file path, "-" for standard input, or "tcp://host:port".
+        fmt (str): "csv" or "jsonl"; guessed from the file extension if omitted.
+        db_path (str or Path): The database to write to.
+        workers (int): Parser processes; defaults to the CPU count.
+        batch_size (int): Lines per parse batch.
+        flush_interval (float): Seconds after which a partial batch is sent.
+        fields (sequence of str): CSV column names; defaults to the header line
+            for files and stdin, and is required for CSV over TCP.
+        rejects (file): Optional text file receiving rejected lines as JSON lines.
+        chunk_size (int): Rows per insert transaction in the writer.
+        synchronous (str): SQLite ``synchronous`` level for the writer.
+        on_listen (callable): Called with the bound ``(host, port)`` for TCP.
+        alerts (bool): Check readings against the rules in ``alert_rules``.
+
+    Returns:
+        dict: ``lines``, ``rows``, ``rejected``, ``seconds`` and ``rows_per_second``.
+    """
+    if fmt is None:
+        fmt = "csv" if str(source).lower().endswith(".csv") else "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    workers = workers or os.cpu_count() or 1
+    lines = queue.Queue(maxsize=workers * 64)
+    stream = None
+
+    if str(source).startswith(TCP_PREFIX):
+        if fmt == "csv" and fields is None:
+            raise ValueError("CSV over TCP needs the column names (fields)")
+        ready = queue.Queue()
+        threading.Thread(target=_serve_socket, args=(source, lines, ready), daemon=True).start()
+        address = ready.get()
+        if on_listen is not None:
+            on_listen(address)
+    else:
+        stream = sys.stdin if source == "-" else open(source, newline="", encoding="utf-8")
+        if fmt == "csv" and fields is None:
+            fields = next(csv.reader([stream.readline()]), None) or READING_FIELDS
+        threading.Thread(target=_read_stream, args=(stream, lines), daemon=True).start()
+    fields = tuple(field.strip() for field in (fields or READING_FIELDS))
+
+    context = multiprocessing.get_context("spawn")
+    inbox = context.Queue(maxsize=workers * 2)
+    outbox = context.Queue()
+    writer = context.Process(
+        target=_write_batches,
+        args=(str(db_path), inbox, outbox, chunk_size, synchronous, alerts),
+        name="sandra-writer",
+    )
+    writer.start()
+
+    stats = {"lines": 0, "rows": 0, "rejected": 0}
+    started = time.perf_counter()
+
+    def drain(future):
+        rows, rejected = future.result()
+        if rows:
+            _send(inbox, writer, rows)
+        stats["rejected"] += len(rejected)
+        if rejects is not None:
+            for line, reason in rejected:
+                rejects.write(json.dumps({"line": line, "reason": reason}) + "\n")
+
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            pending = deque()
+            for batch in _batches(lines, batch_size, flush_interval):
+                if batch:
+                    stats["lines"] += len(batch)
+                    pending.append(pool.submit(parse_batch, batch, fmt, fields))
+                # Keep a bounded number of batches in flight, written in order
+                while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                    drain(pending.popleft())
+            while pending:
+                drain(pending.popleft())
+    finally:
+        try:
+            _send(inbox, writer, None)
+        except RuntimeError:
+            # Batches the dead writer never read must not hold up our exit
+            inbox.cancel_join_thread()
+        writer.join()
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
+    stats["rows"] = outbox.get() if writer.exitcode == 0 else 0
+    if writer.exitcode != 0:
+        raise RuntimeError(f"Writer process failed with exit code {writer.exitcode}")
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    """Command-line entry point, ``sandra-ingest``."""
+    parser = argparse.ArgumentParser(
+        prog="sandra-ingest", description="Ingest SANDRA sensor readings without the UI."
+    )
+    parser.add_argument("source", help='File path, "-" for stdin, or tcp://host:port')
+    parser.add_argument("--format", choices=FORMATS, help="Feed format (default: from the extension)")
+    parser.add_argument("--db", default=str(DB_PATH), help="Database file")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL)
+    parser.add_argument("--fields", help="Comma-separated CSV column names")
+    parser.add_argument("--rejects", help="Write rejected lines to this JSON lines file")
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLite synchronous level")
+    parser.add_argument("--no-alerts", action="store_true", help="Do not check readings against the alert rules")
+    args = parser.parse_args(argv)
+
+    rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    try:
+        stats = run_worker(
+            args.source,
+            fmt=args.format,
+            db_path=args.db,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+            fields=args.fields.split(",") if args.fields else None,
+            rejects=rejects,
+            synchronous=args.synchronous,
+            alerts=not args.no_alerts,
+            on_listen=lambda address: print(f"Listening on {address[0]}:{address[1]}", file=sys.stderr),
+        )
+    except KeyboardInterrupt:
+        return 130
+    except RuntimeError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        if rejects is not None:
+            rejects.close()
+    print(
+        f"{stats['rows']} rows written, {stats['rejected']} rejected of {stats['lines']} lines "
+        f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
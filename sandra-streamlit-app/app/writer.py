@@ -0,0 +1,168 @@
+"""
+Write-behind queue for the SANDRA Streamlit app.
+
+Mutations are submitted from the Streamlit script thread and executed by a
+single background writer thread, which drains the queue into group commits.
+A submission may also be a function of the writer's connection that runs its
+own transaction (a bulk update that refreshes rollups, say). Each submission
+returns a ``concurrent.futures.Future`` that resolves to the statement's row
+count once its transaction has committed, so the UI only waits as long as it
+chooses to.
+"""
+
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+
+MAX_PENDING = 1000
+BATCH_SIZE = 256
+SUBMIT_TIMEOUT = 5.0
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    A bounded queue of SQL mutations applied by a background thread.
+
+    Parameters:
+        pool (ConnectionPool): The pool the writer thread takes its connection from.
+        max_pending (int): Queue depth; ``submit`` blocks when it is full.
+        batch_size (int): Maximum number of mutations per group commit.
+    """
+
+    def __init__(self, pool, max_pending=MAX_PENDING, batch_size=BATCH_SIZE):
+        self.pool = pool
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="sandra-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, sql, params=(), many=False, timeout=SUBMIT_TIMEOUT):
+        """
+        Queue a mutation.
+
+        Parameters:
+            sql (str or callable): The statement to execute, or a function
+                called as ``sql(conn)`` on the writer's connection. A function
+                runs outside the group commit, manages its own transaction and
+                returns the affected row count.
+            params (sequence): Statement parameters, or a sequence of them when
+                ``many`` is True; unused for a function.
+            many (bool): Run with ``executemany``.
+            timeout (float): Seconds to wait for queue space before raising
+                ``queue.Full`` (backpressure); ``None`` waits indefinitely.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the affected row count after
+            the commit, or to the exception the statement raised.
+        """
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        future = Future()
+        self._queue.put((sql, params, many, future), timeout=timeout)
+        return future
+
+    @property
+    def pending(self):
+        """int: Mutations waiting to be written."""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every queued mutation has been committed or failed."""
+        self._queue.join()
+
+    def close(self):
+        """Flush outstanding mutations and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self.pool.connection()
+        try:
+            while True:
+                batch = self._take_batch()
+                stop = batch[-1] is _STOP
+                mutations = batch[:-1] if stop else batch
+                if mutations:
+                    self._write(conn, mutations)
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            self.pool.release()
+
+    def _write(self, conn, mutations):
+        group = []
+        for mutation in mutations:
+            if callable(mutation[0]):
+                # Commit what came before, so mutations still apply in order
+                if group:
+                    self._commit(conn, group)
+                    group = []
+                self._call(conn, mutation)
+            else:
+                group.append(mutation)
+        if group:
+            self._commit(conn, group)
+
+    def _call(self, conn, mutation):
+        function, _, _, future = mutation
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = function(conn)
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.rollback()
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def _commit(self, conn, mutations):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, many, future in mutations:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # A savepoint per mutation keeps one bad statement from
+                # aborting the rest of the group commit.
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO mutation")
+                    future.set_exception(exc)
+                else:
+                    results.append((future, cursor.rowcount))
+                conn.execute("RELEASE mutation")
+            conn.commit()
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, _, future in mutations:
+                if future.running():
+                    future.set_exception(exc)
+            return
+        for future, rowcount in results:
+            future.set_result(rowcount)
@@ -0,0 +1,31 @@
+"""
+Shared fixtures for the SANDRA app tests.
+
+Every test gets its own database file; ``SANDRA_DB_PATH`` points at a
+scratch file before ``app.database`` is imported, so nothing falls back to
+the bundled ``data/sandra.db``.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+os.environ.setdefault("SANDRA_DB_PATH", os.path.join(tempfile.mkdtemp(), "sandra.db"))
+sys.path.insert(0, str(ROOT))
+
+from app.database import close_pools, connect_db  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    yield tmp_path / "sandra.db"
+    close_pools()
+
+
+@pytest.fixture
+def conn(db_path):
+    return connect_db(db_path)
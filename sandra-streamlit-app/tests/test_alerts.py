@@ -0,0 +1,49 @@
+from app.alerts import AlertEngine, add_rule, load_alerts
+from app.ingest import ingest_readings
+
+
+def _alerts(conn):
+    rows, columns = load_alerts(conn)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _ingest(conn, engine, readings):
+    ingest_readings(readings, conn, alerts=engine)
+
+
+def test_threshold_rule_raises_and_clears(conn):
+    add_rule(conn, "core_temperature", "threshold", high=100.0, severity="critical")
+    engine = AlertEngine()
+
+    _ingest(conn, engine, [
+        ("core_temperature", 90.0, "C", "2024-01-01 00:00:00"),
+        ("core_temperature", 120.0, "C", "2024-01-01 00:00:01"),
+        ("core_temperature", 130.0, "C", "2024-01-01 00:00:02"),
+    ])
+    (alert,) = _alerts(conn)
+    assert (alert["severity"], alert["readings"], alert["value"]) == ("critical", 2, 130.0)
+    assert alert["started"] == "2024-01-01 00:00:01"
+    assert alert["cleared"] is None
+
+    _ingest(conn, engine, [("core_temperature", 95.0, "C", "2024-01-01 00:00:03")])
+    (alert,) = _alerts(conn)
+    assert alert["cleared"] == "2024-01-01 00:00:03"
+    assert engine.raised == 1
+
+
+def test_rate_rule_spans_chunks(conn):
+    add_rule(conn, "pressure", "rate", max_change=1.0)
+    engine = AlertEngine()
+
+    _ingest(conn, engine, [("pressure", 1.0, "bar", "2024-01-01 00:00:00")])
+    assert _alerts(conn) == []
+    # Compared with the last reading of the previous chunk
+    _ingest(conn, engine, [("pressure", 5.0, "bar", "2024-01-01 00:00:01")])
+    (alert,) = _alerts(conn)
+    assert alert["kind"] == "rate" and alert["cleared"] is None
+
+
+def test_readings_of_other_parameters_do_not_alert(conn):
+    add_rule(conn, "core_temperature", "threshold", low=0.0)
+    _ingest(conn, AlertEngine(), [("pressure", -5.0, "bar", "2024-01-01 00:00:00")])
+    assert _alerts(conn) == []
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from app.database import ConnectionPool
+
+
+def _in_thread(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def test_waiter_reclaims_connection_of_exited_thread(db_path):
+    pool = ConnectionPool(db_path, max_connections=1)
+
+    def create():
+        conn = pool.connection()
+        conn.execute("CREATE TABLE readings (value REAL)")
+        conn.commit()
+
+    def write_without_commit():
+        pool.connection().execute("INSERT INTO readings VALUES (1.0)")
+
+    _in_thread(create)
+    _in_thread(write_without_commit)
+
+    started = time.monotonic()
+    conn = pool.connection(timeout=5)
+    assert time.monotonic() - started < 1
+    # The dead thread's open transaction was rolled back, not inherited
+    assert not conn.in_transaction
+    assert conn.execute("SELECT count(*) FROM readings").fetchone()[0] == 0
+    pool.close()
+
+
+def test_waiter_gets_connection_released_by_another_thread(db_path):
+    pool = ConnectionPool(db_path, max_connections=1)
+    acquired = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        pool.connection()
+        acquired.set()
+        time.sleep(0.2)
+        pool.release()
+        done.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait()
+    try:
+        assert pool.connection(timeout=5) is not None
+    finally:
+        done.set()
+        thread.join()
+        pool.close()
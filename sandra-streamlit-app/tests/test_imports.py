@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+from conftest import ROOT
+
+HEAVY = ("streamlit", "pandas", "altair")
+
+
+def test_core_modules_import_without_heavy_dependencies():
+    code = (
+        "import sys\n"
+        "import app, app.database, app.ingest, app.writer\n"
+        f"print(','.join(name for name in {HEAVY!r} if name in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.ingest import ingest_readings, normalize_reading
+from app.rollups import aggregate_readings, load_rollup
+
+MIDNIGHT = "2024-01-01 00:00:00"
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        MIDNIGHT,
+        "2024-01-01T00:00:00",
+        "2024-01-01T00:00:00Z",
+        "2024-01-01T02:00:00+02:00",
+        1704067200,
+        "1704067200",
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+    ],
+)
+def test_normalize_reading_formats_timestamps_as_utc_text(timestamp):
+    assert normalize_reading(("core_temperature", 1.0, "C", timestamp))[3] == MIDNIGHT
+
+
+def test_normalize_reading_accepts_mappings():
+    reading = {"parameter": "core_temperature", "value": 1.0, "unit": "C", "timestamp": MIDNIGHT}
+    assert normalize_reading(reading) == ("core_temperature", 1.0, "C", MIDNIGHT)
+
+
+def test_normalize_reading_rejects_unparseable_timestamps():
+    with pytest.raises(ValueError):
+        normalize_reading(("core_temperature", 1.0, "C", "yesterday"))
+
+
+def test_ingest_skips_and_counts_unparseable_readings(conn):
+    readings = [
+        ("core_temperature", 1.0, "C", "2024-01-01T00:00:00Z"),
+        ("core_temperature", 2.0, "C", "not a time"),
+        ("core_temperature", 3.0, "C", "2024-01-01T02:00:01+02:00"),
+    ]
+    report = ingest_readings(readings, conn, chunk_size=2)
+    assert (report.rows, report.rejected) == (2, 1)
+    stored = conn.execute("SELECT timestamp FROM real_time_monitoring ORDER BY id").fetchall()
+    assert stored == [(MIDNIGHT,), ("2024-01-01 00:00:01",)]
+
+
+def test_aggregate_readings_skips_readings_without_parameter():
+    rows = aggregate_readings([(None, 5.0, "C", MIDNIGHT), ("core_temperature", 1.0, "C", MIDNIGHT)])
+    assert {row[1] for row in rows} == {"core_temperature"}
+
+
+def test_ingest_commits_chunk_with_readings_without_parameter(conn):
+    readings = [(None, 5.0, "C", MIDNIGHT), ("core_temperature", 1.0, "C", MIDNIGHT)]
+    report = ingest_readings(readings, conn)
+    assert report.rows == 2
+    assert conn.execute("SELECT count(*) FROM real_time_monitoring").fetchone()[0] == 2
+    rows, _ = load_rollup(conn, "hour")
+    assert [(row[0], row[-1]) for row in rows] == [("core_temperature", 1)]
@@ -0,0 +1,44 @@
+import io
+
+from app.database import connect_db
+from app.transfer import export_to, import_file
+
+READINGS = [
+    ("core_temperature", 21.5, "C", "2024-01-01 00:00:00"),
+    ("core_temperature", 22.0, "C", "2024-01-01 00:01:00"),
+    ("pressure", 1.2, "bar", "2024-01-01 00:00:30"),
+]
+
+
+def _readings(conn):
+    return conn.execute(
+        "SELECT parameter, value, unit, timestamp FROM real_time_monitoring ORDER BY id"
+    ).fetchall()
+
+
+def test_csv_export_imports_back_unchanged(conn, tmp_path):
+    with conn:
+        conn.executemany(
+            "INSERT INTO real_time_monitoring (parameter, value, unit, timestamp) VALUES (?, ?, ?, ?)",
+            READINGS,
+        )
+    buffer = io.BytesIO()
+    assert export_to(buffer, conn, "real_time_monitoring", "csv", chunk_size=2) > 0
+
+    target = connect_db(tmp_path / "copy.db")
+    buffer.seek(0)
+    buffer.name = "real_time_monitoring.csv"
+    stats = import_file(target, "real_time_monitoring", buffer, chunk_size=2)
+    assert (stats["rows"], stats["rejected"], stats["chunks"]) == (3, 0, 2)
+    assert _readings(target) == READINGS
+
+
+def test_import_reports_rejected_rows(conn):
+    source = io.BytesIO(
+        b"parameter,value,unit,timestamp\n"
+        b"core_temperature,21.5,C,2024-01-01 00:00:00\n"
+        b"core_temperature,warm,C,2024-01-01 00:01:00\n"
+    )
+    stats = import_file(conn, "real_time_monitoring", source, fmt="csv")
+    assert (stats["rows"], stats["rejected"]) == (1, 1)
+    assert stats["rejects"] == [(1, "value is not a number")]
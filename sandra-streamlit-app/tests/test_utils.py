@@ -0,0 +1,15 @@
+from app.utils import extract_ids, validate_ids
+
+TOO_BIG = "ID " + "9" * 20
+
+
+def test_extract_ids_leaves_out_of_range_ids_missing():
+    ids = extract_ids(["ID 7", "no id", TOO_BIG, str(2**63 - 1), str(2**63)])
+    assert ids.tolist()[0] == 7
+    assert ids.isna().tolist() == [False, True, True, False, True]
+
+
+def test_validate_ids_reports_reasons():
+    mask, reasons = validate_ids(["ID 7", "no id", TOO_BIG])
+    assert mask.tolist() == [True, False, False]
+    assert reasons.tolist() == [None, "missing id", "id out of range"]